@@ -33,8 +33,23 @@ def create_app(config_object=None):
     def load_user(user_id):
         return User.query.get(int(user_id))
 
+    # 同机 worker 共享的行情缓存、上游 HTTP 响应缓存（进程级单例，按当前配置指向缓存文件）
+    from app.services.shared_cache import shared_cache
+    shared_cache.configure(app.config.get('SHARED_CACHE_PATH'), app.config.get('SHARED_CACHE_MAX_ENTRIES', 50000))
+    from app.services.http_cache import http_cache
+    http_cache.configure(
+        app.config.get('HTTP_CACHE_PATH'),
+        app.config.get('HTTP_CACHE_TTLS'),
+        app.config.get('HTTP_CACHE_MAX_MB', 200) * 1024 * 1024,
+    )
+
     # 注册蓝图
     from app.routes import register_blueprints
     register_blueprints(app)
 
+    # 可选：后台预热重量级依赖（如 ['akshare']），避免首个用到它的请求承担导入耗时
+    if app.config.get('LAZY_WARM_UP'):
+        from app.utils.lazy import warm_up
+        warm_up(app.config['LAZY_WARM_UP'], background=True)
+
     return app
@@ -19,6 +19,51 @@ class Config:
     # 定时任务配置
     FUND_NAV_UPDATE_TIME = '15:30'
 
+    # 批量净值抓取：抓取线程数、解析进程数、各 host 最小请求间隔（秒）
+    NAV_CRAWL_FETCH_WORKERS = int(os.environ.get('NAV_CRAWL_FETCH_WORKERS', 16))
+    NAV_CRAWL_PARSE_WORKERS = int(os.environ.get('NAV_CRAWL_PARSE_WORKERS', min(4, os.cpu_count() or 1)))
+    NAV_CRAWL_RATE_LIMITS = {
+        'api.fund.eastmoney.com': 0.05,
+        'fundgz.1234567.com.cn': 0.05,
+        'fund.eastmoney.com': 0.1,
+        'finance.sina.com.cn': 0.2,
+    }
+
+    # 场内 ETF 日 K 读取后端：'sql' 直接读 etf_kline_cache；'mmap' 读 KLINE_STORE_PATH 下的列文件
+    KLINE_STORE = os.environ.get('KLINE_STORE', 'sql')
+    KLINE_STORE_PATH = os.path.join(basedir, 'instance', 'klines')
+    # K 线过期时先返回缓存，增量刷新放到后台线程
+    KLINE_SERVE_STALE = os.environ.get('KLINE_SERVE_STALE', '1') == '1'
+
+    # 收盘后预取场内 ETF 日 K 并预计算筹码分布
+    KLINE_PREFETCH_TIME = '15:10'
+    KLINE_PREFETCH_WORKERS = 4
+    KLINE_PREFETCH_RECENT_DAYS = 7     # 预取这么多天内被查看过的筹码页
+    CHIP_SNAPSHOT_KEEP_DAYS = 30       # 默认参数筹码快照保留天数
+    CHIP_STATE_STALE_DAYS = 30         # 这么多天未被请求的筹码增量状态会被清理
+
+    # 同机 worker 共享的行情 / ETF 名称缓存（SQLite 文件），置空禁用
+    SHARED_CACHE_PATH = os.environ.get('SHARED_CACHE_PATH', os.path.join(basedir, 'instance', 'shared_cache.db'))
+    SHARED_CACHE_MAX_ENTRIES = 50000
+
+    # 上游 HTTP 响应磁盘缓存，置空禁用；上游不给缓存头时按 host 套用的 TTL（秒）
+    HTTP_CACHE_PATH = os.environ.get('HTTP_CACHE_PATH', os.path.join(basedir, 'instance', 'http_cache'))
+    HTTP_CACHE_MAX_MB = 200
+    HTTP_CACHE_TTLS = {
+        'api.fund.eastmoney.com': 300,
+        'fund.eastmoney.com': 300,
+        'finance.sina.com.cn': 300,
+        'push2his.eastmoney.com': 300,
+    }
+
+    # 场外基金 → 对应场内 ETF：{fund_code: (pair_name, etf_code)}
+    FUND_ETF_PAIRS = {
+        '018344': ('robot', '562500'),   # 华夏中证机器人ETF联接A -> 机器人ETF华夏
+    }
+
+    # 启动后在后台预先导入的重量级依赖，逗号分隔，如 LAZY_WARM_UP=akshare,pandas
+    LAZY_WARM_UP = [m for m in os.environ.get('LAZY_WARM_UP', '').split(',') if m]
+
     # AI 分析助手
     DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY', '')
     ANTHROPIC_API_KEY = os.environ.get('ANTHROPIC_API_KEY', '')
@@ -28,3 +73,7 @@ class TestConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite://'  # 内存数据库
     WTF_CSRF_ENABLED = False
+    NAV_CRAWL_PARSE_WORKERS = 0
+    KLINE_SERVE_STALE = False
+    SHARED_CACHE_PATH = None
+    HTTP_CACHE_PATH = None
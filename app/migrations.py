@@ -0,0 +1,44 @@
+"""已有数据库的结构升级.
+
+db.create_all() 只创建缺失的表，不会修改已有表；旧库的列类型、索引变化
+在这里用幂等的 SQL 补齐，由 db_init.py 在 create_all 之后调用。
+"""
+from sqlalchemy import inspect, text
+
+from app.extensions import db
+
+
+def upgrade_fund_nav_history():
+    """
+    fund_nav_history：date 归一为纯日期，同一基金同一天只保留最新写入的一条，
+    再建 (fund_id, date) 唯一索引。可重复执行；返回删除的重复行数。
+    """
+    engine = db.engine
+    if 'fund_nav_history' not in inspect(engine).get_table_names():
+        return 0
+
+    with engine.begin() as conn:
+        if engine.dialect.name == 'sqlite':
+            # SQLite 的 DateTime 存为 'YYYY-MM-DD HH:MM:SS.ffffff' 文本
+            conn.execute(text("UPDATE fund_nav_history SET date = date(date) WHERE date <> date(date)"))
+        elif engine.dialect.name == 'postgresql':
+            conn.execute(text("ALTER TABLE fund_nav_history ALTER COLUMN date TYPE DATE USING date::date"))
+        else:
+            raise NotImplementedError(f"不支持的数据库方言: {engine.dialect.name}")
+
+        removed = conn.execute(text(
+            "DELETE FROM fund_nav_history WHERE id NOT IN "
+            "(SELECT MAX(id) FROM fund_nav_history GROUP BY fund_id, date)"
+        )).rowcount
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_fund_nav_history_fund_date "
+            "ON fund_nav_history (fund_id, date)"
+        ))
+    return removed
+
+
+def run_migrations():
+    """按顺序执行全部升级步骤（需在 app context 内调用）。"""
+    removed = upgrade_fund_nav_history()
+    if removed:
+        print(f'fund_nav_history：已合并 {removed} 条重复净值记录')
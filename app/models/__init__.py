@@ -8,6 +8,8 @@ from app.models.agreement import Agreement
 from app.models.user_setting import UserSetting
 from app.models.chat_conversation import ChatConversation
 from app.models.etf_kline_cache import EtfKlineCache
+from app.models.etf_chip_state import EtfChipState
+from app.models.etf_chip_snapshot import EtfChipSnapshot
 
 __all__ = ['User', 'Fund', 'Position', 'Profit', 'FundNavHistory', 'Transaction', 'Agreement',
-           'UserSetting', 'ChatConversation', 'EtfKlineCache']
+           'UserSetting', 'ChatConversation', 'EtfKlineCache', 'EtfChipState', 'EtfChipSnapshot']
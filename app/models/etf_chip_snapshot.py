@@ -0,0 +1,55 @@
+import json
+from datetime import datetime
+
+import numpy as np
+
+from app.extensions import db
+
+
+class EtfChipSnapshot(db.Model):
+    """场内 ETF 默认参数筹码分布的每日快照。
+
+    收盘后预取任务按 (symbol, date) 写入默认参数的分布、峰位和指标（指标按当日收盘价），
+    默认参数的 chip-data 请求按唯一索引取一行即可返回，不再读状态或计算。
+    """
+    __tablename__ = 'etf_chip_snapshot'
+
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(10), nullable=False)     # 'SH562500'
+    date = db.Column(db.Date, nullable=False)             # 分布所含的最新 K 线日期
+    close = db.Column(db.Float, nullable=False)           # metrics 所用价格（当日收盘价）
+    lo_bound = db.Column(db.Float, nullable=False)
+    bin_width = db.Column(db.Float, nullable=False)
+    weights = db.Column(db.LargeBinary, nullable=False)   # float64 原始字节
+    peaks = db.Column(db.Text, nullable=False, default='[]')
+    metrics = db.Column(db.Text, nullable=False, default='{}')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('symbol', 'date', name='uq_etf_chip_snapshot_symbol_date'),
+    )
+
+    def __repr__(self):
+        return f'<EtfChipSnapshot {self.symbol} {self.date}>'
+
+    def get_weights(self) -> np.ndarray:
+        return np.frombuffer(self.weights, dtype=np.float64).copy()
+
+    def set_weights(self, weights: np.ndarray) -> None:
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64).tobytes()
+
+    def get_peaks(self) -> list:
+        return json.loads(self.peaks)
+
+    def get_metrics(self) -> dict:
+        return json.loads(self.metrics)
+
+    @staticmethod
+    def get(symbol: str, day):
+        """按 (symbol, date) 取快照，无则返回 None。"""
+        return EtfChipSnapshot.query.filter_by(symbol=symbol, date=day).first()
+
+    @staticmethod
+    def delete_before(day) -> int:
+        """删除 day 之前的快照，返回删除行数。"""
+        return EtfChipSnapshot.query.filter(EtfChipSnapshot.date < day).delete(synchronize_session=False)
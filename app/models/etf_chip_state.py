@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import numpy as np
+
+from app.extensions import db
+
+
+class EtfChipState(db.Model):
+    """场内 ETF 筹码分布增量状态。
+
+    按 (symbol, decay, bin_count, window_days, kernel) 持久化衰减后的桶权重，
+    新 K 线入库时 O(bins) 前推一天，请求时直接读取，避免每次全量重算。
+    """
+    __tablename__ = 'etf_chip_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(10), nullable=False, index=True)  # 'SH562500'
+    decay = db.Column(db.Float, nullable=False)
+    bin_count = db.Column(db.Integer, nullable=False)     # 请求的桶数（实际桶数见 weights 长度）
+    window_days = db.Column(db.Integer, nullable=False)   # 参与计算的 K 线根数
+    kernel = db.Column(db.String(16), nullable=False, default='uniform', server_default='uniform')  # 单根 K 线的分布形状
+    last_date = db.Column(db.Date, nullable=False)        # 状态已包含的最新 K 线日期
+    lo_bound = db.Column(db.Float, nullable=False)
+    bin_width = db.Column(db.Float, nullable=False)
+    weights = db.Column(db.LargeBinary, nullable=False)   # float64 原始字节
+    viewed_at = db.Column(db.DateTime, index=True)        # 最近一次被筹码页请求的时间（按天记录）
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('symbol', 'decay', 'bin_count', 'window_days', 'kernel', name='uq_etf_chip_state_key'),
+    )
+
+    def __repr__(self):
+        return f'<EtfChipState {self.symbol} decay={self.decay} bins={self.bin_count} {self.kernel} last={self.last_date}>'
+
+    def get_weights(self) -> np.ndarray:
+        return np.frombuffer(self.weights, dtype=np.float64).copy()
+
+    def set_weights(self, weights) -> None:
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64).tobytes()
+
+    @staticmethod
+    def get(symbol: str, decay: float, bin_count: int, window_days: int, kernel: str = 'uniform'):
+        """按完整键取状态，无则返回 None。"""
+        return EtfChipState.query.filter_by(
+            symbol=symbol, decay=decay, bin_count=bin_count, window_days=window_days, kernel=kernel,
+        ).first()
+
+    @staticmethod
+    def viewed_since(since: datetime):
+        """since 之后被请求过的全部状态。"""
+        return EtfChipState.query.filter(EtfChipState.viewed_at >= since).all()
+
+    @staticmethod
+    def for_symbol(symbol: str):
+        """返回该 symbol 的全部参数组合状态。"""
+        return EtfChipState.query.filter_by(symbol=symbol).all()
+
+    @staticmethod
+    def delete_unviewed_since(since: datetime) -> int:
+        """删除 since 之后未被请求过的状态（viewed_at 为空时看 created_at），返回删除行数。"""
+        return EtfChipState.query.filter(
+            db.func.coalesce(EtfChipState.viewed_at, EtfChipState.created_at) < since,
+        ).delete(synchronize_session=False)
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 
 from app.extensions import db
 
@@ -27,6 +28,9 @@ class EtfKlineCache(db.Model):
         db.UniqueConstraint('symbol', 'date', name='uq_etf_kline_symbol_date'),
     )
 
+    # bulk_upsert 比较 / 改写的行情列
+    _BAR_FIELDS = ('open', 'high', 'low', 'close', 'volume', 'amount')
+
     def __repr__(self):
         return f'<EtfKlineCache {self.symbol} {self.date} close={self.close}>'
 
@@ -64,3 +68,127 @@ class EtfKlineCache(db.Model):
             .first()
         )
         return row.name if row else None
+
+    @staticmethod
+    def get_latest_names(symbols: list[str]) -> dict:
+        """批量返回 {symbol: 最新一条非空 name}；无名称的 symbol 不出现。"""
+        if not symbols:
+            return {}
+        latest = (
+            db.session.query(EtfKlineCache.symbol, db.func.max(EtfKlineCache.date).label('date'))
+            .filter(EtfKlineCache.symbol.in_(symbols), EtfKlineCache.name.isnot(None))
+            .group_by(EtfKlineCache.symbol)
+            .subquery()
+        )
+        rows = (
+            db.session.query(EtfKlineCache.symbol, EtfKlineCache.name)
+            .join(latest, db.and_(latest.c.symbol == EtfKlineCache.symbol, latest.c.date == EtfKlineCache.date))
+            .all()
+        )
+        return {symbol: name for symbol, name in rows}
+
+    @staticmethod
+    def get_latest_dates(symbols: list[str]) -> dict:
+        """批量返回 {symbol: 最新日期}，单条 GROUP BY 查询；无数据的 symbol 不出现。"""
+        if not symbols:
+            return {}
+        rows = (
+            db.session.query(EtfKlineCache.symbol, db.func.max(EtfKlineCache.date))
+            .filter(EtfKlineCache.symbol.in_(symbols))
+            .group_by(EtfKlineCache.symbol)
+            .all()
+        )
+        return {symbol: latest for symbol, latest in rows}
+
+    @staticmethod
+    def _series_columns():
+        return (
+            EtfKlineCache.date, EtfKlineCache.open, EtfKlineCache.high, EtfKlineCache.low,
+            EtfKlineCache.close, EtfKlineCache.volume, EtfKlineCache.amount,
+        )
+
+    @staticmethod
+    def get_series(symbol: str, days: int):
+        """最近 days 根 K 线的列式 BarSeries（升序），单条 SELECT 直接填充，不构造 ORM 对象。"""
+        from app.services.bar_series import BarSeries
+
+        rows = (
+            db.session.query(*EtfKlineCache._series_columns(), EtfKlineCache.name)
+            .filter(EtfKlineCache.symbol == symbol)
+            .order_by(EtfKlineCache.date.desc())
+            .limit(days)
+            .all()
+        )
+        name = next((r[-1] for r in rows if r[-1]), None)
+        return BarSeries.from_rows((r[:-1] for r in reversed(rows)), name=name)
+
+    @staticmethod
+    def get_series_many(symbols: list[str], days: int) -> dict:
+        """批量版 get_series：{symbol: BarSeries}，单条 IN + 窗口函数查询；无数据的 symbol 不出现。"""
+        from app.services.bar_series import BarSeries
+
+        if not symbols:
+            return {}
+        rn = db.func.row_number().over(
+            partition_by=EtfKlineCache.symbol,
+            order_by=EtfKlineCache.date.desc(),
+        ).label('rn')
+        ranked = (
+            db.session.query(EtfKlineCache.symbol, *EtfKlineCache._series_columns(), EtfKlineCache.name, rn)
+            .filter(EtfKlineCache.symbol.in_(symbols))
+            .subquery()
+        )
+        rows = (
+            db.session.query(*(c for c in ranked.c if c.name != 'rn'))
+            .filter(ranked.c.rn <= days)
+            .order_by(ranked.c.symbol, ranked.c.date)
+            .all()
+        )
+        grouped: dict = {}
+        for r in rows:
+            grouped.setdefault(r[0], []).append(r)
+        result = {}
+        for symbol, group in grouped.items():
+            name = next((r[-1] for r in reversed(group) if r[-1]), None)
+            result[symbol] = BarSeries.from_rows((r[1:-1] for r in group), name=name)
+        return result
+
+    @staticmethod
+    def bulk_upsert(symbol: str, bars: list[dict], name=None, chunk_size: Optional[int] = None) -> list:
+        """批量写入一批解析好的 K 线：INSERT ... ON CONFLICT(symbol, date) DO UPDATE。
+
+        bars 为 {'date': date, 'open', 'high', 'low', 'close', 'volume', 'amount'}，
+        同一日期以最后一条为准。先用一条范围查询取出已存的行，只写新增或数值有变化的
+        K 线；name 非空时一并写入。不提交事务。
+
+        Returns: 新增或被改写的日期（升序），供筹码状态推进使用。
+        """
+        from app.services.db import upsert
+
+        by_date = {b['date']: b for b in bars}
+        if not by_date:
+            return []
+        fields = EtfKlineCache._BAR_FIELDS
+        existing = {
+            row[0]: tuple(row[1:])
+            for row in db.session.query(
+                EtfKlineCache.date, *(getattr(EtfKlineCache, f) for f in fields)
+            ).filter(
+                EtfKlineCache.symbol == symbol,
+                EtfKlineCache.date.between(min(by_date), max(by_date)),
+            )
+        }
+        changed = sorted(
+            d for d, b in by_date.items()
+            if existing.get(d) != tuple(b.get(f) for f in fields)
+        )
+        if not changed:
+            return []
+        rows = [
+            dict({f: by_date[d].get(f) for f in fields}, symbol=symbol, date=d, name=name)
+            for d in changed
+        ]
+        update_columns = list(fields) + (['name'] if name else [])
+        upsert(EtfKlineCache, rows, index_elements=['symbol', 'date'],
+               update_columns=update_columns, chunk_size=chunk_size)
+        return changed
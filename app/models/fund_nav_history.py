@@ -1,5 +1,5 @@
 from app.extensions import db
-from datetime import datetime, timedelta
+from datetime import datetime
 
 
 class FundNavHistory(db.Model):
@@ -8,25 +8,52 @@ class FundNavHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     fund_id = db.Column(db.Integer, db.ForeignKey('fund.id'), nullable=False)
     nav = db.Column(db.Float, nullable=False)
-    date = db.Column(db.DateTime, nullable=False)
+    date = db.Column(db.Date, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     fund = db.relationship('Fund', backref=db.backref('nav_histories', lazy=True))
 
+    # 每只基金每天一条净值；旧库由 app.migrations.upgrade_fund_nav_history 补建
+    __table_args__ = (
+        db.Index('uq_fund_nav_history_fund_date', 'fund_id', 'date', unique=True),
+    )
+
     def __repr__(self):
         return f'<FundNavHistory fund_id={self.fund_id} date={self.date.strftime("%Y-%m-%d")} nav={self.nav}>'
 
     @staticmethod
     def get_nav_by_date(fund_id, date):
-        """根据基金ID和日期获取净值"""
+        """根据基金ID和日期获取净值（传入 datetime 时按其日期部分查询）"""
+        if isinstance(date, datetime):
+            date = date.date()
         return FundNavHistory.query.filter_by(fund_id=fund_id, date=date).first()
 
+    @staticmethod
+    def upsert(fund_id, date, nav):
+        """写入某日净值：(fund_id, date) 已存在则覆盖净值，单条 INSERT ... ON CONFLICT。不提交事务。"""
+        from app.services.db import upsert
+
+        if isinstance(date, datetime):
+            date = date.date()
+        upsert(
+            FundNavHistory,
+            [{'fund_id': fund_id, 'date': date, 'nav': nav}],
+            index_elements=['fund_id', 'date'],
+            update_columns=['nav'],
+        )
+
     @staticmethod
     def get_latest_navs(fund_id, max_days=30):
-        """获取基金最近指定天数的净值历史数据（排除周末）"""
+        """获取基金最近 max_days 个交易日的净值历史数据（按交易日历排除周末和节假日）"""
+        from app.services.trading_calendar import get_calendar
+
+        if max_days <= 0:
+            return []
+        calendar = get_calendar()
         end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=max_days * 3)
+        # 向前多取一倍交易日，容忍个别交易日缺数据
+        start_date = calendar.recent_trading_days(end_date, max_days * 2)[0]
 
         nav_records = FundNavHistory.query.filter(
             FundNavHistory.fund_id == fund_id,
@@ -34,12 +61,6 @@ class FundNavHistory(db.Model):
             FundNavHistory.date <= end_date
         ).order_by(FundNavHistory.date.desc()).all()
 
-        trading_days = []
-        for record in nav_records:
-            if record.date.weekday() < 5:
-                trading_days.append(record)
-                if len(trading_days) >= max_days:
-                    break
-
+        trading_days = [r for r in nav_records if calendar.is_trading_day(r.date)][:max_days]
         trading_days.sort(key=lambda x: x.date)
         return trading_days
@@ -322,25 +322,24 @@ def _build_investment_context():
 
 def _build_quote_context_for_positions(positions):
     """为持仓构建实时行情上下文（场内 ETF + 场外基金 pair）."""
-    from app.services.quote_provider import build_pair_context
+    from app.services.quote_provider import build_pair_contexts
 
-    # 已知 fund code -> (pair_name, etf_code)
-    # 先只支持 robot 这个 pair，后续可扩展为配置或数据库表
-    KNOWN_PAIRS = {
-        "018344": ("robot", "562500"),   # 华夏中证机器人ETF联接A -> 机器人ETF华夏
-    }
+    # 已配置的 fund code -> (pair_name, etf_code)
+    known_pairs = current_app.config.get('FUND_ETF_PAIRS', {})
 
-    contexts = []
+    # 同一基金多笔持仓只取一次；全部 pair 交给 QuoteClient 批量拉取
+    pairs = []
+    seen = set()
     for pos in positions:
         if not pos.fund:
             continue
         fund_code = pos.fund.code
-        if fund_code in KNOWN_PAIRS:
-            pair_name, etf_code = KNOWN_PAIRS[fund_code]
-            ctx = build_pair_context(pair_name, etf_code, fund_code)
-            if ctx:
-                contexts.append(ctx)
+        if fund_code in known_pairs and fund_code not in seen:
+            seen.add(fund_code)
+            pair_name, etf_code = known_pairs[fund_code]
+            pairs.append((pair_name, etf_code, fund_code))
 
+    contexts = build_pair_contexts(pairs)
     if not contexts:
         return None
     return "\n\n".join(contexts)
@@ -1,10 +1,14 @@
 """场内 ETF 技术分析蓝图：筹码峰等."""
+from datetime import date
+import math
 import re
+from concurrent.futures import ThreadPoolExecutor
+
 from flask import Blueprint, render_template, request, jsonify, abort
 from flask_babel import gettext as _
 from flask_login import login_required
 
-from app.services import quote_provider, chip_distribution
+from app.services import quote_provider, chip_distribution, chip_snapshot, chip_state
 
 bp = Blueprint('charts', __name__, url_prefix='/charts')
 
@@ -48,7 +52,12 @@ def etf_chip_page(symbol: str):
 @bp.route('/api/etf/<symbol>/chip-data')
 @login_required
 def etf_chip_data(symbol: str):
-    """筹码峰 JSON 数据."""
+    """筹码峰 JSON 数据.
+
+    decays=0.9,0.97,0.99（或 decays=presets）时一次返回多个衰减系数的分布：
+    klines 等公共字段只有一份，各 decay 的 peaks / metrics / distribution 在 sweeps 里。
+    source 标明分布来源：snapshot（收盘后快照）/ state（增量状态）/ computed（本次计算）。
+    """
     prefixed = _validate_symbol(symbol)
     if not prefixed:
         abort(404)
@@ -57,6 +66,12 @@ def etf_chip_data(symbol: str):
     decay = request.args.get('decay', 0.97, type=float)
     bins = request.args.get('bins', 80, type=int)
     band = request.args.get('band', 0.05, type=float)
+    kernel = request.args.get('kernel', 'uniform')
+    if kernel not in chip_distribution.KERNELS:
+        return jsonify({'error': _('未知的分布形状：%(kernel)s', kernel=kernel)}), 400
+    decays = _parse_decays(request.args.get('decays'))
+    if decays is None or not _chip_params_valid(days, decay, bins, band, SINGLE_WINDOW_RANGE, SINGLE_BINS_RANGE):
+        return jsonify({'error': _('参数格式错误')}), 400
 
     bars = quote_provider.fetch_etf_daily_kline(symbol, days=days)
     if not bars:
@@ -64,48 +79,370 @@ def etf_chip_data(symbol: str):
 
     quote = quote_provider.fetch_etf_quote(symbol)
     cached_name = quote_provider.get_cached_etf_name(symbol)
-    current_price = quote.latest if quote and quote.latest > 0 else bars[-1].close
+    current_price = quote.latest if quote and quote.latest > 0 else float(bars.close[-1])
+    name = _display_name(prefixed, quote, cached_name)
 
-    dist = chip_distribution.compute_chip_distribution(bars, decay=decay, bin_count=bins)
-    peaks = chip_distribution.find_peaks(dist, top_k=3)
-    concentration = chip_distribution.compute_concentration(dist, current_price, band_pct=band)
-    profit_ratio = chip_distribution.compute_profit_ratio(dist, current_price)
-    avg_cost = chip_distribution.compute_avg_cost(dist)
+    if not decays:
+        # 默认参数先查收盘后生成的快照，其次增量状态，最后全量计算；source 标明走了哪条路
+        served = None
+        if chip_snapshot.is_default(decay, bins, days, kernel):
+            served = chip_snapshot.load(prefixed, bars.last_date, current_price, band)
+        if served is not None:
+            dist, summary = served
+            chip_state.touch([prefixed], decay, bins, days, kernel)
+            payload = _chip_payload(prefixed, name, quote, current_price, bars, None, band, kernel=kernel)
+            payload.update(_chip_analysis(dist, current_price, band, summary=summary))
+            payload['source'] = 'snapshot'
+            return jsonify(payload)
+        dists, source = _load_distributions(prefixed, bars, [decay], bins, days, kernel)
+        payload = _chip_payload(prefixed, name, quote, current_price, bars, dists[0], band, kernel=kernel)
+        payload['source'] = source
+        return jsonify(payload)
 
-    if quote and quote.name and quote.name != 'Unknown':
-        name = quote.name
-    elif cached_name:
-        name = cached_name
+    # 多个 decay：K 线、行情只取一次，分布共用网格一次算完
+    dists, source = _load_distributions(prefixed, bars, decays, bins, days, kernel)
+    payload = _chip_payload(prefixed, name, quote, current_price, bars, None, band, kernel=kernel)
+    payload['source'] = source
+    payload['sweeps'] = [
+        dict(_chip_analysis(dist, current_price, band), decay=d)
+        for d, dist in zip(decays, dists)
+    ]
+    return jsonify(payload)
+
+
+# chip-data decays=presets 展开的衰减系数（与页面上的衰减选项一致）
+DECAY_PRESETS = chip_state.PERSISTED_DECAYS
+# 单次请求最多的 decay 个数
+DECAY_SWEEP_MAX = 8
+# 筹码分布参数的取值范围（含端点）；批量与 chip-history 的计算量成倍放大，用较紧的上限
+BINS_RANGE = (5, 400)
+WINDOW_RANGE = (5, 1000)
+BAND_RANGE = (0.001, 0.5)
+# 单个分布（chip-data / chip-query）放宽到长历史、细网格
+SINGLE_BINS_RANGE = (5, 1000)
+SINGLE_WINDOW_RANGE = (5, 5000)
+
+
+def _chip_params_valid(days, decay, bins, band, window_range=WINDOW_RANGE, bins_range=BINS_RANGE) -> bool:
+    """K 线根数、衰减系数、桶数、集中度带宽是否都在允许范围内。"""
+    return (
+        window_range[0] <= days <= window_range[1]
+        and 0 < decay <= 1
+        and bins_range[0] <= bins <= bins_range[1]
+        and BAND_RANGE[0] <= band <= BAND_RANGE[1]
+    )
+
+
+def _parse_decays(raw):
+    """decays 参数：'presets' 或逗号分隔的衰减系数；未提供返回 []，格式错误返回 None。"""
+    if not raw:
+        return []
+    if raw == 'presets':
+        return list(DECAY_PRESETS)
+    try:
+        decays = list(dict.fromkeys(float(v) for v in raw.split(',') if v.strip()))
+    except ValueError:
+        return None
+    if not 0 < len(decays) <= DECAY_SWEEP_MAX or not all(0 < d <= 1 for d in decays):
+        return None
+    return decays
+
+
+def _load_distributions(prefixed, bars, decays, bins, days, kernel):
+    """增量状态已推进到最新 K 线时直接读取，否则全量计算并存为新状态。
+
+    Returns: (按 decays 顺序的分布列表, 'state' 全部命中状态 / 'computed' 有重新计算的)
+    """
+    as_of = bars.last_date
+    dists = {d: chip_state.get_distribution(prefixed, d, bins, days, as_of, kernel) for d in decays}
+    missing = [d for d, dist in dists.items() if dist is None]
+    # 多个 decay 须共用同一网格：状态各自前推、突破时各自重划网格，
+    # 有缺失或网格不一致时全部按当前窗口一起重算
+    if len(decays) > 1 and (missing or not _same_grid(list(dists.values()))):
+        missing = list(decays)
+    if len(missing) == 1:
+        computed = [chip_distribution.compute_chip_distribution(
+            bars, decay=missing[0], bin_count=bins, kernel=kernel)]
     else:
-        name = prefixed
+        computed = chip_distribution.compute_chip_distributions(bars, missing, bin_count=bins, kernel=kernel)
+    for d, dist in zip(missing, computed):
+        chip_state.save_distribution(prefixed, d, bins, days, as_of, dist, kernel)
+        dists[d] = dist
+    for d in decays:
+        chip_state.touch([prefixed], d, bins, days, kernel)
+    return [dists[d] for d in decays], ('computed' if missing else 'state')
 
-    return jsonify({
+
+def _same_grid(dists) -> bool:
+    """各分布的桶数与首尾边界是否一致。"""
+    first = dists[0]
+    return all(
+        len(d) == len(first)
+        and math.isclose(d[0][0], first[0][0], rel_tol=1e-12)
+        and math.isclose(d[-1][1], first[-1][1], rel_tol=1e-12)
+        for d in dists[1:]
+    )
+
+
+@bp.route('/api/etf/<symbol>/chip-query')
+@login_required
+def etf_chip_query(symbol: str):
+    """在已算好的筹码分布上做价位查询（前端拖动价格游标用），不重算分布.
+
+    分布参数 days / decay / bins / kernel 同 chip-data；as_of 传 chip-data 返回的同名字段，
+    缺省取库中最新 K 线日期，该日的增量状态存在时直接查询，不读 K 线。查询参数：
+    price（可重复）：该价以下 / ±band 内的筹码占比；low + high：区间占比与区间平均成本；
+    q（可重复，默认 0.05 与 0.95）：成本分位价。
+    """
+    prefixed = _validate_symbol(symbol)
+    if not prefixed:
+        abort(404)
+
+    days = request.args.get('days', 250, type=int)
+    decay = request.args.get('decay', 0.97, type=float)
+    bins = request.args.get('bins', 80, type=int)
+    band = request.args.get('band', 0.05, type=float)
+    kernel = request.args.get('kernel', 'uniform')
+    if kernel not in chip_distribution.KERNELS:
+        return jsonify({'error': _('未知的分布形状：%(kernel)s', kernel=kernel)}), 400
+    prices = request.args.getlist('price', type=float)
+    quantiles = request.args.getlist('q', type=float) or [0.05, 0.95]
+    low = request.args.get('low', type=float)
+    high = request.args.get('high', type=float)
+    try:
+        as_of = date.fromisoformat(request.args['as_of']) if request.args.get('as_of') else None
+    except ValueError:
+        return jsonify({'error': _('参数格式错误')}), 400
+    if not _chip_params_valid(days, decay, bins, band, SINGLE_WINDOW_RANGE, SINGLE_BINS_RANGE):
+        return jsonify({'error': _('参数格式错误')}), 400
+
+    # 拖动游标时只按 as_of 读状态；状态缺失（或已被新 K 线推进）才读 K 线重算
+    from app.models.etf_kline_cache import EtfKlineCache
+    as_of = as_of or EtfKlineCache.get_latest_date(prefixed)
+    dist = chip_state.get_distribution(prefixed, decay, bins, days, as_of, kernel) if as_of else None
+    if dist is None:
+        bars = quote_provider.fetch_etf_daily_kline(symbol, days=days)
+        if not bars:
+            return jsonify({'error': _('该代码无历史数据，请确认是否为场内 ETF')}), 404
+        as_of = bars.last_date
+        dist = _load_distributions(prefixed, bars, [decay], bins, days, kernel)[0][0]
+    index = chip_distribution.ChipIndex.from_distribution(dist)
+
+    payload = {
+        'symbol': prefixed,
+        'as_of': as_of.isoformat(),
+        'kernel': kernel,
+        'total': index.total,
+        'avg_cost': index.avg_cost(),
+        'prices': [
+            {
+                'price': price,
+                'profit_ratio': index.profit_ratio(price),
+                'concentration': index.concentration(price, band),
+            }
+            for price in prices
+        ],
+        'percentiles': [{'q': q, 'price': index.percentile(q)} for q in quantiles],
+    }
+    if low is not None and high is not None:
+        payload['range'] = {
+            'low': low,
+            'high': high,
+            'ratio': index.band_ratio(low, high),
+            'avg_cost': index.avg_cost(low, high),
+        }
+    return jsonify(payload)
+
+
+# 单次批量请求的代码数上限
+BATCH_MAX_SYMBOLS = 100
+
+
+@bp.route('/api/etf/chip-data:batch', methods=['POST'])
+@login_required
+def etf_chip_data_batch():
+    """批量筹码峰 JSON：一次 IN 查询读 K 线、一次 ulist 拉行情、并行计算分布.
+
+    请求体：{"symbols": [...], "days": 250, "decay": 0.97, "bins": 80, "band": 0.05,
+             "kernel": "uniform", "include_klines": false, "include_distribution": false}
+    默认只返回 metrics + peaks。
+    """
+    body = request.get_json(silent=True) or {}
+    raw_symbols = body.get('symbols')
+    if not isinstance(raw_symbols, list) or not raw_symbols:
+        return jsonify({'error': _('请提供 symbols 列表')}), 400
+    if len(raw_symbols) > BATCH_MAX_SYMBOLS:
+        return jsonify({'error': _('单次最多 %(n)s 个代码', n=BATCH_MAX_SYMBOLS)}), 400
+
+    try:
+        days = int(body.get('days', 250))
+        decay = float(body.get('decay', 0.97))
+        bins = int(body.get('bins', 80))
+        band = float(body.get('band', 0.05))
+    except (TypeError, ValueError):
+        return jsonify({'error': _('参数格式错误')}), 400
+    if not _chip_params_valid(days, decay, bins, band):
+        return jsonify({'error': _('参数格式错误')}), 400
+    kernel = body.get('kernel', 'uniform')
+    if kernel not in chip_distribution.KERNELS:
+        return jsonify({'error': _('未知的分布形状：%(kernel)s', kernel=kernel)}), 400
+    include_klines = bool(body.get('include_klines'))
+    include_distribution = bool(body.get('include_distribution'))
+
+    errors = {}
+    symbols = []
+    for raw in raw_symbols:
+        prefixed = _validate_symbol(str(raw))
+        if not prefixed:
+            errors[str(raw)] = _('代码格式错误')
+        elif prefixed not in symbols:
+            symbols.append(prefixed)
+
+    # 只有缓存落后的代码才并发增量拉取，之后一次批量读库
+    from app.services.kline_store import get_kline_store
+    quote_provider.refresh_stale_klines(symbols, days=days)
+    series_by_symbol = get_kline_store().read_many(symbols, days)
+    quotes = quote_provider.fetch_etf_quotes(symbols)
+
+    jobs = {}
+    for prefixed in symbols:
+        bars = series_by_symbol.get(prefixed)
+        if not bars:
+            errors[prefixed] = _('该代码无历史数据，请确认是否为场内 ETF')
+            continue
+        jobs[prefixed] = (bars, chip_state.get_distribution(prefixed, decay, bins, days, bars.last_date, kernel))
+
+    pending = {s: bars for s, (bars, dist) in jobs.items() if dist is None}
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(8, len(pending))) as pool:
+            futures = {
+                s: pool.submit(
+                    chip_distribution.compute_chip_distribution, bars, decay=decay, bin_count=bins, kernel=kernel,
+                )
+                for s, bars in pending.items()
+            }
+            computed = {s: f.result() for s, f in futures.items()}
+        for s, dist in computed.items():
+            bars = jobs[s][0]
+            chip_state.save_distribution(s, decay, bins, days, bars.last_date, dist, kernel)
+            jobs[s] = (bars, dist)
+    chip_state.touch(list(jobs), decay, bins, days, kernel)
+
+    results = {}
+    for prefixed, (bars, dist) in jobs.items():
+        quote = quotes.get(prefixed)
+        current_price = quote.latest if quote and quote.latest > 0 else float(bars.close[-1])
+        name = _display_name(prefixed, quote, bars.name)
+        results[prefixed] = _chip_payload(
+            prefixed, name, quote, current_price, bars, dist, band, kernel=kernel,
+            include_klines=include_klines, include_distribution=include_distribution,
+        )
+
+    return jsonify({'results': results, 'errors': errors})
+
+
+# chip-history 单次最多回看的交易日数
+HISTORY_MAX_DAYS = 1000
+
+
+@bp.route('/api/etf/<symbol>/chip-history')
+@login_required
+def etf_chip_history(symbol: str):
+    """筹码指标逐日演变（列式 JSON），供支撑 / 压力位漂移监控.
+
+    参数：days（回看交易日数，默认 120）、window（每天分布用的 K 线根数，默认 250）、
+    decay / bins / band / kernel 同 chip-data；snapshot_every > 0 时每隔该天数附一帧
+    合并到约 snapshot_bins 个桶的分布（动画用）。
+    """
+    prefixed = _validate_symbol(symbol)
+    if not prefixed:
+        abort(404)
+
+    days = request.args.get('days', 120, type=int)
+    window = request.args.get('window', 250, type=int)
+    decay = request.args.get('decay', 0.97, type=float)
+    bins = request.args.get('bins', 80, type=int)
+    band = request.args.get('band', 0.05, type=float)
+    kernel = request.args.get('kernel', 'uniform')
+    snapshot_every = request.args.get('snapshot_every', 0, type=int)
+    snapshot_bins = request.args.get('snapshot_bins', 40, type=int)
+    if kernel not in chip_distribution.KERNELS:
+        return jsonify({'error': _('未知的分布形状：%(kernel)s', kernel=kernel)}), 400
+    if (not 0 < days <= HISTORY_MAX_DAYS or not _chip_params_valid(window, decay, bins, band)
+            or snapshot_every < 0 or not BINS_RANGE[0] <= snapshot_bins <= BINS_RANGE[1]):
+        return jsonify({'error': _('参数格式错误')}), 400
+
+    bars = quote_provider.fetch_etf_daily_kline(symbol, days=days + window - 1)
+    history = chip_distribution.compute_chip_history(
+        bars, days, window=window, decay=decay, bin_count=bins, band_pct=band, kernel=kernel,
+        snapshot_every=snapshot_every, snapshot_bins=snapshot_bins,
+    ) if bars else None
+    if history is None:
+        return jsonify({'error': _('该代码无历史数据，请确认是否为场内 ETF')}), 404
+
+    payload = {
+        'symbol': prefixed,
+        'name': _display_name(prefixed, None, quote_provider.get_cached_etf_name(symbol)),
+        'kernel': kernel,
+        'window': window,
+        'dates': history.dates,
+        'close': history.close,
+        'profit_ratio': history.profit_ratio,
+        'avg_cost': history.avg_cost,
+        'concentration': history.concentration,
+        'main_peak': history.main_peak,
+    }
+    if snapshot_every > 0:
+        payload['snapshots'] = {
+            'every': snapshot_every,
+            'price_edges': history.snapshot_edges,
+            'dates': history.snapshot_dates,
+            'weights': history.snapshot_weights,
+        }
+    return jsonify(payload)
+
+
+def _display_name(prefixed: str, quote, cached_name) -> str:
+    """行情名 → 缓存名 → 代码本身。"""
+    if quote and quote.name and quote.name != 'Unknown':
+        return quote.name
+    if cached_name:
+        return cached_name
+    return prefixed
+
+
+def _chip_payload(prefixed, name, quote, current_price, bars, dist, band, kernel='uniform',
+                  include_klines=True, include_distribution=True) -> dict:
+    """组装单只 ETF 的筹码峰 JSON。
+
+    as_of 为最新 K 线日期；stale 表示 K 线尚未到最近收盘日（后台刷新中或远端不可用）。
+    dist 为 None 时只含公共字段（多 decay 时各分布另放在 sweeps 里）。
+    """
+    payload = {
         'symbol': prefixed,
         'name': name,
         'current_price': current_price,
         'change_pct': quote.change_pct if quote else 0.0,
-        'klines': [
-            {'date': b.date, 'open': b.open, 'high': b.high, 'low': b.low,
-             'close': b.close, 'volume': b.volume, 'amount': b.amount}
-            for b in bars
-        ],
-        'distribution': [
+        'as_of': bars.last_date.isoformat(),
+        'stale': not quote_provider.kline_is_fresh(bars.last_date),
+        'kernel': kernel,
+    }
+    if dist is not None:
+        payload.update(_chip_analysis(dist, current_price, band, include_distribution))
+    if include_klines:
+        payload['klines'] = bars.to_records()
+    return payload
+
+
+def _chip_analysis(dist, current_price, band, include_distribution=True, summary=None) -> dict:
+    """单个分布的 peaks / metrics（及 distribution）；summary 为快照里已算好的 peaks / metrics。"""
+    result = dict(summary) if summary is not None else chip_distribution.summarize(dist, current_price, band)
+    if include_distribution:
+        result['distribution'] = [
             {'price_low': lo, 'price_high': hi, 'weight': w}
             for lo, hi, w in dist
-        ],
-        'peaks': [
-            {'price': p.price, 'weight': p.weight, 'intensity': p.intensity}
-            for p in peaks
-        ],
-        'metrics': {
-            'concentration': concentration,
-            'profit_ratio': profit_ratio,
-            'avg_cost': avg_cost,
-            'avg_profit_pct': ((current_price - avg_cost) / avg_cost * 100) if avg_cost else None,
-            'main_peak': peaks[0].price if peaks else None,
-            'secondary_peak': peaks[1].price if len(peaks) > 1 else None,
-        },
-    })
+        ]
+    return result
 
 
 @bp.route('/api/etf/<symbol>/akshare-test')
@@ -131,9 +468,18 @@ def etf_akshare_test(symbol: str):
         'source': 'akshare',
         'symbol': prefixed,
         'ok': True,
-        'klines': [
-            {'date': b.date, 'open': b.open, 'high': b.high, 'low': b.low,
-             'close': b.close, 'volume': b.volume, 'amount': b.amount}
-            for b in bars
-        ],
+        'klines': bars.to_records(),
+    })
+
+
+@bp.route('/api/sources')
+@login_required
+def source_status():
+    """行情 / 日 K / 净值数据源的路由状态（熔断、错误率、平均耗时）及行情缓存统计。"""
+    from app.services.shared_cache import shared_cache
+    from app.services.source_router import source_router
+    return jsonify({
+        'sources': source_router.snapshot(),
+        'quote_cache': quote_provider.quote_cache.stats(),
+        'shared_cache': shared_cache.stats(),
     })
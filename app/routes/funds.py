@@ -126,15 +126,11 @@ def crawl_fund_nav():
         is_batch = request.form.get('batch') or not request.form.get('fund_id')
 
         if is_batch:
-            funds = Fund.query.all()
-            success_count = fail_count = 0
-            fail_funds = []
-            for fund in funds:
-                if update_fund_nav(fund.code):
-                    success_count += 1
-                else:
-                    fail_count += 1
-                    fail_funds.append(f"{fund.code} - {fund.name}")
+            from app.services.nav_pipeline import crawl_fund_navs
+            names = {fund.code: fund.name for fund in Fund.query.all()}
+            report = crawl_fund_navs(list(names))
+            success_count, fail_count = report.success_count, report.fail_count
+            fail_funds = [f"{code} - {names.get(code)}" for code in report.failures]
             msg = _('批量更新完成：成功 %(success_count)s 个，失败 %(fail_count)s 个', success_count=success_count, fail_count=fail_count)
             if fail_funds:
                 msg += _('\n失败：%(funds)s', funds=', '.join(fail_funds[:5]) + ('...' if len(fail_funds) > 5 else ''))
@@ -0,0 +1,138 @@
+"""列式日 K 序列.
+
+BarSeries 把一段 K 线按列存成 NumPy 数组（日期为 1970-01-01 起的 int64 天数），
+由一条 SQL 结果直接填充，筹码引擎、JSON 序列化按列消费，
+长历史不再为每根 K 线构造 Python 对象。
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
+
+import numpy as np
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_PRICE_FIELDS = ('open', 'high', 'low', 'close')
+
+
+def _days(values) -> np.ndarray:
+    """date / datetime / 'YYYY-MM-DD' 序列 → int64 天数。"""
+    values = [v.date() if isinstance(v, datetime) else v for v in values]
+    return np.array(values, dtype='datetime64[D]').astype(np.int64)
+
+
+def _floats(values) -> np.ndarray:
+    """None 记为 NaN。"""
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _json_list(column: np.ndarray) -> list:
+    """列 → Python 列表，NaN 转 None（可直接 jsonify）。"""
+    values = column.tolist()
+    if column.dtype.kind == 'f' and np.isnan(column).any():
+        return [None if v != v else v for v in values]
+    return values
+
+
+@dataclass
+class BarSeries:
+    """按日期升序的场内 ETF 日 K 列（前复权）."""
+    days: np.ndarray       # int64，1970-01-01 起的天数
+    open: np.ndarray       # float64，缺失为 NaN
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray     # int64，成交量（股）
+    amount: np.ndarray     # float64，成交额（元）
+    name: Optional[str] = None
+
+    @classmethod
+    def empty(cls) -> 'BarSeries':
+        return cls.from_rows([])
+
+    @classmethod
+    def from_rows(cls, rows, name: Optional[str] = None) -> 'BarSeries':
+        """由 (date, open, high, low, close, volume, amount) 元组序列（SQL 结果）构造，须已按日期升序。"""
+        rows = list(rows)
+        if not rows:
+            f = np.empty(0, dtype=np.float64)
+            return cls(np.empty(0, dtype=np.int64), f, f.copy(), f.copy(), f.copy(),
+                       np.empty(0, dtype=np.int64), f.copy(), name=name)
+        d, o, h, lo, c, vol, amt = zip(*rows)
+        return cls(
+            days=_days(d),
+            open=_floats(o), high=_floats(h), low=_floats(lo), close=_floats(c),
+            volume=np.nan_to_num(_floats(vol)).astype(np.int64),
+            amount=np.nan_to_num(_floats(amt)),
+            name=name,
+        )
+
+    @classmethod
+    def from_bars(cls, bars, name: Optional[str] = None) -> 'BarSeries':
+        """由 ETFDailyBar / EtfKlineCache 行等带同名属性的对象构造，按日期排序。"""
+        series = cls.from_rows(
+            ((b.date, b.open, b.high, b.low, b.close, b.volume, b.amount) for b in bars),
+            name=name,
+        )
+        order = np.argsort(series.days, kind='stable')
+        if len(order) and np.any(order != np.arange(len(order))):
+            series = series[order]
+        return series
+
+    @classmethod
+    def coerce(cls, bars) -> 'BarSeries':
+        """BarSeries 原样返回，K 线对象列表转换为 BarSeries。"""
+        return bars if isinstance(bars, cls) else cls.from_bars(bars)
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def __getitem__(self, key):
+        """整数下标返回单根 ETFDailyBar；切片 / 下标数组返回 BarSeries。"""
+        if isinstance(key, (int, np.integer)):
+            from app.services.quote_provider import ETFDailyBar
+            return ETFDailyBar(
+                date=self.date_strings(self.days[[key]])[0],
+                open=float(self.open[key]), high=float(self.high[key]),
+                low=float(self.low[key]), close=float(self.close[key]),
+                volume=int(self.volume[key]), amount=float(self.amount[key]),
+            )
+        return BarSeries(
+            days=self.days[key], open=self.open[key], high=self.high[key],
+            low=self.low[key], close=self.close[key], volume=self.volume[key],
+            amount=self.amount[key], name=self.name,
+        )
+
+    def tail(self, count: int) -> 'BarSeries':
+        """最近 count 根。"""
+        return self[max(len(self) - count, 0):]
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self.days.astype('datetime64[D]')
+
+    @property
+    def last_date(self) -> Optional[date]:
+        if not len(self):
+            return None
+        return date.fromordinal(_EPOCH_ORDINAL + int(self.days[-1]))
+
+    @staticmethod
+    def date_strings(days: np.ndarray) -> list[str]:
+        """int64 天数 → 'YYYY-MM-DD' 列表。"""
+        return np.datetime_as_string(days.astype('datetime64[D]'), unit='D').tolist()
+
+    def to_rows(self) -> list[dict]:
+        """入库用的 [{'date': date, 'open', ...}, ...]（EtfKlineCache.bulk_upsert 的输入格式）。"""
+        columns = {'date': self.dates.tolist()}
+        for field in _PRICE_FIELDS + ('volume', 'amount'):
+            columns[field] = _json_list(getattr(self, field))
+        keys = list(columns)
+        return [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+    def to_records(self) -> list[dict]:
+        """JSON 用的 [{'date', 'open', 'high', 'low', 'close', 'volume', 'amount'}, ...]。"""
+        columns = {'date': self.date_strings(self.days)}
+        for field in _PRICE_FIELDS + ('volume', 'amount'):
+            columns[field] = _json_list(getattr(self, field))
+        keys = list(columns)
+        return [dict(zip(keys, values)) for values in zip(*columns.values())]
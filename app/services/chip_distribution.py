@@ -3,10 +3,12 @@
 基于历史日 K + 成交量，按指数衰减估算各价位筹码分布，
 用于找支撑/压力位（筹码峰）。
 """
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Optional, Union
 
-from app.services.quote_provider import ETFDailyBar
+import numpy as np
+
+from app.services.bar_series import BarSeries
 
 
 @dataclass
@@ -17,78 +19,275 @@ class ChipPeak:
     intensity: float      # 相对最大权重的比例 (0-1)
 
 
+@dataclass
+class ChipHistory:
+    """逐日筹码指标（列式，按日期升序）."""
+    dates: list[str]
+    close: list[float]
+    profit_ratio: list[float]
+    avg_cost: list[Optional[float]]
+    concentration: list[float]
+    main_peak: list[Optional[float]]
+    # 每 snapshot_every 天一帧的降采样分布：各帧共用价格边界 snapshot_edges
+    snapshot_edges: list[float] = field(default_factory=list)
+    snapshot_dates: list[str] = field(default_factory=list)
+    snapshot_weights: list[list[float]] = field(default_factory=list)
+
+
+def _bar_columns(bars) -> tuple[np.ndarray, ...]:
+    """按日期倒序（今天 N=0）取出 (low, high, close, volume) 四列 float64。
+
+    bars 为 BarSeries 时直接取列视图；K 线对象列表先转换为 BarSeries。
+    """
+    series = BarSeries.coerce(bars)
+    return (
+        series.low[::-1],
+        series.high[::-1],
+        np.nan_to_num(series.close[::-1]),
+        series.volume[::-1].astype(np.float64),
+    )
+
+
+def _price_grid(
+    low: np.ndarray,
+    high: np.ndarray,
+    volume: np.ndarray,
+    bin_count: int,
+    price_padding: float,
+) -> Optional[tuple[float, float, int]]:
+    """按有成交日的价格范围划分等宽桶。
+
+    Returns: (lo_bound, bin_width, bin_count)；无有效成交返回 None。
+    """
+    active = volume > 0
+    if not active.any():
+        return None
+    price_min = float(low[active].min())
+    price_max = float(high[active].max())
+    spread = price_max - price_min
+    # 极差过小（如货币基金）自适应桶数
+    if spread < 0.5 and bin_count > 40:
+        bin_count = 40
+
+    # 价格范围外扩 padding
+    pad = spread * price_padding if spread > 0 else max(price_max * price_padding, 0.01)
+    lo_bound = price_min - pad
+    hi_bound = price_max + pad
+    return lo_bound, (hi_bound - lo_bound) / bin_count, bin_count
+
+
+# 单根 K 线成交量在 [low, high] 内的分布形状
+KERNELS = ('uniform', 'triangular', 'typical')
+
+
+def _add_linear(
+    out: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    p: np.ndarray,
+    q: np.ndarray,
+) -> None:
+    """把密度 f(t) = p + q·t 在 [a, b] 上的积分精确累加到桶里（原地）。
+
+    t 为以桶宽为单位的网格坐标，桶 k 覆盖 [k, k+1)。区间首尾两个桶按交集直接积分，
+    中间整桶的积分 p + q·(k + 0.5) 是 k 的一次函数，用常数项、一次项两个差分数组
+    区间加，前缀和还原，整体 O(bars + bins)。前缀和的浮点误差会在空桶留下
+    极小的负值，最后截到 0。
+    """
+    bin_count = len(out)
+    a = np.clip(a, 0.0, bin_count)
+    b = np.clip(b, 0.0, bin_count)
+    keep = b > a
+    if not keep.any():
+        return
+    a, b, p, q = a[keep], b[keep], p[keep], q[keep]
+    first = np.minimum(a.astype(np.intp), bin_count - 1)
+    last = np.minimum(b.astype(np.intp), bin_count - 1)
+
+    def integral(x0, x1):
+        return p * (x1 - x0) + q * (x1 * x1 - x0 * x0) / 2
+
+    out += np.bincount(first, weights=integral(a, np.minimum(b, first + 1.0)), minlength=bin_count)
+    tail = last > first
+    if tail.any():
+        out += np.bincount(last[tail], weights=integral(last.astype(np.float64), b)[tail], minlength=bin_count)
+
+    inner = last > first + 1
+    if inner.any():
+        start, stop = first[inner] + 1, last[inner]
+        const = p[inner] + q[inner] / 2
+        slope = q[inner]
+        size = bin_count + 1
+        d0 = np.bincount(start, weights=const, minlength=size) - np.bincount(stop, weights=const, minlength=size)
+        d1 = np.bincount(start, weights=slope, minlength=size) - np.bincount(stop, weights=slope, minlength=size)
+        k = np.arange(bin_count, dtype=np.float64)
+        out += np.cumsum(d0)[:bin_count] + k * np.cumsum(d1)[:bin_count]
+    np.maximum(out, 0.0, out=out)
+
+
+def _spread(
+    low: np.ndarray,
+    high: np.ndarray,
+    close: np.ndarray,
+    weight: np.ndarray,
+    lo_bound: float,
+    bin_width: float,
+    bin_count: int,
+    kernel: str = 'uniform',
+) -> np.ndarray:
+    """把每根 K 线的 weight 在 [low, high] 内按 kernel 的形状摊到桶里。
+
+    - uniform：均匀分布；
+    - triangular：三角分布，峰在收盘价；
+    - typical：三角分布，峰在典型价 (high + low + close) / 3。
+
+    三种形状都是分段线性密度，按桶精确积分，耗时同为 O(bars + bins)。
+    """
+    if kernel not in KERNELS:
+        raise ValueError(f"未知的筹码分布形状: {kernel}")
+    out = np.zeros(bin_count)
+    keep = weight > 0
+    low, high, close, weight = low[keep], high[keep], close[keep], weight[keep]
+    last_bin = bin_count - 1
+
+    # 一字板：全部 weight 落入 close 对应的桶
+    flat = high <= low
+    if flat.any():
+        price = np.where(close[flat] != 0, close[flat], low[flat])
+        idx = np.clip(np.trunc((price - lo_bound) / bin_width), 0, last_bin).astype(np.intp)
+        out += np.bincount(idx, weights=weight[flat], minlength=bin_count)
+
+    ranged = ~flat
+    if not ranged.any():
+        return out
+    lo = (low[ranged] - lo_bound) / bin_width
+    hi = (high[ranged] - lo_bound) / bin_width
+    w = weight[ranged]
+
+    if kernel == 'uniform':
+        _add_linear(out, lo, hi, w / (hi - lo), np.zeros_like(w))
+        return out
+
+    # 收盘价缺失时用 (high + low) / 2；峰位越界时截到 [low, high]
+    lo_price, hi_price, close = low[ranged], high[ranged], close[ranged]
+    apex = np.where(close != 0, close, (lo_price + hi_price) / 2)
+    if kernel == 'typical':
+        apex = (hi_price + lo_price + apex) / 3
+    mode = np.clip((apex - lo_bound) / bin_width, lo, hi)
+    peak = 2 * w / (hi - lo)
+    rising = mode > lo
+    slope = np.divide(peak, mode - lo, out=np.zeros_like(peak), where=rising)
+    _add_linear(out, lo, mode, -slope * lo, slope)
+    falling = hi > mode
+    slope = np.divide(peak, hi - mode, out=np.zeros_like(peak), where=falling)
+    _add_linear(out, mode, hi, slope * hi, -slope)
+    return out
+
+
 def compute_chip_distribution(
-    bars: list[ETFDailyBar],
+    bars: Union[BarSeries, list],
     decay: float = 0.97,
     bin_count: int = 80,
     price_padding: float = 0.02,
+    kernel: str = 'uniform',
 ) -> list[tuple[float, float, float]]:
     """计算筹码分布。
 
-    每日成交量在 [low, high] 区间内均匀分配到桶里，
-    按 decay^N 衰减（N = 距今天数）。
+    每日成交量在 [low, high] 区间内按 kernel（见 KERNELS）的形状分配到桶里，
+    按 decay^N 衰减（N = 距今天数）。全程 NumPy 数组运算，
+    2000+ 根 K 线 × 400+ 桶也在毫秒级。bars 为 BarSeries（或 K 线对象列表）。
 
     Returns: [(bin_lower, bin_upper, weight), ...] 按价格升序。
     """
     if not bars:
         return []
 
-    # 极差过小（如货币基金）自适应桶数
-    lows = [b.low for b in bars if b.volume and b.volume > 0]
-    highs = [b.high for b in bars if b.volume and b.volume > 0]
-    if not lows or not highs:
+    low, high, close, volume = _bar_columns(bars)
+    grid = _price_grid(low, high, volume, bin_count, price_padding)
+    if grid is None:
         return []
-    price_min = min(lows)
-    price_max = max(highs)
-    spread = price_max - price_min
-    if spread < 0.5 and bin_count > 40:
-        bin_count = 40
+    lo_bound, bin_width, bin_count = grid
 
-    # 价格范围外扩 padding
-    pad = spread * price_padding if spread > 0 else max(price_max * price_padding, 0.01)
-    lo_bound = price_min - pad
-    hi_bound = price_max + pad
-    bin_width = (hi_bound - lo_bound) / bin_count
+    # 按时间倒序：今天 N=0（停牌日同样占一个 N）
+    daily_weight = volume * np.power(decay, np.arange(len(volume), dtype=np.float64))
+    weights = _spread(low, high, close, daily_weight, lo_bound, bin_width, bin_count, kernel)
+    return grid_distribution(lo_bound, bin_width, weights)
 
-    weights = [0.0] * bin_count
 
-    # 按时间倒序：今天 N=0
-    sorted_bars = sorted(bars, key=lambda b: b.date, reverse=True)
-    for n, bar in enumerate(sorted_bars):
-        if not bar.volume or bar.volume <= 0:
-            continue
-        daily_weight = bar.volume * (decay ** n)
-
-        bar_lo = bar.low
-        bar_hi = bar.high
-        if bar_hi <= bar_lo:
-            # 一字板：全部 weight 落入 close 对应的桶
-            close = bar.close if bar.close else bar_lo
-            idx = int((close - lo_bound) / bin_width)
-            idx = max(0, min(bin_count - 1, idx))
-            weights[idx] += daily_weight
-            continue
+def compute_chip_distributions(
+    bars: Union[BarSeries, list],
+    decays: list[float],
+    bin_count: int = 80,
+    price_padding: float = 0.02,
+    kernel: str = 'uniform',
+) -> list[list[tuple[float, float, float]]]:
+    """一次算出多个 decay 的筹码分布（短线 / 长线筹码对比），按 decays 顺序返回。
 
-        # 均匀分配：遍历所有与 [bar_lo, bar_hi] 有交集的桶
-        first_idx = max(0, int((bar_lo - lo_bound) / bin_width))
-        last_idx = min(bin_count - 1, int((bar_hi - lo_bound) / bin_width))
+    各 decay 共用同一价格网格（网格只取决于价格范围），与逐个调用
+    compute_chip_distribution 结果一致；K 线只遍历一次，
+    每个 decay 占长网格的一行，一次 _spread 摊完。
+    """
+    if not bars or not decays:
+        return [[] for _ in decays]
+
+    low, high, close, volume = _bar_columns(bars)
+    grid = _price_grid(low, high, volume, bin_count, price_padding)
+    if grid is None:
+        return [[] for _ in decays]
+    lo_bound, bin_width, bin_count = grid
+
+    n = len(volume)
+    age = np.arange(n, dtype=np.float64)
+    daily_weight = volume * np.power(np.asarray(decays, dtype=np.float64)[:, None], age)
+    rows = np.repeat(np.arange(len(decays), dtype=np.float64), n)
+    weights = _stacked_spreads(
+        np.tile(low, len(decays)), np.tile(high, len(decays)), np.tile(close, len(decays)),
+        daily_weight.ravel(), rows, len(decays), lo_bound, bin_width, bin_count, kernel,
+    )
+    return [grid_distribution(lo_bound, bin_width, w) for w in weights]
+
+
+def grid_distribution(
+    lo_bound: float,
+    bin_width: float,
+    weights: np.ndarray,
+) -> list[tuple[float, float, float]]:
+    """等宽桶网格 + 权重数组 → [(bin_lower, bin_upper, weight), ...]。"""
+    edges = (lo_bound + np.arange(len(weights) + 1) * bin_width).tolist()
+    return list(zip(edges[:-1], edges[1:], np.asarray(weights, dtype=np.float64).tolist()))
+
+
+def advance_distribution(
+    weights: np.ndarray,
+    lo_bound: float,
+    bin_width: float,
+    new_bar,
+    leaving_bar=None,
+    decay: float = 0.97,
+    window: int = 250,
+    kernel: str = 'uniform',
+) -> Optional[np.ndarray]:
+    """把衰减分布向前推进一个交易日，O(bins)。
 
-        for i in range(first_idx, last_idx + 1):
-            bin_lo = lo_bound + i * bin_width
-            bin_hi = bin_lo + bin_width
-            # 交集
-            inter_lo = max(bar_lo, bin_lo)
-            inter_hi = min(bar_hi, bar_hi)
-            inter_hi = min(inter_hi, bin_hi)
-            if inter_hi <= inter_lo:
-                continue
-            ratio = (inter_hi - inter_lo) / (bar_hi - bar_lo)
-            weights[i] += daily_weight * ratio
+    D(t+1) = decay·D(t) + S(new_bar) − decay^window·S(leaving_bar)
 
-    return [
-        (lo_bound + i * bin_width, lo_bound + (i + 1) * bin_width, weights[i])
-        for i in range(bin_count)
-    ]
+    leaving_bar 为滑出 window 窗口的那根 K 线（不足 window 根时传 None），
+    结果与对窗口内 K 线全量计算一致。new_bar 价格突破现有网格时返回 None，
+    由调用方重新划分网格后全量重算。new_bar / leaving_bar 为单根 ETFDailyBar 或 EtfKlineCache 行。
+    """
+    bin_count = len(weights)
+    hi_bound = lo_bound + bin_count * bin_width
+    if new_bar.volume and new_bar.volume > 0 and (new_bar.low < lo_bound or new_bar.high > hi_bound):
+        return None
+
+    low, high, close, volume = _bar_columns([new_bar])
+    out = weights * decay + _spread(low, high, close, volume, lo_bound, bin_width, bin_count, kernel)
+    if leaving_bar is not None:
+        low, high, close, volume = _bar_columns([leaving_bar])
+        out -= _spread(low, high, close, volume * decay ** window, lo_bound, bin_width, bin_count, kernel)
+        # 加减抵消后的浮点残差不应出现负权重
+        np.maximum(out, 0.0, out=out)
+    return out
 
 
 def _smooth(values: list[float], window: int = 3) -> list[float]:
@@ -121,17 +320,21 @@ def find_peaks(
     if max_w <= 0:
         return []
 
-    # 找局部最大值
+    # 找局部最大值；连续等值的平台（整桶均匀摊入时常见）只算一个候选
     candidates = []
     n = len(smoothed)
-    for i in range(n):
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and smoothed[j + 1] == smoothed[i]:
+            j += 1
         left = smoothed[i - 1] if i > 0 else -1
-        right = smoothed[i + 1] if i < n - 1 else -1
+        right = smoothed[j + 1] if j < n - 1 else -1
         if smoothed[i] >= left and smoothed[i] >= right and smoothed[i] > 0:
-            # 峰位价格取桶中心
-            bin_lo, bin_hi, _ = distribution[i]
-            price = (bin_lo + bin_hi) / 2
-            candidates.append((smoothed[i], price, i))
+            # 峰位价格取平台中心（单桶即桶中心）
+            price = (distribution[i][0] + distribution[j][1]) / 2
+            candidates.append((smoothed[i], price, (i + j) // 2))
+        i = j + 1
 
     # 按权重降序，去相邻（距离 < 3 桶的视为同一峰）
     candidates.sort(reverse=True)
@@ -152,31 +355,113 @@ def find_peaks(
     return peaks
 
 
+class ChipIndex:
+    """分布的前缀和索引：建一次，任意价位 / 价格区间的查询都是一次二分 + 桶内线性插值.
+
+    桶内筹码按均匀分布处理（同 compute_profit_ratio / compute_concentration 的按比例分摊）；
+    平均成本以桶中心价计（同 compute_avg_cost）。
+    """
+
+    def __init__(self, edges: np.ndarray, weights: np.ndarray):
+        self.edges = np.asarray(edges, dtype=np.float64)        # bins + 1 个桶边界，升序
+        self.weights = np.asarray(weights, dtype=np.float64)
+        centers = (self.edges[:-1] + self.edges[1:]) / 2
+        self._cum_weight = np.concatenate([[0.0], np.cumsum(self.weights)])
+        self._cum_moment = np.concatenate([[0.0], np.cumsum(self.weights * centers)])
+
+    @classmethod
+    def from_distribution(cls, distribution: list[tuple[float, float, float]]) -> 'ChipIndex':
+        if not distribution:
+            return cls(np.zeros(1), np.zeros(0))
+        lows, highs, weights = zip(*distribution)
+        return cls(np.append(lows, highs[-1]), weights)
+
+    @property
+    def total(self) -> float:
+        return float(self._cum_weight[-1])
+
+    def _locate(self, price: float) -> tuple[int, float]:
+        """price 所在桶下标及在桶内的比例 (0-1)；网格外分别落到首桶起点 / 末桶终点。"""
+        bin_count = len(self.weights)
+        k = int(np.searchsorted(self.edges, price, side='right')) - 1
+        if k < 0:
+            return 0, 0.0
+        if k >= bin_count:
+            return bin_count - 1, 1.0
+        return k, (price - self.edges[k]) / (self.edges[k + 1] - self.edges[k])
+
+    def weight_below(self, price: float) -> float:
+        """价格 price 以下的筹码权重。"""
+        if not len(self.weights):
+            return 0.0
+        k, frac = self._locate(price)
+        return float(self._cum_weight[k] + self.weights[k] * frac)
+
+    def weight_between(self, low: float, high: float) -> float:
+        """[low, high] 区间内的筹码权重。"""
+        return max(self.weight_below(high) - self.weight_below(low), 0.0)
+
+    def _moment_below(self, price: float) -> float:
+        """price 以下筹码的 Σ(权重 × 价格)；桶内部分按所覆盖那段的中点计。"""
+        if not len(self.weights):
+            return 0.0
+        k, frac = self._locate(price)
+        if frac >= 1.0:
+            return float(self._cum_moment[k + 1])
+        covered_mid = self.edges[k] + frac * (self.edges[k + 1] - self.edges[k]) / 2
+        return float(self._cum_moment[k] + self.weights[k] * frac * covered_mid)
+
+    def profit_ratio(self, price: float) -> float:
+        """获利盘比例：price 以下的筹码占比 (0-1)。"""
+        total = self.total
+        if total <= 0:
+            return 0.0
+        return min(1.0, self.weight_below(price) / total)
+
+    def band_ratio(self, low: float, high: float) -> float:
+        """[low, high] 区间内的筹码占比 (0-1)。"""
+        total = self.total
+        if total <= 0:
+            return 0.0
+        return min(1.0, self.weight_between(low, high) / total)
+
+    def concentration(self, price: float, band_pct: float = 0.05) -> float:
+        """price ±band_pct 区间内筹码占比 (0-1)。"""
+        return self.band_ratio(price * (1 - band_pct), price * (1 + band_pct))
+
+    def percentile(self, q: float) -> Optional[float]:
+        """成本分位价：有 q 比例的筹码成本低于该价（q 截到 0-1）。无有效权重返回 None。"""
+        total = self.total
+        if total <= 0:
+            return None
+        target = min(max(q, 0.0), 1.0) * total
+        if target <= 0:
+            return float(self.edges[int(np.argmax(self.weights > 0))])
+        k = min(int(np.searchsorted(self._cum_weight[1:], target, side='left')), len(self.weights) - 1)
+        frac = min((target - self._cum_weight[k]) / self.weights[k], 1.0)
+        return float(self.edges[k] + frac * (self.edges[k + 1] - self.edges[k]))
+
+    def avg_cost(self, low: Optional[float] = None, high: Optional[float] = None) -> Optional[float]:
+        """筹码加权平均成本；给出 low / high 时只算该价格区间内的筹码。无有效权重返回 None。"""
+        if low is None and high is None:
+            total, moment = self.total, float(self._cum_moment[-1])
+        else:
+            low = self.edges[0] if low is None else low
+            high = self.edges[-1] if high is None else high
+            total = self.weight_between(low, high)
+            moment = self._moment_below(high) - self._moment_below(low)
+        if total <= 0:
+            return None
+        return moment / total
+
+
 def compute_concentration(
     distribution: list[tuple[float, float, float]],
     current_price: float,
     band_pct: float = 0.05,
 ) -> float:
-    """当前价 ±band_pct 区间内筹码占比 (0-1)。"""
-    if not distribution:
-        return 0.0
-    total = sum(w for _, _, w in distribution)
-    if total <= 0:
-        return 0.0
-    band_lo = current_price * (1 - band_pct)
-    band_hi = current_price * (1 + band_pct)
-    in_band = 0.0
-    for bin_lo, bin_hi, w in distribution:
-        if bin_hi <= band_lo or bin_lo >= band_hi:
-            continue
-        # 部分重叠时按比例算
-        overlap = min(bin_hi, band_hi) - max(bin_lo, band_lo)
-        bin_size = bin_hi - bin_lo
-        if bin_size > 0 and overlap > 0:
-            in_band += w * (overlap / bin_size)
-        elif overlap > 0:
-            in_band += w
-    return min(1.0, in_band / total)
+    """当前价 ±band_pct 区间内筹码占比 (0-1)。多次查询同一分布时直接用 ChipIndex。"""
+    return ChipIndex.from_distribution(distribution).concentration(current_price, band_pct)
 
 
 def compute_profit_ratio(
@@ -187,20 +472,7 @@ def compute_profit_ratio(
 
     跨越当前价的桶按比例分摊。
     """
-    if not distribution:
-        return 0.0
-    total = sum(w for _, _, w in distribution)
-    if total <= 0:
-        return 0.0
-    below = 0.0
-    for bin_lo, bin_hi, w in distribution:
-        if bin_hi <= current_price:
-            below += w
-        elif bin_lo < current_price < bin_hi:
-            # 部分获利
-            ratio = (current_price - bin_lo) / (bin_hi - bin_lo)
-            below += w * ratio
-    return min(1.0, below / total)
+    return ChipIndex.from_distribution(distribution).profit_ratio(current_price)
 
 
 def compute_avg_cost(
@@ -210,14 +482,196 @@ def compute_avg_cost(
 
     无有效权重返回 None。
     """
-    if not distribution:
+    return ChipIndex.from_distribution(distribution).avg_cost()
+
+
+def summarize(
+    distribution: list[tuple[float, float, float]],
+    current_price: float,
+    band_pct: float = 0.05,
+) -> dict:
+    """分布的前 3 个峰位与各项指标（chip-data 的 peaks / metrics，可直接 jsonify）。"""
+    peaks = find_peaks(distribution, top_k=3)
+    index = ChipIndex.from_distribution(distribution)
+    metrics = {
+        'avg_cost': index.avg_cost(),
+        'cost_p05': index.percentile(0.05),
+        'cost_p95': index.percentile(0.95),
+        'main_peak': peaks[0].price if peaks else None,
+        'secondary_peak': peaks[1].price if len(peaks) > 1 else None,
+    }
+    metrics.update(price_metrics(index, current_price, band_pct))
+    return {
+        'peaks': [{'price': p.price, 'weight': p.weight, 'intensity': p.intensity} for p in peaks],
+        'metrics': metrics,
+    }
+
+
+def price_metrics(index: ChipIndex, current_price: float, band_pct: float = 0.05) -> dict:
+    """随现价变化的指标：集中度、获利比例、平均获利。"""
+    avg_cost = index.avg_cost()
+    return {
+        'concentration': index.concentration(current_price, band_pct),
+        'profit_ratio': index.profit_ratio(current_price),
+        'avg_profit_pct': ((current_price - avg_cost) / avg_cost * 100) if avg_cost else None,
+    }
+
+
+def _stacked_spreads(
+    low: np.ndarray,
+    high: np.ndarray,
+    close: np.ndarray,
+    weight: np.ndarray,
+    row: np.ndarray,
+    row_count: int,
+    lo_bound: float,
+    bin_width: float,
+    bin_count: int,
+    kernel: str,
+) -> np.ndarray:
+    """把每根 K 线摊到 row 指定的那一行网格上：返回 (row_count, bins) 矩阵。
+
+    第 r 行的 K 线价格整体平移 r 个网格宽度，所有行一次 _spread 摊到
+    row_count × bins 的长网格上再 reshape，不逐行调用。要求价格都落在网格内。
+    """
+    # 收盘价缺失的兜底先按 _spread 的规则补上，避免平移后判断失效
+    flat = high <= low
+    close = np.where(close != 0, close, np.where(flat, low, (low + high) / 2))
+    offset = row * (bin_count * bin_width)
+    out = _spread(low + offset, high + offset, close + offset, weight,
+                  lo_bound, bin_width, row_count * bin_count, kernel)
+    return out.reshape(row_count, bin_count)
+
+
+def _cumulative_at(rows: np.ndarray, lo_bound: float, bin_width: float, prices: np.ndarray) -> np.ndarray:
+    """每行分布在对应价格以下的权重（桶内按线性插值，同 compute_profit_ratio）。"""
+    bin_count = rows.shape[1]
+    cum = np.concatenate([np.zeros((len(rows), 1)), np.cumsum(rows, axis=1)], axis=1)
+    pos = np.clip((prices - lo_bound) / bin_width, 0.0, bin_count)
+    idx = np.minimum(pos.astype(np.intp), bin_count - 1)
+    line = np.arange(len(rows))
+    return cum[line, idx] + rows[line, idx] * (pos - idx)
+
+
+def _main_peaks(rows: np.ndarray, lo_bound: float, bin_width: float) -> list[Optional[float]]:
+    """每行分布的主峰价，与 find_peaks(...)[0].price 一致（逐行向量化）。
+
+    主峰即 3 桶平滑后的全局最大值；最大值出现在多处时取价格最高的平台，价格为平台中心。
+    """
+    smoothed = rows
+    bin_count = rows.shape[1]
+    if bin_count >= 3:
+        smoothed = np.empty_like(rows)
+        smoothed[:, 1:-1] = (rows[:, :-2] + rows[:, 1:-1] + rows[:, 2:]) / 3
+        smoothed[:, 0] = (rows[:, 0] + rows[:, 1]) / 2
+        smoothed[:, -1] = (rows[:, -2] + rows[:, -1]) / 2
+    top = smoothed.max(axis=1)
+    at_top = smoothed == top[:, None]
+    index = np.arange(bin_count)
+    end = np.where(at_top, index, -1).max(axis=1)
+    begin = np.where(~at_top & (index < end[:, None]), index, -1).max(axis=1) + 1
+    price = lo_bound + (begin + end + 1) * bin_width / 2
+    return [p if t > 0 else None for p, t in zip(price.tolist(), top.tolist())]
+
+
+# compute_chip_history 每块摊分矩阵的单元数上限
+_HISTORY_CHUNK_CELLS = 1 << 17
+
+
+def compute_chip_history(
+    bars: Union[BarSeries, list],
+    days: int,
+    window: int = 250,
+    decay: float = 0.97,
+    bin_count: int = 80,
+    band_pct: float = 0.05,
+    kernel: str = 'uniform',
+    snapshot_every: int = 0,
+    snapshot_bins: int = 40,
+    price_padding: float = 0.02,
+) -> Optional[ChipHistory]:
+    """最近 days 个交易日每天的筹码指标，一次前推算完。
+
+    第 t 天的分布为截至 t 的 window 根 K 线按 decay 衰减（同 compute_chip_distribution），
+    用 advance_distribution 的递推 D(t) = decay·D(t−1) + S(t) − decay^window·S(t−window)
+    逐日推进，总耗时 O((days + window) × bins)，而不是每天全量重算；每根 K 线的摊分
+    按块计算，额外内存与 window 无关。
+    bars 须包含 days + window − 1 根 K 线（不足时从最早一根算起）。
+
+    各天共用覆盖全部 K 线的价格网格，指标与按单日窗口划网格的结果只有桶边界量化上的差别。
+    当天价格取当天收盘价；snapshot_every > 0 时每隔该天数（含最后一天）输出一帧
+    合并到约 snapshot_bins 个桶的分布。无有效成交返回 None。
+    """
+    series = BarSeries.coerce(bars)
+    if not len(series) or days <= 0 or window <= 0:
         return None
-    total_w = 0.0
-    weighted_sum = 0.0
-    for bin_lo, bin_hi, w in distribution:
-        center = (bin_lo + bin_hi) / 2
-        weighted_sum += center * w
-        total_w += w
-    if total_w <= 0:
+    series = series.tail(days + window - 1)
+    low, high = series.low, series.high
+    close = np.nan_to_num(series.close)
+    volume = series.volume.astype(np.float64)
+    grid = _price_grid(low, high, volume, bin_count, price_padding)
+    if grid is None:
         return None
-    return weighted_sum / total_w
+    lo_bound, bin_width, bin_count = grid
+
+    n = len(series)
+    # 每根 K 线的摊分矩阵按块计算，不一次性分配 (days + window) × bins
+    chunk = max(_HISTORY_CHUNK_CELLS // bin_count, 1)
+
+    def spreads(begin, end):
+        count = end - begin
+        return _stacked_spreads(low[begin:end], high[begin:end], close[begin:end], volume[begin:end],
+                                np.arange(count, dtype=np.float64), count,
+                                lo_bound, bin_width, bin_count, kernel)
+
+    first = max(n - days, 0)
+    start = max(first - window + 1, 0)
+    rows = np.empty((n - first, bin_count))
+    current = np.zeros(bin_count)
+    for begin in range(start, first + 1, chunk):
+        end = min(begin + chunk, first + 1)
+        current += np.power(decay, np.arange(first - begin, first - end, -1, dtype=np.float64)) @ spreads(begin, end)
+    rows[0] = current
+    leaving = decay ** window
+    for begin in range(first + 1, n, chunk):
+        end = min(begin + chunk, n)
+        entering = spreads(begin, end)
+        # 同一块里各天移出窗口的 K 线：下标 t − window
+        old_begin = max(begin - window, 0)
+        leaving_rows = spreads(old_begin, end - window) if end - window > old_begin else None
+        for t in range(begin, end):
+            current = current * decay + entering[t - begin]
+            if t >= window:
+                current -= leaving * leaving_rows[t - window - old_begin]
+                np.maximum(current, 0.0, out=current)
+            rows[t - first] = current
+
+    price = close[first:]
+    total = rows.sum(axis=1)
+    valid = total > 0
+    safe_total = np.where(valid, total, 1.0)
+    centers = lo_bound + (np.arange(bin_count) + 0.5) * bin_width
+    avg_cost = rows @ centers / safe_total
+    profit = _cumulative_at(rows, lo_bound, bin_width, price) / safe_total
+    in_band = (_cumulative_at(rows, lo_bound, bin_width, price * (1 + band_pct))
+               - _cumulative_at(rows, lo_bound, bin_width, price * (1 - band_pct)))
+    concentration = in_band / safe_total
+
+    main_peak = _main_peaks(rows, lo_bound, bin_width)
+    dates = BarSeries.date_strings(series.days[first:])
+    history = ChipHistory(
+        dates=dates,
+        close=price.tolist(),
+        profit_ratio=np.where(valid, np.minimum(profit, 1.0), 0.0).tolist(),
+        avg_cost=[v if ok else None for v, ok in zip(avg_cost.tolist(), valid.tolist())],
+        concentration=np.where(valid, np.minimum(concentration, 1.0), 0.0).tolist(),
+        main_peak=main_peak,
+    )
+    if snapshot_every > 0:
+        group = max(bin_count // max(snapshot_bins, 1), 1)
+        starts = np.arange(0, bin_count, group)
+        picked = np.arange(len(rows) - 1, -1, -snapshot_every)[::-1]
+        history.snapshot_edges = (lo_bound + np.append(starts, bin_count) * bin_width).tolist()
+        history.snapshot_dates = [dates[i] for i in picked]
+        history.snapshot_weights = np.add.reduceat(rows[picked], starts, axis=1).tolist()
+    return history
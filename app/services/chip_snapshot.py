@@ -0,0 +1,84 @@
+"""默认参数筹码快照.
+
+收盘后预取任务为每个目标 ETF 写一行 etf_chip_snapshot：默认参数（DEFAULT_CHIP_PARAMS）
+下截至最新 K 线的分布、峰位和指标。默认参数的 chip-data 请求按 (symbol, date) 唯一索引
+取这一行直接返回；参数不同或当天快照还没生成时回落到增量状态 / 全量计算。
+"""
+from datetime import date, timedelta
+import json
+from typing import Optional
+
+import numpy as np
+
+from app.extensions import db
+from app.services import chip_distribution, chip_state
+
+# 快照指标按此 band 计算集中度（与 chip-data 默认值一致）
+DEFAULT_BAND = 0.05
+
+
+def is_default(decay: float, bin_count: int, window_days: int, kernel: str) -> bool:
+    """请求参数是否与快照参数一致。"""
+    from app.services.kline_prefetch import DEFAULT_CHIP_PARAMS
+    return (decay, bin_count, window_days, kernel) == DEFAULT_CHIP_PARAMS
+
+
+def build_snapshot(symbol: str) -> bool:
+    """写入 symbol 截至最新 K 线的默认参数快照；无 K 线或当天快照已存在返回 False。"""
+    from app.models.etf_chip_snapshot import EtfChipSnapshot
+    from app.services.kline_prefetch import DEFAULT_CHIP_PARAMS
+    from app.services.kline_store import get_kline_store
+
+    decay, bin_count, window_days, kernel = DEFAULT_CHIP_PARAMS
+    series = get_kline_store().read(symbol, window_days)
+    if not len(series):
+        return False
+    as_of = series.last_date
+    if EtfChipSnapshot.get(symbol, as_of) is not None:
+        return False
+
+    dist = chip_state.get_distribution(symbol, decay, bin_count, window_days, as_of, kernel)
+    if dist is None:
+        dist = chip_distribution.compute_chip_distribution(series, decay=decay, bin_count=bin_count, kernel=kernel)
+        chip_state.save_distribution(symbol, decay, bin_count, window_days, as_of, dist, kernel, force=True)
+    if not dist:
+        return False
+
+    close = float(series.close[-1])
+    summary = chip_distribution.summarize(dist, close, DEFAULT_BAND)
+    snapshot = EtfChipSnapshot(
+        symbol=symbol, date=as_of, close=close,
+        lo_bound=dist[0][0], bin_width=dist[0][1] - dist[0][0],
+        peaks=json.dumps(summary['peaks']), metrics=json.dumps(summary['metrics']),
+    )
+    snapshot.set_weights(np.array([w for _, _, w in dist]))
+    db.session.add(snapshot)
+    db.session.commit()
+    return True
+
+
+def load(symbol: str, as_of: date, current_price: float, band: float) -> Optional[tuple[list, dict]]:
+    """读取 as_of 日的快照：返回 (distribution, {'peaks', 'metrics'})，无快照返回 None。
+
+    现价或 band 与生成快照时不同，只用前缀和索引重算随价格变化的几项指标。
+    """
+    from app.models.etf_chip_snapshot import EtfChipSnapshot
+
+    snapshot = EtfChipSnapshot.get(symbol, as_of)
+    if snapshot is None:
+        return None
+    dist = chip_distribution.grid_distribution(snapshot.lo_bound, snapshot.bin_width, snapshot.get_weights())
+    metrics = snapshot.get_metrics()
+    if current_price != snapshot.close or band != DEFAULT_BAND:
+        index = chip_distribution.ChipIndex.from_distribution(dist)
+        metrics.update(chip_distribution.price_metrics(index, current_price, band))
+    return dist, {'peaks': snapshot.get_peaks(), 'metrics': metrics}
+
+
+def prune(keep_days: int, today: Optional[date] = None) -> int:
+    """删除 keep_days 天之前的快照，返回删除行数。"""
+    from app.models.etf_chip_snapshot import EtfChipSnapshot
+
+    removed = EtfChipSnapshot.delete_before((today or date.today()) - timedelta(days=keep_days))
+    db.session.commit()
+    return removed
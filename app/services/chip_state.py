@@ -0,0 +1,204 @@
+"""筹码分布增量状态服务.
+
+decay 衰减是递推的：今天的分布 = 昨天 × decay + 今天的 K 线。
+新 K 线入库时按 (symbol, decay, bin_count, window_days, kernel) 把已有状态 O(bins)
+前推，请求时直接读取；价格突破原网格时才按窗口全量重算。
+
+只有筹码页上可选的参数组合（PERSISTED_*）总是持久化；其余组合每个 symbol
+最多保留 MAX_EXTRA_STATES 组，久未被请求的状态由 prune_stale 清理。
+"""
+from datetime import date, datetime, timedelta
+import logging
+from typing import Optional
+
+from app.extensions import db
+from app.services import chip_distribution
+
+logger = logging.getLogger(__name__)
+
+# 筹码页可选的参数（与 etf_chip.html 下拉选项一致），任意 kernel 都持久化
+PERSISTED_DECAYS = (0.97, 0.985, 0.995)
+PERSISTED_BIN_COUNTS = (40, 80, 120)
+PERSISTED_WINDOW_DAYS = (250,)
+# 其余参数组合每个 symbol 最多持久化的组数
+MAX_EXTRA_STATES = 8
+
+
+def is_persisted(decay: float, bin_count: int, window_days: int) -> bool:
+    """是否为总是持久化的参数组合。"""
+    return (
+        decay in PERSISTED_DECAYS
+        and bin_count in PERSISTED_BIN_COUNTS
+        and window_days in PERSISTED_WINDOW_DAYS
+    )
+
+
+def get_distribution(
+    symbol: str,
+    decay: float,
+    bin_count: int,
+    window_days: int,
+    as_of: date,
+    kernel: str = 'uniform',
+) -> Optional[list[tuple[float, float, float]]]:
+    """读取已推进到 as_of 的分布；无状态或状态过期返回 None。"""
+    from app.models.etf_chip_state import EtfChipState
+
+    state = EtfChipState.get(symbol, decay, bin_count, window_days, kernel)
+    if state is None or state.last_date != as_of:
+        return None
+    return chip_distribution.grid_distribution(state.lo_bound, state.bin_width, state.get_weights())
+
+
+def save_distribution(
+    symbol: str,
+    decay: float,
+    bin_count: int,
+    window_days: int,
+    as_of: date,
+    distribution: list[tuple[float, float, float]],
+    kernel: str = 'uniform',
+    force: bool = False,
+) -> bool:
+    """把全量计算出的分布存为 as_of 日的状态（已存在则覆盖）。
+
+    非 PERSISTED_* 的新参数组合在该 symbol 已有 MAX_EXTRA_STATES 组时不再持久化，
+    force=True（收盘后预取）时不受此限制。
+
+    Returns: 是否已写入。
+    """
+    from app.models.etf_chip_state import EtfChipState
+
+    if not distribution:
+        return False
+    state = EtfChipState.get(symbol, decay, bin_count, window_days, kernel)
+    if state is None:
+        if not force and not is_persisted(decay, bin_count, window_days):
+            extra = sum(
+                not is_persisted(s.decay, s.bin_count, s.window_days)
+                for s in EtfChipState.for_symbol(symbol)
+            )
+            if extra >= MAX_EXTRA_STATES:
+                return False
+        state = EtfChipState(symbol=symbol, decay=decay, bin_count=bin_count, window_days=window_days, kernel=kernel)
+        db.session.add(state)
+    _apply(state, as_of, distribution)
+    db.session.commit()
+    return True
+
+
+def touch(symbols: list[str], decay: float, bin_count: int, window_days: int, kernel: str = 'uniform') -> None:
+    """记录这些状态今天被请求过（每天只写一次），供收盘后预取挑选常看的参数组合。"""
+    from app.models.etf_chip_state import EtfChipState
+
+    now = datetime.utcnow()
+    day_start = datetime.combine(now.date(), datetime.min.time())
+    updated = (
+        EtfChipState.query
+        .filter(
+            EtfChipState.symbol.in_(symbols),
+            EtfChipState.decay == decay,
+            EtfChipState.bin_count == bin_count,
+            EtfChipState.window_days == window_days,
+            EtfChipState.kernel == kernel,
+            db.or_(EtfChipState.viewed_at.is_(None), EtfChipState.viewed_at < day_start),
+        )
+        .update({EtfChipState.viewed_at: now}, synchronize_session=False)
+    )
+    if updated:
+        db.session.commit()
+
+
+def prune_stale(stale_days: int, now: Optional[datetime] = None) -> int:
+    """删除 stale_days 天内未被请求过的状态（从未请求的按创建时间算），返回删除行数。"""
+    from app.models.etf_chip_state import EtfChipState
+
+    removed = EtfChipState.delete_unviewed_since((now or datetime.utcnow()) - timedelta(days=stale_days))
+    db.session.commit()
+    return removed
+
+
+def advance_states(symbol: str, inserted_dates: list[date]) -> int:
+    """K 线入库后推进该 symbol 的全部状态。
+
+    inserted_dates 为本次新写入的日期；若其中有早于状态 last_date 的
+    （回补了历史缺口），窗口已变，直接重算。
+
+    Returns: 被更新的状态数。
+    """
+    from app.models.etf_chip_state import EtfChipState
+
+    if not inserted_dates:
+        return 0
+    earliest = min(inserted_dates)
+    updated = 0
+    for state in EtfChipState.for_symbol(symbol):
+        if earliest <= state.last_date:
+            _rebuild(state)
+        else:
+            _advance(state)
+        updated += 1
+    if updated:
+        db.session.commit()
+    return updated
+
+
+def _advance(state) -> None:
+    """逐根前推新 K 线；突破网格时改为重算。"""
+    from app.models.etf_kline_cache import EtfKlineCache
+
+    new_rows = (
+        EtfKlineCache.query
+        .filter(EtfKlineCache.symbol == state.symbol, EtfKlineCache.date > state.last_date)
+        .order_by(EtfKlineCache.date.asc())
+        .all()
+    )
+    if not new_rows:
+        return
+
+    # 推进 k 根后窗口为最新 window_days 根，滑出的是倒序第 window..window+k-1 根，
+    # 反转后与 new_rows 升序一一对应（历史不足时前面补 None）。
+    leaving = (
+        EtfKlineCache.query
+        .filter_by(symbol=state.symbol)
+        .order_by(EtfKlineCache.date.desc())
+        .offset(state.window_days)
+        .limit(len(new_rows))
+        .all()
+    )
+    leaving.reverse()
+    leaving = [None] * (len(new_rows) - len(leaving)) + leaving
+
+    weights = state.get_weights()
+    for bar, old in zip(new_rows, leaving):
+        weights = chip_distribution.advance_distribution(
+            weights, state.lo_bound, state.bin_width, bar, old,
+            decay=state.decay, window=state.window_days, kernel=state.kernel,
+        )
+        if weights is None:
+            logger.info("chip state regrid on breakout: %s %s", state.symbol, bar.date)
+            _rebuild(state)
+            return
+    state.set_weights(weights)
+    state.last_date = new_rows[-1].date
+
+
+def _rebuild(state) -> None:
+    """按窗口内 K 线全量重算并重新划分网格。"""
+    from app.services.kline_store import get_kline_store
+
+    series = get_kline_store().read(state.symbol, state.window_days)
+    dist = chip_distribution.compute_chip_distribution(
+        series, decay=state.decay, bin_count=state.bin_count, kernel=state.kernel,
+    )
+    if not dist:
+        db.session.delete(state)
+        return
+    _apply(state, series.last_date, dist)
+
+
+def _apply(state, as_of: date, distribution: list[tuple[float, float, float]]) -> None:
+    state.last_date = as_of
+    state.lo_bound = distribution[0][0]
+    state.bin_width = (distribution[-1][1] - distribution[0][0]) / len(distribution)
+    state.set_weights([w for _, _, w in distribution])
@@ -1,17 +1,507 @@
 """
 爬虫服务：从天天基金网爬取基金净值
 提取自 simple_app.py 的 update_fund_nav() 函数
+
+抓取 / 解析 / 写库拆为三步：fetch_* 只做网络请求，parse_* 是纯函数
+（可在进程池中执行），apply_nav_result 负责写库。单只基金用
+update_fund_nav，批量抓取见 app.services.nav_pipeline。
+
+数据源按 NAV_SOURCES 顺序尝试：先走紧凑的 JSON 接口（lsjz 历史净值、
+fundgz 估值），失败再解析天天基金详情页 HTML（lxml），最后是新浪财经。
+需要补全名称/类型的基金直接从详情页开始。顺序代表数据完整度偏好，不按耗时调整；
+请求经 source_router 熔断，连续失败的源在冷却期内直接跳过；未传 session 时
+走 default_session()，同样经 http_cache 缓存。
 """
+from collections import OrderedDict, namedtuple
+import json
 import re
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
+import threading
+from datetime import date, datetime
 
+LSJZ_URL = "http://api.fund.eastmoney.com/f10/lsjz"
+LSJZ_REFERER = "http://fundf10.eastmoney.com/jjjz_{code}.html"
+FUNDGZ_URL = "http://fundgz.1234567.com.cn/js/{code}.js"
+EASTMONEY_FUND_URL = "http://fund.eastmoney.com/{code}.html"
+SINA_NAV_URL = "http://finance.sina.com.cn/fund/quotes/{code}/nav.shtml"
 
-def update_fund_nav(fund_code, _db=None, _Fund=None, _FundNavHistory=None):
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+                  'AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# name: 写入 result['source']；url: 用于按 host 限速；cpu_bound: 解析是否值得放进进程池
+NavSource = namedtuple('NavSource', 'name url fetch parse cpu_bound')
+
+_JSONP_RE = re.compile(r'^[\w$.]*\((.*)\)\s*;?\s*$', re.S)
+
+
+def _latest_market_day():
+    """今天若为交易日返回今天，否则返回最近一个交易日。"""
+    from app.services.trading_calendar import prev_trading_day
+    return prev_trading_day(datetime.now().date(), inclusive=True)
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def default_session():
+    """未传 session 时共用的 Session，与批量管线一样挂 CachingAdapter（条件请求 + 内容去重）。"""
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            from app.services.nav_pipeline import build_session
+            _default_session = build_session(pool_size=4)
+        return _default_session
+
+
+def _get_page(url, session=None, timeout=20, params=None, headers=None):
+    http = session or default_session()
+    response = http.get(url, params=params, headers=headers or HEADERS, timeout=timeout)
+    response.encoding = 'utf-8'
+    print(f"服务器响应状态码: {response.status_code}")
+    if response.status_code != 200:
+        return None
+    return response.text
+
+
+def _load_json(text):
+    """解析 JSON 或 JSONP 文本，失败返回 None。"""
+    text = (text or '').strip()
+    m = _JSONP_RE.match(text)
+    if m:
+        text = m.group(1).strip()
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# ---- JSON 数据源 ----
+
+def fetch_lsjz(fund_code, session=None, timeout=10, page_index=1, page_size=1, start_date='', end_date=''):
     """
-    爬取并更新基金净值（写入数据库）。
-    _db / _Fund / _FundNavHistory 仅供测试注入，正常调用无需传递。
+    请求 F10 历史净值接口（按日期倒序分页），返回原始文本；非 200 返回 None。
+    start_date / end_date 为 YYYY-MM-DD，留空表示不限。
+    """
+    params = {
+        'fundCode': fund_code,
+        'pageIndex': page_index,
+        'pageSize': page_size,
+        'startDate': start_date,
+        'endDate': end_date,
+    }
+    headers = dict(HEADERS, Referer=LSJZ_REFERER.format(code=fund_code))
+    return _get_page(LSJZ_URL, session=session, timeout=timeout, params=params, headers=headers)
+
+
+def parse_lsjz_records(text):
+    """
+    解析 lsjz 响应。
+    返回 ([{'date', 'nav', 'acc_nav'}...], total_count)，按日期倒序；
+    无单位净值的记录（如货币基金）跳过。响应异常返回 ([], 0)。
+    """
+    payload = _load_json(text)
+    if not isinstance(payload, dict) or payload.get('ErrCode') not in (0, None):
+        return [], 0
+    data = payload.get('Data') or {}
+    records = []
+    for item in data.get('LSJZList') or []:
+        nav = _to_float(item.get('DWJZ'))
+        nav_date = item.get('FSRQ') or ''
+        if nav is None or not re.match(r'\d{4}-\d{2}-\d{2}$', nav_date):
+            continue
+        records.append({'date': nav_date, 'nav': nav, 'acc_nav': _to_float(item.get('LJJZ'))})
+    return records, int(payload.get('TotalCount') or 0)
+
+
+def parse_lsjz(text):
+    """取 lsjz 第一条（最新）记录作为净值结果，无记录返回 None。"""
+    records, _ = parse_lsjz_records(text)
+    if not records:
+        return None
+    latest = records[0]
+    return {'nav': latest['nav'], 'date': latest['date'], 'name': None, 'fund_type': None, 'source': 'lsjz'}
+
+
+def fetch_fundgz(fund_code, session=None, timeout=10):
+    """请求天天基金估值 JSONP（含最新单位净值 dwjz 与净值日期 jzrq）。"""
+    return _get_page(FUNDGZ_URL.format(code=fund_code), session=session, timeout=timeout)
+
+
+def parse_fundgz(text):
+    """解析 jsonpgz(...)，只取 dwjz / jzrq / name；QDII 等无估值的基金返回空 JSONP，得到 None。"""
+    payload = _load_json(text)
+    if not isinstance(payload, dict):
+        return None
+    nav = _to_float(payload.get('dwjz'))
+    nav_date = payload.get('jzrq') or ''
+    if nav is None or not re.match(r'\d{4}-\d{2}-\d{2}$', nav_date):
+        return None
+    return {'nav': nav, 'date': nav_date, 'name': payload.get('name') or None, 'fund_type': None, 'source': 'fundgz'}
+
+
+# ---- HTML 数据源 ----
+
+def fetch_fund_page(fund_code, session=None, timeout=20):
+    """抓取天天基金详情页，返回 HTML；非 200 返回 None，网络异常向上抛出。"""
+    url = EASTMONEY_FUND_URL.format(code=fund_code)
+    print(f"尝试爬取基金 {fund_code} 的净值数据，URL: {url}")
+    return _get_page(url, session=session, timeout=timeout)
+
+
+def fetch_sina_page(fund_code, session=None, timeout=10):
+    """抓取新浪财经备用净值页，返回 HTML；非 200 返回 None。"""
+    print(f"尝试使用备用数据源爬取基金 {fund_code}")
+    return _get_page(SINA_NAV_URL.format(code=fund_code), session=session, timeout=timeout)
+
+
+def _html_root(html):
+    import lxml.html
+    return lxml.html.fromstring(html)
+
+
+def _xp_class(tag, cls):
+    """匹配 class 列表中含 cls 的 tag（与 BeautifulSoup 的 class_ 语义一致）。"""
+    return f"//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')]"
+
+
+def _first(root, xpath):
+    found = root.xpath(xpath)
+    return found[0] if found else None
+
+
+def _text(el):
+    """等价于 BeautifulSoup 的 get_text(strip=True)：各文本片段去空白后直接拼接。"""
+    return ''.join(s.strip() for s in el.itertext())
+
+
+def _first_row_value(table):
+    """取表格第二行（首条数据）的 (日期, 净值)，净值无法解析返回 None。"""
+    rows = table.xpath('.//tr')
+    if len(rows) < 2:
+        return None
+    cells = rows[1].xpath('.//td')
+    if len(cells) < 2:
+        return None
+    nav = _to_float(_text(cells[1]))
+    if nav is None:
+        return None
+    dt = _text(cells[0])
+    return (dt if re.match(r'\d{4}-\d{2}-\d{2}', dt) else None), nav
+
+
+def _find_nav_elem(root):
+    """按页面改版历史依次尝试的净值容器。"""
+    e = _first(root, _xp_class('dl', 'dataItem01'))
+    if e is not None:
+        return e
+    card = _first(root, _xp_class('div', 'fundInfoItem'))
+    if card is not None:
+        for t in card.xpath('.//text()'):
+            parent = t.getparent()
+            if t.is_tail and parent is not None:
+                parent = parent.getparent()
+            if parent is not None and re.search(r'[0-9.]+', t) and '单位净值' in _text(parent):
+                return parent
+    e = _first(root, _xp_class('div', 'dataOfFund'))
+    if e is not None:
+        return e
+    tbl = _first(root, _xp_class('table', 'w782'))
+    if tbl is not None:
+        rows = tbl.xpath('.//tr')
+        if len(rows) > 1:
+            cells = rows[1].xpath('.//td')
+            if len(cells) > 1:
+                return cells[1]
+    for xpath in (_xp_class('span', 'ui-font-large'), _xp_class('span', 'fix_dwjz')):
+        e = _first(root, xpath)
+        if e is not None:
+            return e
+    return None
+
+
+def parse_fund_page(html):
+    """
+    从天天基金详情页提取净值（JSON 接口不可用时的兜底）。
+    返回 {'nav', 'date'(YYYY-MM-DD), 'name', 'fund_type', 'source'}，提取失败返回 None。
+    """
+    root = _html_root(html)
+
+    # ---- 获取基金名称 ----
+    fund_name = None
+    name_elem = _first(root, _xp_class('div', 'fundDetail-tit'))
+    if name_elem is None:
+        name_elem = _first(root, '//h1')
+    if name_elem is not None:
+        name_match = re.search(r'([^\(]+)', _text(name_elem))
+        if name_match:
+            fund_name = name_match.group(1).strip()
+            print(f"提取到基金名称: {fund_name}")
+    if not fund_name:
+        content = _first(root, '//meta[@name="keywords"]/@content')
+        if content:
+            kws = content.split(',')
+            if len(kws) > 1:
+                fund_name = kws[0].strip()
+
+    # ---- 获取基金类型 ----
+    fund_type = None
+    type_keywords = {
+        '股票': '股票型', '混合': '混合型', '债券': '债券型',
+        '货币': '货币型', '指数': '指数型',
+        'QDII': 'QDII', 'ETF': 'ETF', 'LOF': 'LOF',
+    }
+    for item in root.xpath(_xp_class('div', 'fundInfoItem')):
+        m = re.search(r'基金类型[:：]\s*(\S+)', _text(item))
+        if m:
+            fund_type = m.group(1).strip()
+            break
+    if not fund_type and fund_name:
+        fund_type = next((tn for kw, tn in type_keywords.items() if kw in fund_name), None)
+    if not fund_type:
+        desc = _first(root, '//meta[@name="description"]/@content')
+        if desc:
+            fund_type = next((tn for kw, tn in type_keywords.items() if kw in desc), None)
+
+    # ---- 查找净值元素 ----
+    nav_elem = _find_nav_elem(root)
+    if nav_elem is None:
+        print("未能找到包含净值信息的元素")
+        return None
+
+    nav_text = _text(nav_elem)
+    print(f"找到净值元素，文本内容: {nav_text}")
+
+    nav_value = None
+    nav_date = None
+    m = re.search(r'单位净值[：:]\s*([0-9.]+)', nav_text)
+    if m:
+        nav_value = m.group(1)
+    m = re.search(r'更新时间[：:]\s*([0-9-]+)', nav_text)
+    if m:
+        nav_date = m.group(1)
+
+    if nav_value is None:
+        m = re.search(r'单位净值\((\d{4}-\d{2}-\d{2})\)([0-9.]+)', nav_text)
+        if m:
+            val = m.group(2)
+            if len(val) > 8:
+                dp = val.find('.')
+                if dp > 0 and dp + 5 <= len(val):
+                    val = val[:dp + 5]
+            nav_value = val
+
+    if nav_date is None:
+        m = re.search(r'更新日期：([0-9-]+)', nav_text) or re.search(r'单位净值\((\d{4}-\d{2}-\d{2})\)', nav_text)
+        if m:
+            nav_date = m.group(1)
+
+    if nav_value is None:
+        if '累计净值' in nav_text:
+            nav_text = nav_text.split('累计净值')[0]
+
+        tables = []
+        if 'QDII' in (fund_name or '').upper() or '海外' in (fund_name or '') or '净值估算' in nav_text:
+            # QDII 特殊容器，其次是任意带"日期 / 单位净值"表头的表格
+            tables = root.xpath('//div[@id="jjjz_gsjz"]//table') + [
+                tbl for tbl in root.xpath('//table')
+                if any('日期' in _text(h) for h in tbl.xpath('.//th'))
+                and any('单位净值' in _text(h) for h in tbl.xpath('.//th'))
+            ]
+        for tbl in tables:
+            row = _first_row_value(tbl)
+            if row:
+                row_date, nav_value = row
+                nav_date = nav_date or row_date
+                break
+
+        if nav_value is None:
+            nums = re.findall(r'\b[0-9]+\.[0-9]{3,4}\b', nav_text) or re.findall(r'[0-9.]+', nav_text)
+            for n in nums:
+                fv = _to_float(n)
+                if fv is not None and 0.1 <= fv <= 10:
+                    nav_value = fv
+                    break
+
+    # 从全页提取日期兜底
+    if nav_date is None:
+        all_dates = re.findall(r'\d{4}-\d{2}-\d{2}', _text(root))
+        valid = [d for d in all_dates if _valid_date(d)]
+        if valid:
+            nav_date = max(valid)
+    if nav_date is None:
+        nav_date = _latest_market_day().strftime('%Y-%m-%d')
+
+    nav = _to_float(nav_value)
+    if nav is None:
+        print("未能从文本中提取有效的净值和日期")
+        return None
+    return {
+        'nav': nav,
+        'date': nav_date,
+        'name': fund_name,
+        'fund_type': fund_type,
+        'source': 'eastmoney',
+    }
+
+
+def _valid_date(text):
+    try:
+        datetime.strptime(text, '%Y-%m-%d')
+        return True
+    except ValueError:
+        return False
+
+
+def parse_sina_page(html):
+    """从新浪财经净值页提取净值；该页无日期，取最近交易日。"""
+    ne = _first(_html_root(html), _xp_class('div', 'fundDetail-tit'))
+    if ne is None:
+        return None
+    m = re.search(r'([0-9.]+)', _text(ne))
+    nav = _to_float(m.group(1)) if m else None
+    if nav is None:
+        return None
+    return {
+        'nav': nav,
+        'date': _latest_market_day().strftime('%Y-%m-%d'),
+        'name': None,
+        'fund_type': None,
+        'source': 'sina',
+    }
+
+
+NAV_SOURCES = (
+    NavSource('lsjz', LSJZ_URL, fetch_lsjz, parse_lsjz, False),
+    NavSource('fundgz', FUNDGZ_URL, fetch_fundgz, parse_fundgz, False),
+    NavSource('eastmoney', EASTMONEY_FUND_URL, fetch_fund_page, parse_fund_page, True),
+    NavSource('sina', SINA_NAV_URL, fetch_sina_page, parse_sina_page, True),
+)
+PROFILE_SOURCE = 'eastmoney'
+
+
+class ParseMemo:
+    """按 (数据源, 当天, 内容哈希) 记住解析结果，页面内容没变就跳过解析。
+
+    盘后轮询时同一页面会被反复抓到（HTTP 缓存命中或上游内容未更新）。
+    键里带上日期，是因为新浪页面不含日期、解析结果取当天的最近交易日。
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    @staticmethod
+    def key(source, text):
+        from app.services.http_cache import content_hash
+        return source.name, date.today(), content_hash(text)
+
+    def get(self, key):
+        """返回 (是否命中, 结果副本)；解析失败的 None 结果同样会记住。"""
+        with self._lock:
+            if key not in self._data:
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            result = self._data[key]
+        return True, dict(result) if result else None
+
+    def put(self, key, result):
+        with self._lock:
+            self._data[key] = dict(result) if result else None
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+
+
+parse_memo = ParseMemo()
+
+
+def parse_page(source, text):
+    """source.parse(text)，内容与当天已解析过的页面相同时直接复用结果。"""
+    key = parse_memo.key(source, text)
+    hit, result = parse_memo.get(key)
+    if not hit:
+        result = source.parse(text)
+        parse_memo.put(key, result)
+    return result
+
+
+def codes_needing_profile(fund_codes, _Fund=None):
+    """
+    需要补全名称/类型的基金（无记录、无名称或类型未知）。
+    JSON 接口不返回类型，这些基金从详情页开始抓取。
+    """
+    if _Fund is None:
+        from app.models import Fund as _Fund
+    codes = list(fund_codes)
+    known = {}
+    for i in range(0, len(codes), 500):
+        chunk = codes[i:i + 500]
+        for fund in _Fund.query.filter(_Fund.code.in_(chunk)).all():
+            known[fund.code] = fund
+    return {
+        code for code in codes
+        if code not in known or not known[code].name
+        or not known[code].fund_type or known[code].fund_type == '未知'
+    }
+
+
+def sources_for(fund_code, needs_profile=False):
+    """该基金应依次尝试的数据源。"""
+    if not needs_profile:
+        return NAV_SOURCES
+    start = next(i for i, s in enumerate(NAV_SOURCES) if s.name == PROFILE_SOURCE)
+    return NAV_SOURCES[start:]
+
+
+def source_key(source):
+    """数据源在 source_router 中的名字。"""
+    return f'nav:{source.name}'
+
+
+def available_sources(sources):
+    """剔除熔断中的数据源，保持原顺序。"""
+    from app.services.source_router import source_router
+    allowed = set(source_router.route([source_key(s) for s in sources], reorder=False))
+    return [s for s in sources if source_key(s) in allowed]
+
+
+def responded(text):
+    """非 200（fetch 返回 None）多是单只基金无数据，不算数据源故障；只有连接失败/超时计入熔断。"""
+    return True
+
+
+def fetch_from(source, fund_code, **kwargs):
+    """经熔断器调用 source.fetch；熔断中抛 SourceUnavailable。"""
+    from app.services.source_router import source_router
+    return source_router.call(source_key(source), source.fetch, fund_code, accept=responded, **kwargs)
+
+
+def apply_nav_result(fund_code, result, _db=None, _Fund=None, _FundNavHistory=None, commit=True):
+    """
+    把解析结果写入 Fund / FundNavHistory，并按新旧净值差计算持仓收益。
+    基金不存在时新建记录（新浪数据源除外，其页面不含名称）。
+    commit=False 时只 flush，由调用方统一提交（批量抓取的单事务写入）。
+    返回是否写入成功。
     """
     if _db is None:
         from app.extensions import db as _db
@@ -22,284 +512,69 @@ def update_fund_nav(fund_code, _db=None, _Fund=None, _FundNavHistory=None):
 
     from app.services.calculation import calculate_returns
 
-    try:
-        url = f"http://fund.eastmoney.com/{fund_code}.html"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                          'AppleWebKit/537.36 (KHTML, like Gecko) '
-                          'Chrome/91.0.4472.124 Safari/537.36'
-        }
-
-        print(f"尝试爬取基金 {fund_code} 的净值数据，URL: {url}")
-        response = requests.get(url, headers=headers, timeout=20)
-        response.encoding = 'utf-8'
-        print(f"服务器响应状态码: {response.status_code}")
-
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # ---- 获取基金名称 ----
-            fund_name = None
-            fund_name_elem = soup.find('div', class_='fundDetail-tit') or soup.find('h1')
-            if fund_name_elem:
-                fund_name_text = fund_name_elem.get_text(strip=True)
-                name_match = re.search(r'([^\(]+)', fund_name_text)
-                if name_match:
-                    fund_name = name_match.group(1).strip()
-                    print(f"提取到基金名称: {fund_name}")
-            if not fund_name:
-                meta = soup.find('meta', attrs={'name': 'keywords'})
-                if meta and meta.get('content'):
-                    kws = meta['content'].split(',')
-                    if kws and len(kws) > 1:
-                        fund_name = kws[0].strip()
-
-            # ---- 获取基金类型 ----
-            fund_type = None
-            type_keywords = {
-                '股票': '股票型', '混合': '混合型', '债券': '债券型',
-                '货币': '货币型', '指数': '指数型',
-                'QDII': 'QDII', 'ETF': 'ETF', 'LOF': 'LOF',
-            }
-            ft_elem = soup.find('div', class_='fundInfoItem', text=re.compile(r'基金类型'))
-            if ft_elem:
-                m = re.search(r'基金类型[:：]\s*(\S+)', ft_elem.get_text(strip=True))
-                if m:
-                    fund_type = m.group(1).strip()
-            if not fund_type and fund_name:
-                for kw, tn in type_keywords.items():
-                    if kw in fund_name:
-                        fund_type = tn
-                        break
-            if not fund_type:
-                desc_meta = soup.find('meta', attrs={'name': 'description'})
-                if desc_meta and desc_meta.get('content'):
-                    for kw, tn in type_keywords.items():
-                        if kw in desc_meta['content']:
-                            fund_type = tn
-                            break
-
-            # ---- 查找净值元素（5种方式） ----
-            nav_elem = None
-            if not nav_elem:
-                e = soup.find('dl', class_='dataItem01')
-                if e:
-                    nav_elem = e
-            if not nav_elem:
-                card = soup.find('div', class_='fundInfoItem')
-                if card:
-                    for t in card.find_all(text=re.compile(r'[0-9.]+')):
-                        if t.parent and '单位净值' in t.parent.text:
-                            nav_elem = t.parent
-                            break
-            if not nav_elem:
-                e = soup.find('div', class_='dataOfFund')
-                if e:
-                    nav_elem = e
-            if not nav_elem:
-                tbl = soup.find('table', class_='w782')
-                if tbl:
-                    rows = tbl.find_all('tr')
-                    if len(rows) > 1:
-                        cells = rows[1].find_all('td')
-                        if len(cells) > 1:
-                            nav_elem = cells[1]
-            if not nav_elem:
-                e = soup.find('span', class_='ui-font-large')
-                if e:
-                    nav_elem = e
-            if not nav_elem:
-                e = soup.find('span', class_='fix_dwjz')
-                if e:
-                    nav_elem = e
-
-            if nav_elem:
-                nav_text = nav_elem.get_text(strip=True)
-                print(f"找到净值元素，文本内容: {nav_text}")
-
-                nav_match = re.search(r'单位净值[：:]\s*([0-9.]+)', nav_text)
-                date_match = re.search(r'更新时间[：:]\s*([0-9-]+)', nav_text)
-
-                if not nav_match:
-                    m2 = re.search(r'单位净值\((\d{4}-\d{2}-\d{2})\)([0-9.]+)', nav_text)
-                    if m2:
-                        val = m2.group(2)
-                        if len(val) > 8:
-                            dp = val.find('.')
-                            if dp > 0 and dp + 5 <= len(val):
-                                val = val[:dp + 5]
-                        nav_match = type('_', (), {'group': lambda s, x=1: val})()
-
-                if not date_match:
-                    date_match = re.search(r'更新日期：([0-9-]+)', nav_text) or \
-                                 re.search(r'单位净值\((\d{4}-\d{2}-\d{2})\)', nav_text)
-
-                if not nav_match and not date_match:
-                    dm = re.search(r'单位净值\(([0-9-]+)\)', nav_text)
-                    if dm:
-                        date_match = dm
-                        part = nav_text.split(dm.group(0))[1]
-                        nm = re.search(r'(\d+\.\d{3,4})', part)
-                        if nm:
-                            nav_match = nm
-
-                if not nav_match:
-                    if '累计净值' in nav_text:
-                        nav_text = nav_text.split('累计净值')[0]
-
-                    fn_upper = (fund_name or '').upper()
-                    if 'QDII' in fn_upper or '海外' in (fund_name or '') or '净值估算' in nav_text:
-                        # QDII 特殊容器
-                        container = soup.find('div', id='jjjz_gsjz')
-                        if container:
-                            for tbl in container.find_all('table'):
-                                rows = tbl.find_all('tr')
-                                if len(rows) > 1:
-                                    cells = rows[1].find_all('td')
-                                    if len(cells) > 1:
-                                        try:
-                                            fv = float(cells[1].get_text(strip=True))
-                                            nav_match = type('_', (), {'group': lambda s, x=1: fv})()
-                                            if cells[0] and not date_match:
-                                                dt = cells[0].get_text(strip=True)
-                                                if re.match(r'\d{4}-\d{2}-\d{2}', dt):
-                                                    date_match = type('_', (), {'group': lambda s, x=1: dt})()
-                                        except ValueError:
-                                            pass
-                                if nav_match:
-                                    break
-                        if not nav_match:
-                            for tbl in soup.find_all('table'):
-                                ths = tbl.find_all('th')
-                                if ths and any('日期' in h.text for h in ths) and any('单位净值' in h.text for h in ths):
-                                    rows = tbl.find_all('tr')
-                                    if len(rows) > 1:
-                                        cells = rows[1].find_all('td')
-                                        if len(cells) > 1:
-                                            try:
-                                                fv = float(cells[1].get_text(strip=True))
-                                                nav_match = type('_', (), {'group': lambda s, x=1: fv})()
-                                                if cells[0] and not date_match:
-                                                    dt = cells[0].get_text(strip=True)
-                                                    if re.match(r'\d{4}-\d{2}-\d{2}', dt):
-                                                        date_match = type('_', (), {'group': lambda s, x=1: dt})()
-                                            except ValueError:
-                                                pass
-                                    if nav_match:
-                                        break
-
-                    if not nav_match:
-                        nums = re.findall(r'\b[0-9]+\.[0-9]{3,4}\b', nav_text) or re.findall(r'[0-9.]+', nav_text)
-                        for n in nums:
-                            try:
-                                fv = float(n)
-                                if 0.1 <= fv <= 10:
-                                    nav_match = type('_', (), {'group': lambda s, x=1: fv})()
-                                    break
-                            except ValueError:
-                                continue
-
-                # 从全页提取日期兜底
-                if not date_match:
-                    all_dates = re.findall(r'\d{4}-\d{2}-\d{2}', soup.get_text(strip=True))
-                    if all_dates:
-                        latest = sorted([datetime.strptime(d, '%Y-%m-%d') for d in all_dates], reverse=True)[0]
-                        dt_str = latest.strftime('%Y-%m-%d')
-                        date_match = type('_', (), {'group': lambda s, x=1: dt_str})()
-
-                if not date_match:
-                    from app.services.fund_service import FundService
-                    today = datetime.now().date()
-                    dt_str = today.strftime('%Y-%m-%d')
-                    if not FundService.is_market_day(today):
-                        for i in range(1, 8):
-                            cd = today - timedelta(days=i)
-                            if FundService.is_market_day(cd):
-                                dt_str = cd.strftime('%Y-%m-%d')
-                                break
-                    date_match = type('_', (), {'group': lambda s, x=1: dt_str})()
-
-                if nav_match and date_match:
-                    latest_nav = float(nav_match.group(1))
-                    nav_date = datetime.strptime(date_match.group(1), '%Y-%m-%d')
-                    print(f"成功提取净值: {latest_nav}, 日期: {nav_date}")
-
-                    fund = _Fund.query.filter_by(code=fund_code).first()
-                    if fund:
-                        old_nav = fund.latest_nav
-                        fund.latest_nav = latest_nav
-                        fund.nav_date = nav_date
-                        if fund_name and not fund.name:
-                            fund.name = fund_name
-                        if fund_type and (not fund.fund_type or fund.fund_type == '未知'):
-                            fund.fund_type = fund_type
-                        _db.session.commit()
-
-                        if not _FundNavHistory.query.filter_by(fund_id=fund.id, date=nav_date).first():
-                            _db.session.add(_FundNavHistory(fund_id=fund.id, nav=latest_nav, date=nav_date))
-                            _db.session.commit()
-
-                        if old_nav and old_nav != latest_nav:
-                            calculate_returns(fund.id, old_nav, latest_nav, _db=_db)
-                        return True
-                    else:
-                        new_fund = _Fund(
-                            code=fund_code,
-                            name=fund_name or f"基金{fund_code}",
-                            fund_type=fund_type or '未知',
-                            latest_nav=latest_nav,
-                            nav_date=nav_date
-                        )
-                        _db.session.add(new_fund)
-                        _db.session.commit()
-                        print(f"成功创建新基金记录: {new_fund.name} ({new_fund.code})")
-                        return True
-                else:
-                    print("未能从文本中提取有效的净值和日期")
-            else:
-                print("未能找到包含净值信息的元素")
-
-        # ---- 备用数据源：新浪财经 ----
-        try:
-            print(f"尝试使用备用数据源爬取基金 {fund_code}")
-            sina_url = f"http://finance.sina.com.cn/fund/quotes/{fund_code}/nav.shtml"
-            sr = requests.get(sina_url, headers=headers, timeout=10)
-            sr.encoding = 'utf-8'
-            if sr.status_code == 200:
-                ssoup = BeautifulSoup(sr.text, 'html.parser')
-                ne = ssoup.find('div', class_='fundDetail-tit')
-                if ne:
-                    m = re.search(r'([0-9.]+)', ne.get_text(strip=True))
-                    if m:
-                        latest_nav = float(m.group(1))
-                        from app.services.fund_service import FundService
-                        today = datetime.now().date()
-                        nav_date = datetime.now()
-                        if not FundService.is_market_day(today):
-                            for i in range(1, 8):
-                                cd = today - timedelta(days=i)
-                                if FundService.is_market_day(cd):
-                                    nav_date = datetime.combine(cd, datetime.min.time())
-                                    break
-
-                        fund = _Fund.query.filter_by(code=fund_code).first()
-                        if fund:
-                            old_nav = fund.latest_nav
-                            fund.latest_nav = latest_nav
-                            fund.nav_date = nav_date
-                            _db.session.commit()
-
-                            if not _FundNavHistory.query.filter_by(fund_id=fund.id, date=nav_date).first():
-                                _db.session.add(_FundNavHistory(fund_id=fund.id, nav=latest_nav, date=nav_date))
-                                _db.session.commit()
-
-                            if old_nav and old_nav != latest_nav:
-                                calculate_returns(fund.id, old_nav, latest_nav, _db=_db)
-                            print(f"从新浪财经成功获取净值: {latest_nav}")
-                            return True
-        except Exception as e:
-            print(f"备用数据源爬取失败: {str(e)}")
+    def _save():
+        if commit:
+            _db.session.commit()
+        else:
+            _db.session.flush()
+
+    latest_nav = result['nav']
+    nav_date = datetime.strptime(result['date'], '%Y-%m-%d')
+    fund_name = result.get('name')
+    fund_type = result.get('fund_type')
+    print(f"成功提取净值: {latest_nav}, 日期: {nav_date}")
+
+    fund = _Fund.query.filter_by(code=fund_code).first()
+    if fund:
+        old_nav = fund.latest_nav
+        fund.latest_nav = latest_nav
+        fund.nav_date = nav_date
+        if fund_name and not fund.name:
+            fund.name = fund_name
+        if fund_type and (not fund.fund_type or fund.fund_type == '未知'):
+            fund.fund_type = fund_type
+        _FundNavHistory.upsert(fund.id, nav_date, latest_nav)
+        _save()
+
+        if old_nav and old_nav != latest_nav:
+            calculate_returns(fund.id, old_nav, latest_nav, _db=_db)
+        if result.get('source') == 'sina':
+            print(f"从新浪财经成功获取净值: {latest_nav}")
+        return True
+
+    if result.get('source') == 'sina':
+        return False
+
+    new_fund = _Fund(
+        code=fund_code,
+        name=fund_name or f"基金{fund_code}",
+        fund_type=fund_type or '未知',
+        latest_nav=latest_nav,
+        nav_date=nav_date
+    )
+    _db.session.add(new_fund)
+    _save()
+    print(f"成功创建新基金记录: {new_fund.name} ({new_fund.code})")
+    return True
 
+
+def update_fund_nav(fund_code, _db=None, _Fund=None, _FundNavHistory=None):
+    """
+    爬取并更新基金净值（写入数据库）。
+    _db / _Fund / _FundNavHistory 仅供测试注入，正常调用无需传递。
+    """
+    models = dict(_db=_db, _Fund=_Fund, _FundNavHistory=_FundNavHistory)
+    try:
+        needs_profile = fund_code in codes_needing_profile([fund_code], _Fund=_Fund)
+        for source in available_sources(sources_for(fund_code, needs_profile)):
+            try:
+                text = fetch_from(source, fund_code)
+                result = parse_page(source, text) if text else None
+            except Exception as e:
+                print(f"数据源 {source.name} 爬取失败: {str(e)}")
+                continue
+            if result and apply_nav_result(fund_code, result, **models):
+                return True
         return False
 
     except Exception as e:
@@ -0,0 +1,61 @@
+"""数据库通用操作：按方言生成批量 INSERT ... ON CONFLICT 语句."""
+from datetime import datetime
+from typing import Optional
+
+from app.extensions import db
+
+# 单条语句最多绑定的变量数（旧版 SQLite 上限为 999，留些余量）
+SQLITE_MAX_VARIABLES = 900
+
+
+def _dialect_insert(table):
+    name = db.engine.dialect.name
+    if name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise NotImplementedError(f"不支持的数据库方言: {name}")
+    return insert(table)
+
+
+def rows_per_statement(table, chunk_size: Optional[int] = None) -> int:
+    """每条批量语句的行数，保证绑定变量不超过 SQLITE_MAX_VARIABLES；chunk_size 可再调小。
+
+    按表的全部列数估算（带默认值的列也会逐行绑定），另留一个给 DO UPDATE 里的 updated_at。
+    """
+    per_statement = max(1, (SQLITE_MAX_VARIABLES - 1) // len(table.c))
+    return min(chunk_size, per_statement) if chunk_size else per_statement
+
+
+def insert_ignore(model, rows, chunk_size: Optional[int] = None):
+    """
+    批量 INSERT ... ON CONFLICT DO NOTHING（冲突由表上的唯一约束判定）。
+    按列数分批执行（见 rows_per_statement），不提交事务；返回实际插入的行数。
+    """
+    inserted = 0
+    table = model.__table__
+    chunk_size = rows_per_statement(table, chunk_size)
+    for i in range(0, len(rows), chunk_size):
+        stmt = _dialect_insert(table).values(rows[i:i + chunk_size]).on_conflict_do_nothing()
+        inserted += db.session.execute(stmt).rowcount
+    return inserted
+
+
+def upsert(model, rows, index_elements, update_columns, chunk_size: Optional[int] = None):
+    """
+    批量 INSERT ... ON CONFLICT (index_elements) DO UPDATE SET update_columns。
+    index_elements 须对应表上的唯一约束/唯一索引；表有 updated_at 时一并刷新。
+    按列数分批执行（见 rows_per_statement），不提交事务；返回受影响的行数。
+    """
+    affected = 0
+    table = model.__table__
+    chunk_size = rows_per_statement(table, chunk_size)
+    for i in range(0, len(rows), chunk_size):
+        stmt = _dialect_insert(table).values(rows[i:i + chunk_size])
+        set_ = {col: stmt.excluded[col] for col in update_columns}
+        if 'updated_at' in table.c and 'updated_at' not in set_:
+            set_['updated_at'] = datetime.utcnow()
+        stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+        affected += db.session.execute(stmt).rowcount
+    return affected
@@ -1,7 +1,7 @@
 from app.extensions import db
 from app.models.fund import Fund
 from app.models.fund_nav_history import FundNavHistory
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 import calendar
 
 class FundService:
@@ -34,18 +34,20 @@ class FundService:
     @staticmethod
     def update_all_funds_nav():
         """更新所有基金净值"""
-        funds = Fund.query.all()
-        updated_count = 0
-        from app.services.crawler import update_fund_nav
-        for fund in funds:
-            if update_fund_nav(fund.code):
-                updated_count += 1
-        return updated_count
+        from app.services.nav_pipeline import crawl_fund_navs
+        codes = [fund.code for fund in Fund.query.all()]
+        return crawl_fund_navs(codes).success_count
 
     @staticmethod
     def fetch_and_save_historical_navs(fund_id, days=30):
-        """占位方法，历史净值已由 update_fund_nav 逐次写入"""
-        return 0
+        """回补基金最近 days 天的历史净值，返回新写入的记录数"""
+        fund = Fund.query.get(fund_id)
+        if not fund:
+            return 0
+        from app.services.nav_backfill import backfill_funds
+        start_date = datetime.now().date() - timedelta(days=days)
+        results = backfill_funds([fund.code], start_date=start_date, workers=1)
+        return sum(r.inserted for r in results)
     
     @staticmethod
     def calculate_30_day_average(fund_id):
@@ -64,77 +66,12 @@ class FundService:
     
     @staticmethod
     def is_market_day(date=None):
-        """判断是否为交易日（排除周末和节假日）"""
+        """判断是否为交易日（排除周末和节假日），见 app.services.trading_calendar"""
+        from app.services.trading_calendar import is_trading_day
         if date is None:
             date = datetime.utcnow().date()
-        
-        # 排除周末
-        if date.weekday() >= 5:
-            return False
-        
-        # 添加法定节假日判断（这里列出了2023年和2024年的主要节假日）
-        # 实际应用中应该从权威来源获取最新的交易日历
-        holidays = [
-            # 2023年节假日
-            datetime(2023, 1, 1).date(),  # 元旦
-            datetime(2023, 1, 21).date(), datetime(2023, 1, 22).date(), 
-            datetime(2023, 1, 23).date(), datetime(2023, 1, 24).date(), 
-            datetime(2023, 1, 25).date(),  # 春节
-            datetime(2023, 4, 5).date(),  # 清明节
-            datetime(2023, 5, 1).date(), datetime(2023, 5, 2).date(), 
-            datetime(2023, 5, 3).date(),  # 劳动节
-            datetime(2023, 6, 22).date(), datetime(2023, 6, 23).date(),  # 端午节
-            datetime(2023, 9, 29).date(), datetime(2023, 9, 30).date(),  # 中秋节
-            datetime(2023, 10, 1).date(), datetime(2023, 10, 2).date(), 
-            datetime(2023, 10, 3).date(), datetime(2023, 10, 4).date(), 
-            datetime(2023, 10, 5).date(),  # 国庆节
-            
-            # 2024年节假日
-            datetime(2024, 1, 1).date(),  # 元旦
-            datetime(2024, 2, 10).date(), datetime(2024, 2, 11).date(), 
-            datetime(2024, 2, 12).date(), datetime(2024, 2, 13).date(), 
-            datetime(2024, 2, 14).date(),  # 春节
-            datetime(2024, 4, 4).date(),  # 清明节
-            datetime(2024, 5, 1).date(), datetime(2024, 5, 2).date(), 
-            datetime(2024, 5, 3).date(),  # 劳动节
-            datetime(2024, 6, 10).date(),  # 端午节
-            datetime(2024, 9, 17).date(),  # 中秋节
-            datetime(2024, 10, 1).date(), datetime(2024, 10, 2).date(), 
-            datetime(2024, 10, 3).date(), datetime(2024, 10, 4).date(), 
-            datetime(2024, 10, 5).date()  # 国庆节
-        ]
-        
-        # 判断是否为节假日
-        if date in holidays:
-            return False
-        
-        # 判断是否为调休上班日（周末调休）
-        # 这里需要添加调休上班日列表
-        workdays = [
-            # 2023年调休上班日
-            datetime(2023, 1, 28).date(),  # 春节调休
-            datetime(2023, 2, 18).date(),  # 春节调休
-            datetime(2023, 4, 23).date(),  # 劳动节调休
-            datetime(2023, 5, 6).date(),   # 劳动节调休
-            datetime(2023, 9, 23).date(),  # 中秋节调休
-            datetime(2023, 10, 7).date(),  # 国庆节调休
-            datetime(2023, 10, 8).date(),  # 国庆节调休
-            
-            # 2024年调休上班日
-            datetime(2024, 2, 4).date(),   # 春节调休
-            datetime(2024, 2, 18).date(),  # 春节调休
-            datetime(2024, 4, 28).date(),  # 劳动节调休
-            datetime(2024, 5, 11).date(),  # 劳动节调休
-            datetime(2024, 9, 15).date(),  # 中秋节调休
-            datetime(2024, 10, 12).date()  # 国庆节调休
-        ]
-        
-        # 如果是调休上班日且是周末，返回True
-        if date in workdays:
-            return True
-        
-        return True
-    
+        return is_trading_day(date)
+
     @staticmethod
     def should_update_nav():
         """判断当前是否应该更新净值（工作日15:30至次日凌晨2点）"""
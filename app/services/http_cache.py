@@ -0,0 +1,276 @@
+"""上游 HTTP 响应的持久化缓存.
+
+挂在共享 requests.Session 下的 CachingAdapter：GET 响应体 gzip 压缩后存盘，
+键为规范化的 URL + 参数（去掉 rt / _ 这类时间戳防缓存参数）。
+
+- 响应带 Cache-Control: max-age / Expires 时按其缓存，no-store 不缓存；
+- 上游不给缓存头时按 host 套用配置的 TTL（未配置的 host 不按时间缓存）；
+- 过期后若有 ETag / Last-Modified，带 If-None-Match / If-Modified-Since 重新验证，
+  304 直接复用本地响应体；
+- 响应体按内容哈希存放（bodies/<sha256>.gz），相同内容只存一份；
+  content_hash() 供解析层按内容去重，页面没变就跳过解析。
+
+缓存命中的响应带 X-Cache 头（HIT / REVALIDATED）。磁盘出错时只记日志，按未命中处理。
+"""
+from email.utils import parsedate_to_datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# 不参与缓存键的查询参数（调用方加的时间戳）
+IGNORED_PARAMS = frozenset({'rt', '_'})
+# 随缓存保存的响应头
+_KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Expires')
+# 每写入这么多次检查一次磁盘占用
+_PRUNE_EVERY = 200
+# 条目这么久没再写入（存储或 304 续期）就删除
+ENTRY_MAX_AGE = 7 * 86400
+
+_MAX_AGE_RE = re.compile(r'max-age\s*=\s*(\d+)', re.I)
+
+
+def content_hash(body) -> str:
+    """响应体（str / bytes）的内容哈希。"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return hashlib.sha256(body).hexdigest()
+
+
+def cache_key(method: str, url: str) -> str:
+    """规范化 URL：host 小写、查询参数排序、去掉 IGNORED_PARAMS。"""
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in IGNORED_PARAMS)
+    normalized = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', urlencode(query), ''))
+    return f'{method.upper()} {normalized}'
+
+
+def _freshness(headers, default_ttl: Optional[float], now: float) -> Optional[float]:
+    """响应可直接复用的秒数；None 表示不可存储（no-store）。"""
+    cache_control = headers.get('Cache-Control', '')
+    if 'no-store' in cache_control.lower():
+        return None
+    if 'no-cache' in cache_control.lower():
+        return 0.0
+    m = _MAX_AGE_RE.search(cache_control)
+    if m:
+        return float(m.group(1))
+    if headers.get('Expires'):
+        try:
+            return max(parsedate_to_datetime(headers['Expires']).timestamp() - now, 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+    return default_ttl or 0.0
+
+
+class HttpCache:
+    """磁盘 HTTP 缓存：entries/<key 哈希>.json 存元数据，bodies/<内容哈希>.gz 存响应体."""
+
+    def __init__(self, root: Optional[str] = None, ttls: Optional[dict] = None,
+                 max_bytes: int = 200 * 1024 * 1024, clock=time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.configure(root, ttls, max_bytes)
+
+    def configure(self, root: Optional[str], ttls: Optional[dict] = None,
+                  max_bytes: int = 200 * 1024 * 1024) -> None:
+        """切换缓存目录（create_app 时调用）；root 为空表示禁用。"""
+        self.root = root or None
+        self.ttls = dict(ttls or {})
+        self.max_bytes = max_bytes
+        if self.root:
+            os.makedirs(os.path.join(self.root, 'entries'), exist_ok=True)
+            os.makedirs(os.path.join(self.root, 'bodies'), exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.root is not None
+
+    def ttl_for(self, url: str) -> Optional[float]:
+        return self.ttls.get(urlsplit(url).hostname or '')
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.root, 'entries', hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _body_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'bodies', digest + '.gz')
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """缓存条目元数据（含 'body'）；无条目或响应体已被清理返回 None。"""
+        if not self.enabled:
+            return None
+        try:
+            with open(self._entry_path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+            with gzip.open(self._body_path(entry['hash']), 'rb') as f:
+                entry['body'] = f.read()
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("http cache read failed: %s", e)
+            return None
+
+    def is_fresh(self, entry: dict) -> bool:
+        return entry['expires_at'] > self._clock()
+
+    def store(self, key: str, response: requests.Response, ttl: float) -> dict:
+        """保存 200 响应；相同内容的响应体只写一次。"""
+        body = response.content
+        entry = {
+            'url': response.url,
+            'hash': content_hash(body),
+            'headers': {h: response.headers[h] for h in _KEPT_HEADERS if h in response.headers},
+            'encoding': response.encoding,
+            'stored_at': self._clock(),
+            'expires_at': self._clock() + ttl,
+        }
+        try:
+            body_path = self._body_path(entry['hash'])
+            if os.path.exists(body_path):
+                os.utime(body_path)
+            else:
+                self._atomic_write(body_path, gzip.compress(body))
+            self._write_entry(key, entry)
+        except OSError as e:
+            logger.warning("http cache write failed: %s", e)
+        self._maybe_prune()
+        return dict(entry, body=body)
+
+    def refresh(self, key: str, entry: dict, headers, ttl: float) -> dict:
+        """304 后延长条目有效期，并记下新的校验头。"""
+        entry = {k: v for k, v in entry.items() if k != 'body'}
+        for h in ('ETag', 'Last-Modified', 'Cache-Control', 'Expires'):
+            if h in headers:
+                entry['headers'][h] = headers[h]
+        entry['expires_at'] = self._clock() + ttl
+        try:
+            self._write_entry(key, entry)
+            os.utime(self._body_path(entry['hash']))
+        except OSError as e:
+            logger.warning("http cache write failed: %s", e)
+        return entry
+
+    def _write_entry(self, key: str, entry: dict) -> None:
+        self._atomic_write(self._entry_path(key), json.dumps(entry).encode('utf-8'))
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes) -> None:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _maybe_prune(self) -> None:
+        with self._lock:
+            self._writes += 1
+            if self._writes < _PRUNE_EVERY:
+                return
+            self._writes = 0
+        self.prune()
+
+    def prune(self) -> None:
+        """清理磁盘占用。
+
+        删除 ENTRY_MAX_AGE 内没再写过的条目；响应体总大小超过 max_bytes 时从最久未用的开始删，
+        引用它的条目下次读取时按未命中处理。
+        """
+        if not self.enabled:
+            return
+        try:
+            cutoff = self._clock() - ENTRY_MAX_AGE
+            for entry in _scan(os.path.join(self.root, 'entries')):
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+            files = []
+            for entry in _scan(os.path.join(self.root, 'bodies')):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                os.unlink(path)
+                total -= size
+        except OSError as e:
+            logger.warning("http cache prune failed: %s", e)
+
+
+def _scan(directory: str):
+    """目录下的缓存文件（跳过写入中的临时文件）。"""
+    return [e for e in os.scandir(directory) if e.is_file() and not e.name.startswith('.')]
+
+
+def _cached_response(request, entry: dict, status: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = 'OK'
+    response._content = entry['body']
+    response._content_consumed = True
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response.headers['X-Cache'] = status
+    response.encoding = entry.get('encoding')
+    response.url = request.url
+    response.request = request
+    return response
+
+
+class CachingAdapter(HTTPAdapter):
+    """经 HttpCache 收发 GET 请求的 HTTPAdapter；缓存禁用时与 HTTPAdapter 相同。"""
+
+    def __init__(self, cache: Optional[HttpCache] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache or http_cache
+
+    def send(self, request, **kwargs):
+        cache = self.cache
+        if not cache.enabled or request.method != 'GET' or kwargs.get('stream'):
+            return super().send(request, **kwargs)
+
+        key = cache_key(request.method, request.url)
+        entry = cache.lookup(key)
+        if entry is not None and cache.is_fresh(entry):
+            return _cached_response(request, entry, 'HIT')
+        if entry is not None:
+            if entry['headers'].get('ETag'):
+                request.headers['If-None-Match'] = entry['headers']['ETag']
+            if entry['headers'].get('Last-Modified'):
+                request.headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+
+        response = super().send(request, **kwargs)
+        default_ttl = cache.ttl_for(request.url)
+        if response.status_code == 304 and entry is not None:
+            ttl = _freshness(response.headers, default_ttl, cache._clock()) or 0.0
+            entry = dict(cache.refresh(key, entry, response.headers, ttl), body=entry['body'])
+            response.close()
+            return _cached_response(request, entry, 'REVALIDATED')
+        if response.status_code == 200:
+            ttl = _freshness(response.headers, default_ttl, cache._clock())
+            has_validators = 'ETag' in response.headers or 'Last-Modified' in response.headers
+            if ttl is not None and (ttl > 0 or has_validators):
+                cache.store(key, response, ttl)
+        return response
+
+
+http_cache = HttpCache()
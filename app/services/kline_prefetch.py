@@ -0,0 +1,147 @@
+"""收盘后预取场内 ETF 日 K.
+
+收集系统里引用到的场内 ETF：持仓中的场内基金、FUND_ETF_PAIRS 配置的联接 ETF、
+近期被查看过的筹码页。有界并发拉取增量日 K 后，再按各自的参数组合预计算筹码分布，
+并写入默认参数的筹码快照，次日的筹码页和仪表盘请求直接命中缓存。
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import logging
+import time
+from typing import Optional
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# 场内基金代码前缀（ETF / LOF / REITs），与持仓页显示筹码入口的规则一致
+EXCHANGE_FUND_PREFIXES = ('51', '56', '58', '15', '16', '18')
+# chip-data 接口默认参数：(decay, bin_count, window_days, kernel)
+DEFAULT_CHIP_PARAMS = (0.97, 80, 250, 'uniform')
+
+
+def is_exchange_fund_code(code: Optional[str]) -> bool:
+    return bool(code) and len(code) == 6 and code.isdigit() and code[:2] in EXCHANGE_FUND_PREFIXES
+
+
+@dataclass
+class PrefetchReport:
+    """一次预取的统计."""
+    symbols: int = 0
+    refreshed: int = 0
+    computed: int = 0
+    snapshots: int = 0
+    failures: dict = field(default_factory=dict)    # symbol -> 原因
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"ETF 日 K 预取：{self.symbols} 个代码，刷新成功 {self.refreshed} 个，"
+            f"失败 {len(self.failures)} 个，预计算筹码分布 {self.computed} 组、快照 {self.snapshots} 个，"
+            f"耗时 {self.elapsed:.1f}s"
+        )
+
+
+def collect_prefetch_targets(recent_days: int = 7, now: Optional[datetime] = None) -> dict:
+    """收集需要预取的 symbol 及其筹码参数组合。
+
+    Returns: {prefixed_symbol: {(decay, bin_count, window_days, kernel), ...}}
+    """
+    from app.extensions import db
+    from app.models import EtfChipState, Fund, Position
+    from app.services.quote_provider import _prefixed_symbol
+
+    targets: dict = {}
+
+    def add(code, params=DEFAULT_CHIP_PARAMS):
+        targets.setdefault(_prefixed_symbol(code), set()).add(params)
+
+    held = db.session.query(Fund.code).join(Position, Position.fund_id == Fund.id).distinct()
+    for (code,) in held:
+        if is_exchange_fund_code(code):
+            add(code)
+    for _pair_name, etf_code in current_app.config.get('FUND_ETF_PAIRS', {}).values():
+        add(etf_code)
+
+    now = now or datetime.utcnow()
+    for state in EtfChipState.viewed_since(now - timedelta(days=recent_days)):
+        add(state.symbol, (state.decay, state.bin_count, state.window_days, state.kernel))
+    return targets
+
+
+def _refresh(app, symbol: str, days: int) -> bool:
+    """在独立 app context 中拉取单只 ETF 的增量日 K；已是最新时直接返回。"""
+    from app.models.etf_kline_cache import EtfKlineCache
+    from app.services import quote_provider
+
+    with app.app_context():
+        if quote_provider.kline_is_fresh(EtfKlineCache.get_latest_date(symbol)):
+            return True
+        return quote_provider.refresh_etf_daily_kline(symbol, days)
+
+
+def _precompute(symbol: str, params: set) -> int:
+    """为每个参数组合确保存在截至最新 K 线的筹码状态；返回新算的组数。"""
+    from app.services import chip_distribution, chip_state
+    from app.services.kline_store import get_kline_store
+
+    computed = 0
+    store = get_kline_store()
+    for decay, bin_count, window_days, kernel in sorted(params):
+        series = store.read(symbol, window_days)
+        if not len(series):
+            continue
+        as_of = series.last_date
+        if chip_state.get_distribution(symbol, decay, bin_count, window_days, as_of, kernel) is not None:
+            continue
+        dist = chip_distribution.compute_chip_distribution(series, decay=decay, bin_count=bin_count, kernel=kernel)
+        chip_state.save_distribution(symbol, decay, bin_count, window_days, as_of, dist, kernel, force=True)
+        computed += 1
+    return computed
+
+
+def prefetch_etf_klines(targets: Optional[dict] = None, workers: Optional[int] = None) -> PrefetchReport:
+    """刷新全部目标 ETF 的日 K（有界并发），再预计算筹码分布。需在 app context 内调用。"""
+    started = time.monotonic()
+    config = current_app.config
+    if targets is None:
+        targets = collect_prefetch_targets(config.get('KLINE_PREFETCH_RECENT_DAYS', 7))
+    workers = workers or config.get('KLINE_PREFETCH_WORKERS', 4)
+    report = PrefetchReport(symbols=len(targets))
+    # 先清掉久未请求的增量状态，免得下面刷新 K 线时还逐个前推
+    from app.services import chip_state
+    chip_state.prune_stale(config.get('CHIP_STATE_STALE_DAYS', 30))
+    if not targets:
+        return report
+
+    app = current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=min(workers, len(targets))) as pool:
+        futures = {
+            symbol: pool.submit(_refresh, app, symbol, max(window for _, _, window, _ in params))
+            for symbol, params in targets.items()
+        }
+        for symbol, future in futures.items():
+            try:
+                if future.result():
+                    report.refreshed += 1
+                else:
+                    report.failures[symbol] = '远端无数据'
+            except Exception as e:
+                logger.warning("kline prefetch failed for %s: %s", symbol, e)
+                report.failures[symbol] = str(e)
+
+    # 远端失败的代码也用库里已有的 K 线预计算
+    from app.services import chip_snapshot
+    for symbol, params in targets.items():
+        try:
+            report.computed += _precompute(symbol, params)
+            report.snapshots += chip_snapshot.build_snapshot(symbol)
+        except Exception as e:
+            from app.extensions import db
+            db.session.rollback()
+            logger.warning("chip precompute failed for %s: %s", symbol, e)
+            report.failures.setdefault(symbol, str(e))
+    chip_snapshot.prune(config.get('CHIP_SNAPSHOT_KEEP_DAYS', 30))
+    report.elapsed = time.monotonic() - started
+    return report
@@ -0,0 +1,231 @@
+"""日 K 列存储后端.
+
+读路径统一返回 BarSeries，由配置 KLINE_STORE 选择后端：
+
+- 'sql'（默认）：直接读 etf_kline_cache 表。
+- 'mmap'：每个 symbol 一个目录，每列一个定长二进制文件（无文件头，
+  长度 = 文件大小 / 列宽），按日期升序只追加；读取时 numpy.memmap 零拷贝映射。
+  etf_kline_cache 仍是权威数据源和名称索引：K 线先写库，再同步到列文件；
+  列文件缺失或损坏时从库重建。写入按 symbol 加独占文件锁（fcntl.flock），
+  多个 worker 进程和预取任务同时同步同一 symbol 时不会重复追加或写出残缺的一天；
+  读取映射时加共享锁，不会在逐列替换的中途拿到新旧混杂的列。
+"""
+from contextlib import contextmanager
+import fcntl
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Optional
+
+import numpy as np
+
+from app.services.bar_series import BarSeries
+
+logger = logging.getLogger(__name__)
+
+# 列名 → 定长 dtype（小端）
+COLUMNS = {
+    'days': np.dtype('<i8'),
+    'open': np.dtype('<f8'),
+    'high': np.dtype('<f8'),
+    'low': np.dtype('<f8'),
+    'close': np.dtype('<f8'),
+    'volume': np.dtype('<i8'),
+    'amount': np.dtype('<f8'),
+}
+
+# 从库全量加载时的行数上限（约 40 年日 K）
+_FULL_HISTORY = 10000
+
+
+class SqlKlineStore:
+    """直接读 etf_kline_cache 表。"""
+
+    def read(self, symbol: str, days: int) -> BarSeries:
+        from app.models.etf_kline_cache import EtfKlineCache
+        return EtfKlineCache.get_series(symbol, days)
+
+    def read_many(self, symbols: list[str], days: int) -> dict:
+        from app.models.etf_kline_cache import EtfKlineCache
+        return EtfKlineCache.get_series_many(symbols, days)
+
+    def sync(self, symbol: str, bars: BarSeries) -> None:
+        """K 线已由 EtfKlineCache.bulk_upsert 入库，无需额外写入。"""
+
+
+class MmapKlineStore:
+    """每 symbol 一组只追加的定长列文件，读取走 numpy.memmap。"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, symbol: str) -> str:
+        return os.path.join(self.root, symbol)
+
+    def _path(self, symbol: str, column: str) -> str:
+        return os.path.join(self._dir(symbol), f'{column}.bin')
+
+    @contextmanager
+    def _locked(self, symbol: str):
+        """独占该 symbol 的列文件：进程内线程锁 + 跨进程文件锁。
+
+        锁文件放在 symbol 目录之外，删除 / 整体替换列文件目录时锁仍有效。
+        """
+        with self._lock, self._flocked(symbol, fcntl.LOCK_EX):
+            yield
+
+    @contextmanager
+    def _flocked(self, symbol: str, operation: int):
+        # 每次单独 open：flock 锁属于打开的文件描述，同进程的读写线程之间也互斥
+        with open(os.path.join(self.root, f'.{symbol}.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _length(self, symbol: str) -> Optional[int]:
+        """已完整写入的行数（各列取最小，忽略追加中断留下的尾巴）；无文件返回 None。"""
+        try:
+            return min(
+                os.path.getsize(self._path(symbol, col)) // dtype.itemsize
+                for col, dtype in COLUMNS.items()
+            )
+        except OSError:
+            return None
+
+    def _map(self, symbol: str) -> Optional[BarSeries]:
+        length = self._length(symbol)
+        if length is None:
+            return None
+        if length == 0:
+            return BarSeries.empty()
+        columns = {
+            col: np.memmap(self._path(symbol, col), dtype=dtype, mode='r', shape=(length,))
+            for col, dtype in COLUMNS.items()
+        }
+        return BarSeries(**columns)
+
+    def _read_mapped(self, symbol: str) -> Optional[BarSeries]:
+        """持共享锁映射列文件，等待进行中的追加 / 替换结束，保证各列同一版本。
+
+        映射建立后即可释放锁：后续替换换的是新 inode，已映射的旧文件不受影响。
+        """
+        with self._flocked(symbol, fcntl.LOCK_SH):
+            return self._map(symbol)
+
+    def read(self, symbol: str, days: int) -> BarSeries:
+        """最近 days 根，列为 memmap 切片；名称取自 etf_kline_cache。"""
+        from app.models.etf_kline_cache import EtfKlineCache
+
+        series = self._read_mapped(symbol)
+        if series is None:
+            series = self._load_from_db(symbol)
+        series = series.tail(days)
+        series.name = EtfKlineCache.get_latest_names([symbol]).get(symbol) if len(series) else None
+        return series
+
+    def read_many(self, symbols: list[str], days: int) -> dict:
+        from app.models.etf_kline_cache import EtfKlineCache
+
+        result = {}
+        for symbol in symbols:
+            series = self._read_mapped(symbol)
+            if series is None:
+                series = self._load_from_db(symbol)
+            if len(series):
+                result[symbol] = series.tail(days)
+        names = EtfKlineCache.get_latest_names(list(result))
+        for symbol, series in result.items():
+            series.name = names.get(symbol)
+        return result
+
+    def sync(self, symbol: str, bars: BarSeries) -> None:
+        """把刚入库的 K 线同步到列文件。
+
+        全部晚于已存最后一天时直接追加；回补历史或改写旧 K 线时合并后整体替换。
+        """
+        if not len(bars):
+            return
+        with self._locked(symbol):
+            try:
+                # 持锁后重新读长度与最后一天：别的进程可能刚追加过同一批 K 线
+                current = self._map(symbol)
+                if current is None:
+                    # 首次写入：库里已含本批数据，整段从库加载
+                    from app.models.etf_kline_cache import EtfKlineCache
+                    self._replace(symbol, EtfKlineCache.get_series(symbol, _FULL_HISTORY))
+                elif not len(current) or bars.days[0] > current.days[-1]:
+                    self._append(symbol, bars, len(current))
+                else:
+                    self._replace(symbol, _merge(current, bars))
+            except OSError as e:
+                # 删掉可能不完整的列文件，下次读取时从库重建
+                logger.warning("kline store sync failed for %s: %s", symbol, e)
+                shutil.rmtree(self._dir(symbol), ignore_errors=True)
+
+    def _append(self, symbol: str, bars: BarSeries, length: int) -> None:
+        for col, dtype in COLUMNS.items():
+            path = self._path(symbol, col)
+            with open(path, 'r+b') as f:
+                # 截掉上次追加中断留下的不完整尾部，保证各列等长
+                f.truncate(length * dtype.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(getattr(bars, col), dtype=dtype).tobytes())
+
+    def _replace(self, symbol: str, series: BarSeries) -> None:
+        """写到临时目录后逐列替换，需持独占锁；读取方持共享锁，看不到替换中途的状态。
+
+        已打开的 memmap 仍指向旧文件，不受影响。
+        """
+        tmp = tempfile.mkdtemp(prefix=f'.{symbol}.', dir=self.root)
+        try:
+            for col, dtype in COLUMNS.items():
+                np.ascontiguousarray(getattr(series, col), dtype=dtype).tofile(os.path.join(tmp, f'{col}.bin'))
+            os.makedirs(self._dir(symbol), exist_ok=True)
+            for col in COLUMNS:
+                os.replace(os.path.join(tmp, f'{col}.bin'), self._path(symbol, col))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _load_from_db(self, symbol: str) -> BarSeries:
+        """从 etf_kline_cache 加载全部历史并写成列文件。"""
+        from app.models.etf_kline_cache import EtfKlineCache
+
+        series = EtfKlineCache.get_series(symbol, _FULL_HISTORY)
+        if len(series):
+            try:
+                with self._locked(symbol):
+                    self._replace(symbol, series)
+            except OSError as e:
+                logger.warning("kline store write failed for %s: %s", symbol, e)
+        return series
+
+
+def _merge(current: BarSeries, bars: BarSeries) -> BarSeries:
+    """按日期合并，同一天以 bars 为准，结果升序。"""
+    keep = ~np.isin(current.days, bars.days)
+    columns = {col: np.concatenate([getattr(current, col)[keep], getattr(bars, col)]) for col in COLUMNS}
+    order = np.argsort(columns['days'], kind='stable')
+    return BarSeries(**{col: values[order] for col, values in columns.items()})
+
+
+def get_kline_store():
+    """当前应用配置的 K 线存储（每个 app 一个实例）。"""
+    from flask import current_app
+
+    store = current_app.extensions.get('kline_store')
+    if store is None:
+        backend = current_app.config.get('KLINE_STORE', 'sql')
+        if backend == 'mmap':
+            store = MmapKlineStore(current_app.config['KLINE_STORE_PATH'])
+        elif backend == 'sql':
+            store = SqlKlineStore()
+        else:
+            raise ValueError(f"未知的 K 线存储后端: {backend}")
+        current_app.extensions['kline_store'] = store
+    return store
@@ -0,0 +1,216 @@
+"""历史净值回补.
+
+按日期窗口分页拉取 F10 lsjz 历史净值，逐窗口批量写入 fund_nav_history
+（INSERT ... ON CONFLICT DO NOTHING），每个窗口单独提交。
+
+可续跑：已存储区间 [最早, 最新] 之外的部分才会请求——比最新更新的窗口
+按时间正序写入，比最早更早的窗口按时间倒序写入，中断后已存储区间
+始终连续，下次从断点继续。已存储区间内部的缺口用 full=True 补齐。
+
+抓取在线程池中并发（按 host 限速），写库由调用线程单独完成。
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+import logging
+import queue
+from typing import Callable, Optional
+
+from app.extensions import db
+from app.services import crawler
+from app.services.nav_pipeline import HostRateLimiter, build_session
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 20
+WINDOW_DAYS = 120
+DEFAULT_YEARS = 5
+
+
+@dataclass
+class BackfillResult:
+    """单只基金的回补结果。"""
+    code: str
+    pages: int = 0
+    fetched: int = 0
+    inserted: int = 0
+    error: Optional[str] = None
+
+
+def iter_lsjz_pages(fund_code, start_date, end_date, session=None, page_size=PAGE_SIZE, limiter=None, timeout=10):
+    """
+    流式产出 [start_date, end_date] 内的 lsjz 历史净值，每次一页（日期倒序）。
+    请求失败抛 RuntimeError。
+    """
+    page_index = 1
+    while True:
+        if limiter is not None:
+            limiter.wait(crawler.LSJZ_URL)
+        text = crawler.fetch_lsjz(
+            fund_code, session=session, timeout=timeout, page_index=page_index, page_size=page_size,
+            start_date=start_date.strftime('%Y-%m-%d'), end_date=end_date.strftime('%Y-%m-%d'),
+        )
+        if text is None:
+            raise RuntimeError(f"lsjz 请求失败: {fund_code} 第 {page_index} 页")
+        records, total = crawler.parse_lsjz_records(text)
+        if not records and page_index * page_size < total:
+            raise RuntimeError(f"lsjz 响应异常: {fund_code} 第 {page_index} 页")
+        yield records
+        if not records or page_index * page_size >= total:
+            return
+        page_index += 1
+
+
+def _years_before(day, years):
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:  # 2 月 29 日
+        return day.replace(year=day.year - years, day=28)
+
+
+def _windows(start, end, days, descending):
+    """把 [start, end] 切成不超过 days 天的窗口。"""
+    spans = []
+    cur = start
+    while cur <= end:
+        stop = min(cur + timedelta(days=days - 1), end)
+        spans.append((cur, stop))
+        cur = stop + timedelta(days=1)
+    return spans[::-1] if descending else spans
+
+
+def plan_windows(stored, start, end, full=False, window_days=WINDOW_DAYS):
+    """
+    stored 为已存储的 (最早, 最新) 日期或 None，返回需要拉取的窗口（按写入顺序）。
+    """
+    if full or stored is None:
+        return _windows(start, end, window_days, descending=False)
+    first, last = stored
+    spans = []
+    if last < end:
+        spans += _windows(max(start, last + timedelta(days=1)), end, window_days, descending=False)
+    if first > start:
+        spans += _windows(start, first - timedelta(days=1), window_days, descending=True)
+    return spans
+
+
+def _stored_ranges(fund_ids):
+    """{fund_id: (最早日期, 最新日期)}，单条 GROUP BY 查询。"""
+    from app.models import FundNavHistory
+
+    rows = (
+        db.session.query(FundNavHistory.fund_id, db.func.min(FundNavHistory.date), db.func.max(FundNavHistory.date))
+        .filter(FundNavHistory.fund_id.in_(fund_ids))
+        .group_by(FundNavHistory.fund_id)
+        .all()
+    )
+    return {fund_id: (lo, hi) for fund_id, lo, hi in rows}
+
+
+def save_nav_records(fund_id, records):
+    """把一批 lsjz 记录写入 fund_nav_history 并提交，返回新插入行数。"""
+    from app.models import FundNavHistory
+    from app.services.db import insert_ignore
+
+    rows = [
+        {'fund_id': fund_id, 'nav': r['nav'], 'date': datetime.strptime(r['date'], '%Y-%m-%d').date()}
+        for r in records
+    ]
+    if not rows:
+        return 0
+    # 已存在的 (fund_id, date) 由唯一索引 uq_fund_nav_history_fund_date 跳过
+    inserted = insert_ignore(FundNavHistory, rows)
+    db.session.commit()
+    return inserted
+
+
+def backfill_funds(
+    fund_codes=None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    years: int = DEFAULT_YEARS,
+    full: bool = False,
+    workers: int = 8,
+    page_size: int = PAGE_SIZE,
+    rate_limits: Optional[dict] = None,
+    session=None,
+    progress: Optional[Callable[[BackfillResult], None]] = None,
+) -> list[BackfillResult]:
+    """
+    回补多只基金的历史净值（需在 app context 内调用）。
+    fund_codes 为空时回补全部基金；start_date 缺省为 end_date 往前 years 年。
+    rate_limits 缺省取配置 NAV_CRAWL_RATE_LIMITS；progress(result) 在每只基金完成时回调。
+    """
+    from app.models import Fund
+
+    end_date = end_date or date.today()
+    start_date = start_date or _years_before(end_date, years)
+    query = Fund.query
+    if fund_codes:
+        query = query.filter(Fund.code.in_(list(fund_codes)))
+    funds = {fund.code: fund.id for fund in query.all()}
+    results = {code: BackfillResult(code) for code in (fund_codes or funds)}
+    for code in results:
+        if code not in funds:
+            results[code].error = "基金不存在"
+
+    stored = _stored_ranges(list(funds.values())) if funds else {}
+    plans = {
+        code: plan_windows(stored.get(fund_id), start_date, end_date, full=full)
+        for code, fund_id in funds.items()
+    }
+    plans = {code: spans for code, spans in plans.items() if spans}
+    for code in funds:
+        if code not in plans and progress:
+            progress(results[code])
+    if not plans:
+        return list(results.values())
+
+    if rate_limits is None:
+        from flask import current_app
+        rate_limits = current_app.config.get('NAV_CRAWL_RATE_LIMITS')
+    limiter = HostRateLimiter(rate_limits)
+    session = session or build_session(workers)
+    # 有界队列：抓取快于写库时反压，内存只保留少量窗口
+    pages = queue.Queue(maxsize=workers * 4)
+
+    def _fetch(code):
+        try:
+            for start, end in plans[code]:
+                window = []
+                for records in iter_lsjz_pages(code, start, end, session=session, page_size=page_size, limiter=limiter):
+                    window.extend(records)
+                    pages.put(('page', code, None))
+                pages.put(('window', code, window))
+        except Exception as e:
+            logger.warning("nav backfill failed: %s: %s", code, e)
+            pages.put(('done', code, str(e)))
+            return
+        pages.put(('done', code, None))
+
+    pending = len(plans)
+    with ThreadPoolExecutor(max_workers=min(workers, pending)) as pool:
+        for code in plans:
+            pool.submit(_fetch, code)
+        while pending:
+            kind, code, payload = pages.get()
+            result = results[code]
+            if kind == 'page':
+                result.pages += 1
+            elif kind == 'window':
+                if result.error:
+                    # 前一个窗口写库失败，后续窗口不写，避免已存储区间出现缺口
+                    continue
+                result.fetched += len(payload)
+                try:
+                    result.inserted += save_nav_records(funds[code], payload)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning("nav backfill write failed: %s: %s", code, e)
+                    result.error = f"写库失败: {e}"
+            else:
+                pending -= 1
+                result.error = result.error or payload
+                if progress:
+                    progress(result)
+    return list(results.values())
@@ -0,0 +1,291 @@
+"""批量净值抓取流水线.
+
+三段式：线程池并发抓取（按 host 限速）→ 解析（HTML 放进程池，JSON 就地）
+→ 单写者在一个事务里写库。数据源按 crawler.NAV_SOURCES 逐轮尝试，
+上一轮失败的基金进入下一轮；某个源在本轮中途熔断后，剩余基金直接留给下一轮。单只基金的抓取/解析/写库逻辑复用
+app.services.crawler。
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+import logging
+import multiprocessing
+import threading
+import time
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from app.services import crawler
+from app.services.http_cache import CachingAdapter
+from app.services.source_router import OPEN, SourceUnavailable, source_router
+
+logger = logging.getLogger(__name__)
+
+
+class HostRateLimiter:
+    """按 host 限制请求间隔：同一 host 两次请求至少间隔 interval 秒。
+
+    各 host 独立排队；线程在锁内预约时间槽，在锁外 sleep。
+    """
+
+    def __init__(self, intervals=None, default_interval=0.0, clock=time.monotonic, sleep=time.sleep):
+        self.intervals = dict(intervals or {})
+        self.default_interval = default_interval
+        self._clock = clock
+        self._sleep = sleep
+        self._next_slot: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        host = urlparse(url).hostname or ''
+        interval = self.intervals.get(host, self.default_interval)
+        if interval <= 0:
+            return
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + interval
+        delay = slot - now
+        if delay > 0:
+            self._sleep(delay)
+
+
+@dataclass
+class NavCrawlReport:
+    """一次批量抓取的进度与结果。"""
+    total: int = 0
+    fetched: int = 0
+    parsed: int = 0
+    updated: int = 0
+    sources: dict = field(default_factory=dict)    # code -> 数据源名称
+    failures: dict = field(default_factory=dict)   # code -> 失败原因
+    timings: dict = field(default_factory=dict)    # 阶段 -> 秒
+
+    @property
+    def success_count(self) -> int:
+        return self.updated
+
+    @property
+    def fail_count(self) -> int:
+        return len(self.failures)
+
+    def summary(self) -> str:
+        cost = ', '.join(f"{k} {v:.1f}s" for k, v in self.timings.items())
+        return f"共 {self.total} 个：成功 {self.success_count} 个，失败 {self.fail_count} 个（{cost}）"
+
+
+def build_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = CachingAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class NavCrawlPipeline:
+    """批量净值抓取。
+
+    fetch_workers: 抓取线程数；parse_workers: 解析进程数，0 表示在当前进程内解析；
+    rate_limits: {host: 最小请求间隔秒}，缺省不限速（crawl_fund_navs 传入 NAV_CRAWL_RATE_LIMITS）；
+    progress(stage, done, total) 为可选进度回调。
+    run() 需在 app context 内调用。
+    """
+
+    def __init__(
+        self,
+        fetch_workers: int = 16,
+        parse_workers: int = 0,
+        rate_limits: Optional[dict] = None,
+        progress: Optional[Callable[[str, int, int], None]] = None,
+        session: Optional[requests.Session] = None,
+        timeout: int = 20,
+    ):
+        self.fetch_workers = max(1, fetch_workers)
+        self.parse_workers = max(0, parse_workers)
+        self.limiter = HostRateLimiter(rate_limits)
+        self.progress = progress
+        self.session = session or build_session(self.fetch_workers)
+        self.timeout = timeout
+
+    def run(self, fund_codes) -> NavCrawlReport:
+        codes = list(dict.fromkeys(fund_codes))
+        report = NavCrawlReport(total=len(codes))
+        if not codes:
+            return report
+
+        profile = crawler.codes_needing_profile(codes)
+        results = {}
+        for source in crawler.available_sources(crawler.NAV_SOURCES):
+            pending = [
+                c for c in codes
+                if c not in results and source in crawler.sources_for(c, c in profile)
+            ]
+            if pending:
+                results.update(self._crawl_round(pending, report, source))
+        for code in codes:
+            if code in results:
+                report.failures.pop(code, None)
+
+        started = time.monotonic()
+        self._write(codes, results, report)
+        report.timings['write'] = time.monotonic() - started
+        return report
+
+    # ---- 抓取 ----
+
+    def _crawl_round(self, codes, report, source) -> dict:
+        started = time.monotonic()
+        pages = self._fetch_all(codes, report, source)
+        report.timings[f'fetch_{source.name}'] = time.monotonic() - started
+
+        started = time.monotonic()
+        results = self._parse_all(pages, report, source)
+        report.timings[f'parse_{source.name}'] = time.monotonic() - started
+        return results
+
+    def _fetch_one(self, code, source):
+        key = crawler.source_key(source)
+        # 熔断中直接抛 SourceUnavailable，不占限速配额也不等超时
+        if source_router.state(key) == OPEN:
+            raise SourceUnavailable(key)
+        # 限速等待放在 call 之外，不计入该源的延迟统计
+        self.limiter.wait(source.url.format(code=code))
+        return source_router.call(
+            key, source.fetch, code, session=self.session, timeout=self.timeout, accept=crawler.responded,
+        )
+
+    def _fetch_all(self, codes, report, source) -> dict:
+        pages = {}
+        with ThreadPoolExecutor(max_workers=min(self.fetch_workers, len(codes))) as pool:
+            futures = {pool.submit(self._fetch_one, code, source): code for code in codes}
+            for done, future in enumerate(as_completed(futures), 1):
+                code = futures[future]
+                try:
+                    text = future.result()
+                except SourceUnavailable:
+                    report.failures[code] = f"{source.name} 已熔断，跳过"
+                except Exception as e:
+                    logger.warning("nav fetch failed: %s %s: %s", source.name, code, e)
+                    report.failures[code] = f"{source.name} 请求失败: {e}"
+                else:
+                    if text:
+                        pages[code] = text
+                        report.fetched += 1
+                    else:
+                        report.failures[code] = f"{source.name} 响应异常"
+                self._notify(f'fetch_{source.name}', done, len(codes))
+        return pages
+
+    # ---- 解析 ----
+
+    def _parse_all(self, pages, report, source) -> dict:
+        if not pages:
+            return {}
+        results = {}
+        codes = list(pages)
+
+        def _collect(code, result, done):
+            if result:
+                result['code'] = code
+                results[code] = result
+                report.parsed += 1
+            else:
+                report.failures[code] = f"{source.name} 解析失败"
+            self._notify(f'parse_{source.name}', done, len(codes))
+
+        # JSON 解析远比进程间传输便宜，只有 HTML 数据源值得进进程池
+        if self.parse_workers == 0 or not source.cpu_bound:
+            for done, code in enumerate(codes, 1):
+                try:
+                    result = crawler.parse_page(source, pages[code])
+                except Exception as e:
+                    logger.warning("nav parse failed: %s %s: %s", source.name, code, e)
+                    result = None
+                _collect(code, result, done)
+            return results
+
+        # 内容与已解析过的页面相同的直接复用结果，只把新内容送进进程池
+        keys = {code: crawler.parse_memo.key(source, pages[code]) for code in codes}
+        done = 0
+        pending = []
+        for code in codes:
+            hit, result = crawler.parse_memo.get(keys[code])
+            if hit:
+                done += 1
+                _collect(code, result, done)
+            else:
+                pending.append(code)
+        if not pending:
+            return results
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(self.parse_workers, len(pending)), mp_context=context) as pool:
+            futures = {pool.submit(source.parse, pages[code]): code for code in pending}
+            for future in as_completed(futures):
+                code = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning("nav parse failed: %s %s: %s", source.name, code, e)
+                    result = None
+                else:
+                    crawler.parse_memo.put(keys[code], result)
+                done += 1
+                _collect(code, result, done)
+        return results
+
+    # ---- 写库 ----
+
+    def _write(self, codes, results, report) -> None:
+        """单写者：全部结果在一个事务内写入，单只基金出错只回滚其 savepoint。"""
+        from app.extensions import db
+
+        ordered = [c for c in codes if c in results]
+        try:
+            for done, code in enumerate(ordered, 1):
+                result = results[code]
+                try:
+                    with db.session.begin_nested():
+                        applied = crawler.apply_nav_result(code, result, commit=False)
+                except Exception as e:
+                    logger.warning("nav write failed: %s: %s", code, e)
+                    applied = False
+                    report.failures[code] = f"写库失败: {e}"
+                else:
+                    if not applied:
+                        report.failures[code] = f"{result['source']} 无对应基金记录"
+                if applied:
+                    report.updated += 1
+                    report.sources[code] = result['source']
+                self._notify('write', done, len(ordered))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("nav write transaction failed: %s", e)
+            for code in ordered:
+                report.failures[code] = f"写库失败: {e}"
+            report.updated = 0
+            report.sources.clear()
+
+    def _notify(self, stage, done, total):
+        if self.progress is None:
+            return
+        try:
+            self.progress(stage, done, total)
+        except Exception as e:
+            logger.warning("nav progress callback failed: %s", e)
+
+
+def crawl_fund_navs(fund_codes, progress=None) -> NavCrawlReport:
+    """按 app 配置构造流水线并批量抓取（需在 app context 内调用）。"""
+    from flask import current_app
+
+    config = current_app.config
+    pipeline = NavCrawlPipeline(
+        fetch_workers=config.get('NAV_CRAWL_FETCH_WORKERS', 16),
+        parse_workers=config.get('NAV_CRAWL_PARSE_WORKERS', 0),
+        rate_limits=config.get('NAV_CRAWL_RATE_LIMITS'),
+        progress=progress,
+    )
+    return pipeline.run(fund_codes)
@@ -1,10 +1,13 @@
-import pytesseract
-from PIL import Image
 import re
 import requests
 import io
 from app.models.fund import Fund
 from app import db
+from app.utils.lazy import lazy_import
+
+# 首次识别时才导入 OCR 依赖
+pytesseract = lazy_import('pytesseract')
+Image = lazy_import('PIL.Image')
 
 class OCRService:
     @staticmethod
@@ -2,19 +2,44 @@
 
 Mirrors etf-cli quote capabilities without CLI dependencies.
 """
-from dataclasses import dataclass
-from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from collections import OrderedDict
+from datetime import date, datetime, time as dtime, timedelta
 from typing import Optional
 import logging
+import threading
+import time
 import requests
 import json
 
+from app.services import trading_calendar
+from app.services.bar_series import BarSeries
+from app.services.http_cache import CachingAdapter
+from app.services.shared_cache import shared_cache
+from app.services.source_router import SourceRouter, source_router
+from app.utils.lazy import lazy_import
+
 EASTMONEY_QUOTE_URL = "https://push2.eastmoney.com/api/qt/stock/get"
+EASTMONEY_ULIST_URL = "https://push2.eastmoney.com/api/qt/ulist.np/get"
 EASTMONEY_KLINE_URL = "https://push2his.eastmoney.com/api/qt/stock/kline/get"
 TIANTIAN_FUND_URL = "https://fundgz.1234567.com.cn/js"
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+)
+
+# source_router 中的源名
+QUOTE_SOURCE_EASTMONEY = "quote:eastmoney"
+QUOTE_SOURCE_TIANTIAN = "quote:tiantian"
+KLINE_SOURCE_EASTMONEY = "etf_kline:eastmoney"
+KLINE_SOURCE_SINA = "etf_kline:sina"
 
 logger = logging.getLogger(__name__)
 
+# akshare 只在东财日 K 失败回退时用到，首次调用时才导入
+ak = lazy_import('akshare')
+
 
 @dataclass
 class ETFQuote:
@@ -76,91 +101,499 @@ def _prefixed_symbol(symbol: str) -> str:
     return f"{market}{bare}"
 
 
-def fetch_etf_quote(symbol: str) -> Optional[ETFQuote]:
-    """Fetch exchange-traded ETF quote from Eastmoney."""
-    secid, market, _ = _normalize_symbol(symbol)
-    params = {
-        "secid": secid,
-        "fields": "f43,f44,f45,f46,f47,f48,f57,f58,f60,f169,f170",
-    }
-    try:
-        resp = requests.get(EASTMONEY_QUOTE_URL, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json().get("data")
-        if not data:
+class QuoteClient:
+    """行情 HTTP 客户端。
+
+    共享一个带连接池的 requests.Session（keep-alive，免每次 TCP+TLS 握手），
+    并提供批量接口：ETF 走东财 ulist 多代码接口一次拉完，
+    场外估值按 max_workers 有界并发。
+    实时行情请求经 router 熔断：上游连续超时后冷却期内直接失败，不再逐个等超时。
+    """
+
+    def __init__(self, session: Optional[requests.Session] = None,
+                 pool_size: int = 16, max_workers: int = 8, timeout: float = 10,
+                 router: Optional[SourceRouter] = None):
+        self.session = session or _build_session(pool_size)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.router = router or source_router
+
+    def _get(self, url: str, params: Optional[dict] = None, source: Optional[str] = None):
+        if source is None:
+            return self.session.get(url, params=params, timeout=self.timeout)
+        # 只有连接失败 / 超时计入熔断；HTTP 错误码由调用方按业务处理
+        return self.router.call(source, self.session.get, url, params=params, timeout=self.timeout)
+
+    def fetch_etf_quote(self, symbol: str) -> Optional[ETFQuote]:
+        """Fetch exchange-traded ETF quote from Eastmoney."""
+        secid, market, _ = _normalize_symbol(symbol)
+        params = {
+            "secid": secid,
+            "fields": "f43,f44,f45,f46,f47,f48,f57,f58,f60,f169,f170",
+        }
+        try:
+            resp = self._get(EASTMONEY_QUOTE_URL, params=params, source=QUOTE_SOURCE_EASTMONEY)
+            resp.raise_for_status()
+            data = resp.json().get("data")
+            if not data:
+                return None
+
+            def price(field: str) -> float:
+                val = data.get(field)
+                return val / 1000 if val else 0.0
+
+            def pct(field: str) -> float:
+                val = data.get(field)
+                return val / 100 if val else 0.0
+
+            return ETFQuote(
+                symbol=data.get("f57", symbol),
+                name=data.get("f58", "Unknown"),
+                market=market,
+                latest=price("f43"),
+                high=price("f44"),
+                low=price("f45"),
+                open=price("f46"),
+                prev_close=price("f60"),
+                change_amount=price("f169"),
+                change_pct=pct("f170"),
+                volume=data.get("f47", 0),
+                amount=data.get("f48", 0),
+            )
+        except Exception:
             return None
 
-        def price(field: str) -> float:
-            val = data.get(field)
-            return val / 1000 if val else 0.0
-
-        def pct(field: str) -> float:
-            val = data.get(field)
-            return val / 100 if val else 0.0
-
-        return ETFQuote(
-            symbol=data.get("f57", symbol),
-            name=data.get("f58", "Unknown"),
-            market=market,
-            latest=price("f43"),
-            high=price("f44"),
-            low=price("f45"),
-            open=price("f46"),
-            prev_close=price("f60"),
-            change_amount=price("f169"),
-            change_pct=pct("f170"),
-            volume=data.get("f47", 0),
-            amount=data.get("f48", 0),
-        )
-    except Exception:
-        return None
+    def fetch_etf_quotes(self, symbols: list[str]) -> dict[str, ETFQuote]:
+        """一次 ulist 请求批量拉取多只场内 ETF 行情。
+
+        Returns: {prefixed_symbol: ETFQuote}；失败或缺失的代码不出现在结果里。
+        """
+        by_secid = {}
+        for s in symbols:
+            secid, _, _ = _normalize_symbol(s)
+            by_secid[secid] = _prefixed_symbol(s)
+        if not by_secid:
+            return {}
+        params = {
+            "secids": ",".join(by_secid),
+            "fields": "f2,f3,f4,f5,f6,f12,f13,f14,f15,f16,f17,f18",
+            "fltt": "2",      # 直接返回浮点价格
+        }
+        try:
+            resp = self._get(EASTMONEY_ULIST_URL, params=params, source=QUOTE_SOURCE_EASTMONEY)
+            resp.raise_for_status()
+            data = resp.json().get("data") or {}
+        except Exception as e:
+            logger.warning("fetch_etf_quotes failed: %s", e)
+            return {}
+
+        diff = data.get("diff") or []
+        if isinstance(diff, dict):
+            diff = list(diff.values())
+
+        def num(item: dict, field: str) -> float:
+            # fltt=2 时缺失值为 "-"
+            val = item.get(field)
+            return float(val) if isinstance(val, (int, float)) else 0.0
+
+        quotes = {}
+        for item in diff:
+            code = str(item.get("f12") or "")
+            prefixed = by_secid.get(f"{item.get('f13')}.{code}")
+            if not prefixed:
+                continue
+            quotes[prefixed] = ETFQuote(
+                symbol=code,
+                name=item.get("f14") or "Unknown",
+                market=prefixed[:2],
+                latest=num(item, "f2"),
+                high=num(item, "f15"),
+                low=num(item, "f16"),
+                open=num(item, "f17"),
+                prev_close=num(item, "f18"),
+                change_amount=num(item, "f4"),
+                change_pct=num(item, "f3"),
+                volume=int(num(item, "f5")),
+                amount=int(num(item, "f6")),
+            )
+        return quotes
+
+    def fetch_fund_estimate(self, symbol: str) -> Optional[OTCFundQuote]:
+        """Fetch OTC fund NAV and estimated NAV from Tiantian Fund."""
+        symbol = symbol.strip()
+        url = f"{TIANTIAN_FUND_URL}/{symbol}.js"
+        try:
+            resp = self._get(url, params={"rt": int(time.time() * 1000)}, source=QUOTE_SOURCE_TIANTIAN)
+            resp.raise_for_status()
+            text = resp.text.strip()
+            if not text.startswith("jsonpgz(") or not text.endswith(");"):
+                return None
+            payload = json.loads(text[len("jsonpgz("):-2])
+            return OTCFundQuote(
+                symbol=payload.get("fundcode", symbol),
+                name=payload.get("name", "Unknown"),
+                latest_nav=float(payload.get("dwjz") or 0),
+                latest_nav_date=payload.get("jzrq", ""),
+                estimated_nav=float(payload["gsz"]) if payload.get("gsz") else None,
+                estimated_change_pct=float(payload["gszzl"]) if payload.get("gszzl") else None,
+                estimate_time=payload.get("gztime") or None,
+            )
+        except Exception:
+            return None
 
+    def fetch_fund_estimates(self, symbols: list[str]) -> dict[str, OTCFundQuote]:
+        """有界并发批量拉取场外基金估值。
+
+        天天基金没有多代码接口，按 max_workers 并发复用连接池。
+        Returns: {fund_code: OTCFundQuote}；失败的代码不出现在结果里。
+        """
+        codes = list(dict.fromkeys(s.strip() for s in symbols))
+        if not codes:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(codes))) as pool:
+            results = pool.map(self.fetch_fund_estimate, codes)
+        return {code: quote for code, quote in zip(codes, results) if quote}
+
+    def fetch_klines(self, secid: str, beg: str, end: str, limit: int) -> Optional[tuple]:
+        """调用东方财富日 K 接口。
+
+        Returns: (klines_list, name) 或 None。
+        """
+        params = {
+            "secid": secid,
+            "klt": "101",     # 日 K
+            "fqt": "1",       # 前复权
+            "fields1": "f1,f2,f3,f4,f5,f6",
+            "fields2": "f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61",
+            "beg": beg,
+            "end": end,
+            "lmt": str(limit),
+        }
+        try:
+            resp = self._get(EASTMONEY_KLINE_URL, params=params)
+            resp.raise_for_status()
+            data = resp.json().get("data")
+            if not data:
+                return None
+            name = data.get("name") or None
+            return (data.get("klines") or [], name)
+        except Exception as e:
+            logger.warning("fetch_etf_daily_kline remote failed: %s", e)
+            return None
 
-def _fetch_klines_from_remote(secid: str, beg: str, end: str, limit: int) -> Optional[tuple]:
-    """调用东方财富日 K 接口。
 
-    Returns: (klines_list, name) 或 None。
+def _build_session(pool_size: int) -> requests.Session:
+    """带连接池的共享 Session：同一 host 复用 keep-alive 连接，GET 响应经 http_cache 缓存。"""
+    session = requests.Session()
+    adapter = CachingAdapter(pool_connections=8, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+
+_default_client: Optional[QuoteClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_quote_client() -> QuoteClient:
+    """进程内共享的默认 QuoteClient（首次调用时创建）。"""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = QuoteClient()
+    return _default_client
+
+
+# A 股连续竞价时段（含 9:15 集合竞价起）
+_MORNING_OPEN = dtime(9, 15)
+_MORNING_CLOSE = dtime(11, 30)
+_AFTERNOON_OPEN = dtime(13, 0)
+_AFTERNOON_CLOSE = dtime(15, 0)
+# 收盘后行情源发布收盘集合竞价成交价前的过渡期，期间仍按盘中 TTL 缓存
+_CLOSE_SETTLE_END = dtime(15, 5)
+
+
+def _next_session_open(now: datetime) -> datetime:
+    """now 之后最近一次开盘（9:15 或午后 13:00）时刻。"""
+    calendar = trading_calendar.get_calendar()
+    if calendar.is_trading_day(now):
+        if now.time() < _MORNING_OPEN:
+            return datetime.combine(now.date(), _MORNING_OPEN)
+        if _MORNING_CLOSE <= now.time() < _AFTERNOON_OPEN:
+            return datetime.combine(now.date(), _AFTERNOON_OPEN)
+    return datetime.combine(calendar.next_trading_day(now), _MORNING_OPEN)
+
+
+def market_ttl(now: Optional[datetime] = None, intraday: float = 3.0,
+               max_ttl: Optional[float] = None) -> float:
+    """按交易时段给出行情缓存秒数。
+
+    盘中及 15:00 收盘后的几分钟过渡期（收盘价尚未发布）为 intraday 秒；午休、
+    收盘后、休市日缓存到下一次开盘（收盘价不再变）。
+    max_ttl 用于收盘后仍会变化的数据（如晚间公布的场外净值）。
     """
-    params = {
-        "secid": secid,
-        "klt": "101",     # 日 K
-        "fqt": "1",       # 前复权
-        "fields1": "f1,f2,f3,f4,f5,f6",
-        "fields2": "f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61",
-        "beg": beg,
-        "end": end,
-        "lmt": str(limit),
-    }
-    try:
-        resp = requests.get(EASTMONEY_KLINE_URL, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json().get("data")
-        if not data:
+    now = now or datetime.now()
+    t = now.time()
+    trading = trading_calendar.is_trading_day(now) and (
+        _MORNING_OPEN <= t < _MORNING_CLOSE or _AFTERNOON_OPEN <= t < _CLOSE_SETTLE_END
+    )
+    if trading:
+        ttl = intraday
+    else:
+        ttl = max((_next_session_open(now) - now).total_seconds(), intraday)
+    return min(ttl, max_ttl) if max_ttl is not None else ttl
+
+
+class _Flight:
+    """single-flight 占位：首个请求负责加载，其余并发请求等结果。"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+
+
+class QuoteCache:
+    """进程内行情缓存：TTL + LRU 淘汰 + single-flight。
+
+    同一 key 的并发未命中只打一次上游，其余线程等待共享结果；
+    None（上游失败）不缓存，下次请求重新拉取。
+    """
+
+    def __init__(self, max_entries: int = 1024, clock=time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._data: OrderedDict = OrderedDict()    # key -> (expires_at, value)
+        self._inflight: dict = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0    # 等待他人 in-flight 请求的次数
+
+    def get(self, key):
+        """命中且未过期返回值，否则 None（计入 hits / misses）。"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key, value, ttl: float) -> None:
+        if value is None:
+            return
+        with self._lock:
+            self._data[key] = (self._clock() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader, ttl: Optional[float] = None):
+        """命中直接返回；未命中时同 key 只有一个线程执行 loader。
+
+        ttl 为 None 时 loader 返回 (value, ttl)，由 loader 决定缓存时长。
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            return flight.value
+
+        try:
+            if ttl is None:
+                flight.value, ttl = loader()
+            else:
+                flight.value = loader()
+            self.put(key, flight.value, ttl)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+        return flight.value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.coalesced = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+    def _lookup(self, key):
+        entry = self._data.get(key)
+        if entry is None:
             return None
-        name = data.get("name") or None
-        return (data.get("klines") or [], name)
-    except Exception as e:
-        logger.warning("fetch_etf_daily_kline remote failed: %s", e)
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+
+quote_cache = QuoteCache()
+
+# 场外估值：盘中约 1 分钟更新一次；收盘后净值晚间才公布，最多缓存 10 分钟
+FUND_ESTIMATE_INTRADAY_TTL = 60.0
+FUND_ESTIMATE_MAX_TTL = 600.0
+# ETF 名称很少变化：进程内缓存 1 小时，跨 worker 共享缓存 7 天
+ETF_NAME_LOCAL_TTL = 3600.0
+ETF_NAME_SHARED_TTL = 7 * 86400.0
+
+# 第二层：同机 worker 共享的 SQLite 缓存，值存 dataclass 的字段 dict
+_QUOTE_TYPES = {'etf': ETFQuote, 'fund': OTCFundQuote}
+
+
+def _shared_key(kind: str, code: str) -> str:
+    return f"{kind}:{code}"
+
+
+def _decode_quote(kind: str, value: dict):
+    try:
+        return _QUOTE_TYPES[kind](**value)
+    except TypeError:
+        # 字段变化后的旧条目，按未命中处理
         return None
 
 
-# 模块级 name 缓存（symbol -> name），避免实时行情接口失败时丢失名称
-_etf_name_cache: dict[str, str] = {}
+def _load_quote(kind: str, code: str, fetch, ttl: float):
+    """先查共享缓存，未命中再拉上游并写回；返回 (quote, 进程内缓存时长)。"""
+    entry = shared_cache.get_entry(_shared_key(kind, code))
+    if entry is not None:
+        quote = _decode_quote(kind, entry[0])
+        if quote is not None:
+            return quote, min(entry[1], ttl)
+    quote = fetch()
+    if quote is not None:
+        shared_cache.set(_shared_key(kind, code), asdict(quote), ttl)
+    return quote, ttl
+
+
+def _load_quotes(kind: str, codes: list[str], fetch_many, ttl: float) -> dict:
+    """批量版 _load_quote：共享缓存命中的直接用，其余一次交给 fetch_many，结果写入两层缓存。"""
+    quotes = {}
+    entries = shared_cache.get_entries(_shared_key(kind, c) for c in codes)
+    missing = []
+    for code in codes:
+        entry = entries.get(_shared_key(kind, code))
+        quote = _decode_quote(kind, entry[0]) if entry else None
+        if quote is None:
+            missing.append(code)
+            continue
+        quote_cache.put((kind, code), quote, min(entry[1], ttl))
+        quotes[code] = quote
+    if missing:
+        fetched = fetch_many(missing)
+        for code, quote in fetched.items():
+            quote_cache.put((kind, code), quote, ttl)
+            quotes[code] = quote
+        shared_cache.set_many({_shared_key(kind, c): asdict(q) for c, q in fetched.items()}, ttl)
+    return quotes
+
+
+def fetch_etf_quote(symbol: str) -> Optional[ETFQuote]:
+    """Fetch exchange-traded ETF quote from Eastmoney (cached)."""
+    prefixed = _prefixed_symbol(symbol)
+    return quote_cache.get_or_load(
+        ('etf', prefixed),
+        lambda: _load_quote('etf', prefixed, lambda: get_quote_client().fetch_etf_quote(symbol), market_ttl()),
+    )
+
+
+def fetch_etf_quotes(symbols: list[str]) -> dict[str, ETFQuote]:
+    """批量场内 ETF 行情（cached），两层缓存都未命中的代码合并为一次 ulist 请求。"""
+    quotes = {}
+    missing = []
+    for s in symbols:
+        prefixed = _prefixed_symbol(s)
+        cached = quote_cache.get(('etf', prefixed))
+        if cached is None:
+            missing.append(prefixed)
+        else:
+            quotes[prefixed] = cached
+    if missing:
+        quotes.update(_load_quotes('etf', missing, get_quote_client().fetch_etf_quotes, market_ttl()))
+    return quotes
+
+
+def fetch_fund_estimate(symbol: str) -> Optional[OTCFundQuote]:
+    """Fetch OTC fund NAV and estimated NAV from Tiantian Fund (cached)."""
+    code = symbol.strip()
+    ttl = market_ttl(intraday=FUND_ESTIMATE_INTRADAY_TTL, max_ttl=FUND_ESTIMATE_MAX_TTL)
+    return quote_cache.get_or_load(
+        ('fund', code),
+        lambda: _load_quote('fund', code, lambda: get_quote_client().fetch_fund_estimate(code), ttl),
+    )
+
+
+def fetch_fund_estimates(symbols: list[str]) -> dict[str, OTCFundQuote]:
+    """批量场外基金估值（cached），两层缓存都未命中的代码交给 QuoteClient 有界并发拉取。"""
+    quotes = {}
+    missing = []
+    for s in symbols:
+        code = s.strip()
+        cached = quote_cache.get(('fund', code))
+        if cached is None:
+            missing.append(code)
+        else:
+            quotes[code] = cached
+    if missing:
+        ttl = market_ttl(intraday=FUND_ESTIMATE_INTRADAY_TTL, max_ttl=FUND_ESTIMATE_MAX_TTL)
+        quotes.update(_load_quotes('fund', missing, get_quote_client().fetch_fund_estimates, ttl))
+    return quotes
+
+
+def _fetch_klines_from_remote(secid: str, beg: str, end: str, limit: int) -> Optional[tuple]:
+    """东财日 K 接口，见 QuoteClient.fetch_klines。"""
+    return get_quote_client().fetch_klines(secid, beg, end, limit)
+
+
+def remember_etf_name(prefixed: str, name: str) -> None:
+    """写入 ETF 名称（进程内 + 共享缓存）。"""
+    quote_cache.put(('name', prefixed), name, ETF_NAME_LOCAL_TTL)
+    shared_cache.set(_shared_key('name', prefixed), name, ETF_NAME_SHARED_TTL)
 
 
 def get_cached_etf_name(symbol: str) -> Optional[str]:
     """返回已缓存的 ETF 名称。
 
-    优先内存缓存；其次查 DB 里 K 线表 name 列；都没有返回 None。
+    依次查进程内缓存、跨 worker 共享缓存、DB 里 K 线表 name 列；都没有返回 None。
     """
     prefixed = _prefixed_symbol(symbol)
-    if prefixed in _etf_name_cache:
-        return _etf_name_cache[prefixed]
+    name = quote_cache.get(('name', prefixed))
+    if name is not None:
+        return name
+    entry = shared_cache.get_entry(_shared_key('name', prefixed))
+    if entry is not None:
+        quote_cache.put(('name', prefixed), entry[0], min(entry[1], ETF_NAME_LOCAL_TTL))
+        return entry[0]
     try:
         from app.models.etf_kline_cache import EtfKlineCache
         db_name = EtfKlineCache.get_latest_name(prefixed)
         if db_name:
-            _etf_name_cache[prefixed] = db_name
+            remember_etf_name(prefixed, db_name)
             return db_name
     except Exception:
         pass
@@ -190,76 +623,116 @@ def _parse_kline_line(line: str) -> Optional[tuple]:
         return None
 
 
-def fetch_etf_daily_kline(symbol: str, days: int = 250) -> list[ETFDailyBar]:
-    """拉取场内 ETF 历史 K 线（日 K，前复权），带 DB 缓存。
+def _advance_chip_states(prefixed: str, inserted_dates: list[date]) -> None:
+    """新 K 线入库后推进该 symbol 的筹码增量状态；失败只记日志。"""
+    try:
+        from app.services.chip_state import advance_states
+        advance_states(prefixed, inserted_dates)
+    except Exception as e:
+        from app.extensions import db
+        db.session.rollback()
+        logger.warning("advance chip state failed for %s: %s", prefixed, e)
 
-    流程：
-    1. 查 DB 该 symbol 最新日期
-    2. 若最新日期 == 今天/最近交易日 → 直接返回 DB 中最近 days 条
-    3. 否则调远端拉增量，写 DB
-    4. 远端失败 → 回退用 DB 中已有数据
 
-    Returns: ETFDailyBar 列表，按日期升序。空数据返回 []。
+def _ingest_bars(prefixed: str, rows: list[dict], name: Optional[str] = None) -> list[date]:
+    """批量 upsert 一批 K 线并提交，同步到 K 线存储后再推进筹码状态；返回新增或改写的日期。"""
+    from app.extensions import db
+    from app.models.etf_kline_cache import EtfKlineCache
+    from app.services.kline_store import get_kline_store
+
+    changed = EtfKlineCache.bulk_upsert(prefixed, rows, name=name)
+    if changed:
+        db.session.commit()
+        by_date = {r['date']: r for r in rows}
+        get_kline_store().sync(prefixed, BarSeries.from_rows(
+            (d, *(by_date[d][f] for f in EtfKlineCache._BAR_FIELDS)) for d in changed
+        ))
+        _advance_chip_states(prefixed, changed)
+    return changed
+
+
+def latest_kline_date(now: Optional[datetime] = None) -> date:
+    """最近一根已收盘日 K 的日期：交易日 15:00 后为当天，否则为上一交易日。"""
+    now = now or datetime.now()
+    if trading_calendar.is_trading_day(now) and now.time() >= _AFTERNOON_CLOSE:
+        return now.date()
+    return trading_calendar.prev_trading_day(now.date())
+
+
+def kline_is_fresh(latest_cached: Optional[date], now: Optional[datetime] = None) -> bool:
+    """缓存最新日期已到最近收盘日即无需再拉远端。"""
+    return latest_cached is not None and latest_cached >= latest_kline_date(now)
+
+
+class KlineRefresher:
+    """日 K 后台增量刷新：有界线程池，同一 symbol 同时只排一个刷新任务。"""
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: dict = {}    # prefixed -> Future
+        self._lock = threading.Lock()
+
+    def submit(self, symbol: str, days: int = 250):
+        """排入后台刷新（需在 app context 内调用）；已在排队的 symbol 返回已有的 Future。"""
+        from flask import current_app
+
+        prefixed = _prefixed_symbol(symbol)
+        app = current_app._get_current_object()
+        with self._lock:
+            future = self._pending.get(prefixed)
+            if future is not None:
+                return future
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='kline-refresh')
+            future = self._pending[prefixed] = self._executor.submit(self._run, app, prefixed, days)
+        return future
+
+    def is_pending(self, symbol: str) -> bool:
+        with self._lock:
+            return _prefixed_symbol(symbol) in self._pending
+
+    def _run(self, app, prefixed: str, days: int) -> bool:
+        try:
+            with app.app_context():
+                return refresh_etf_daily_kline(prefixed, days)
+        except Exception as e:
+            logger.warning("background kline refresh failed for %s: %s", prefixed, e)
+            return False
+        finally:
+            with self._lock:
+                self._pending.pop(prefixed, None)
+
+
+kline_refresher = KlineRefresher()
+
+
+def refresh_etf_daily_kline(symbol: str, days: int = 250) -> bool:
+    """同步拉取增量日 K 并入库。
+
+    东财与 akshare 新浪源经 source_router 按健康度排序依次尝试，熔断中的源直接跳过。
+    只拉到最近收盘日为止（不写入盘中未收盘的 K 线）。
+    Returns: 是否有远端源成功返回数据。
     """
     from app.models.etf_kline_cache import EtfKlineCache
 
     secid, _, _ = _normalize_symbol(symbol)
     prefixed = _prefixed_symbol(symbol)
-    today = date.today()
-
     latest_cached = EtfKlineCache.get_latest_date(prefixed)
+    last_close = latest_kline_date()
 
-    # 缓存命中且为今天：直接返回 DB
-    if latest_cached is not None and latest_cached >= today:
-        rows = EtfKlineCache.get_recent(prefixed, days)
-        return [
-            ETFDailyBar(
-                date=r.date.strftime('%Y-%m-%d'),
-                open=r.open, high=r.high, low=r.low, close=r.close,
-                volume=r.volume or 0, amount=r.amount or 0.0,
-            )
-            for r in rows
-        ]
-
-    # 需要拉增量
     beg = (latest_cached + timedelta(days=1)).strftime("%Y%m%d") if latest_cached else "19900101"
-    end = today.strftime("%Y%m%d")
+    end = last_close.strftime("%Y%m%d")
     # 拉取数量：始终拉 days 条上限，保证 DB 里至少有这么多
     limit = max(days, 30)
 
-    remote_result = _fetch_klines_from_remote(secid, beg, end, limit)
-    klines = remote_result[0] if remote_result else None
-    remote_name = remote_result[1] if remote_result else None
-    if remote_name:
-        _etf_name_cache[prefixed] = remote_name
-
-    if klines is None:
-        # 东财失败 → fallback akshare 新浪源
-        try:
-            ak_bars = fetch_etf_daily_kline_akshare(symbol, days=days)
-            if ak_bars:
-                from app.extensions import db
-                new_rows = []
-                for b in ak_bars:
-                    d = datetime.strptime(b.date, "%Y-%m-%d").date()
-                    exists = EtfKlineCache.query.filter_by(symbol=prefixed, date=d).first()
-                    if exists:
-                        continue
-                    new_rows.append(EtfKlineCache(
-                        symbol=prefixed, date=d,
-                        open=b.open, high=b.high, low=b.low, close=b.close,
-                        volume=b.volume, amount=b.amount,
-                    ))
-                if new_rows:
-                    db.session.bulk_save_objects(new_rows)
-                    db.session.commit()
-                logger.info("kline fallback to akshare sina: %s (%d bars)", prefixed, len(ak_bars))
-        except Exception as e:
-            logger.warning("akshare fallback failed for %s: %s", prefixed, e)
-
-    if klines is not None:
-        # 写入 DB
-        new_rows = []
+    def from_eastmoney():
+        remote_result = _fetch_klines_from_remote(secid, beg, end, limit)
+        if remote_result is None:
+            return None
+        klines, remote_name = remote_result
+        rows = []
         for line in klines:
             parsed = _parse_kline_line(line)
             if not parsed:
@@ -269,89 +742,146 @@ def fetch_etf_daily_kline(symbol: str, days: int = 250) -> list[ETFDailyBar]:
                 d = datetime.strptime(d_str, "%Y-%m-%d").date()
             except ValueError:
                 continue
-            exists = EtfKlineCache.query.filter_by(symbol=prefixed, date=d).first()
-            if exists:
-                continue
-            new_rows.append(EtfKlineCache(
-                symbol=prefixed, date=d,
-                open=o, high=hi, low=lo, close=c,
-                volume=vol, amount=amt,
-                name=remote_name,
-            ))
-        if new_rows:
-            from app.extensions import db
-            db.session.bulk_save_objects(new_rows)
-            db.session.commit()
-    elif EtfKlineCache.get_latest_date(prefixed) is None:
-        # 东财 + akshare 都失败，且 DB 无数据
-        return []
+            rows.append({'date': d, 'open': o, 'high': hi, 'low': lo, 'close': c, 'volume': vol, 'amount': amt})
+        return rows, remote_name
+
+    def from_sina():
+        # 只取缓存之后、最近收盘日及以前的部分
+        series = fetch_etf_daily_kline_akshare(symbol, days=days, since=latest_cached, until=last_close)
+        return series.to_rows(), None
+
+    source, result = source_router.first([
+        (KLINE_SOURCE_EASTMONEY, from_eastmoney),
+        (KLINE_SOURCE_SINA, from_sina),
+    ])
+    if result is None:
+        logger.warning("all kline sources failed for %s", prefixed)
+        return False
+    rows, remote_name = result
+    if remote_name:
+        remember_etf_name(prefixed, remote_name)
+    _ingest_bars(prefixed, rows, name=remote_name)
+    if source != KLINE_SOURCE_EASTMONEY:
+        logger.info("kline from %s: %s (%d bars)", source, prefixed, len(rows))
+    return True
+
+
+def fetch_etf_daily_kline(symbol: str, days: int = 250, serve_stale: Optional[bool] = None) -> BarSeries:
+    """拉取场内 ETF 历史 K 线（日 K，前复权），带 DB 缓存。
+
+    流程：
+    1. 查 DB 该 symbol 最新日期
+    2. 已到最近收盘日 → 直接返回 DB 中最近 days 条
+    3. 否则拉远端增量写 DB（东财失败回退 akshare），远端都失败时用 DB 中已有数据
+    4. serve_stale 模式下（默认取配置 KLINE_SERVE_STALE）有缓存就立即返回旧数据，
+       增量刷新交给 kline_refresher 后台执行；无缓存时仍同步拉取
+
+    Returns: 列式 BarSeries（经 KLINE_STORE 配置的存储读取），按日期升序。无数据返回空序列。
+    """
+    from flask import current_app
+    from app.models.etf_kline_cache import EtfKlineCache
+    from app.services.kline_store import get_kline_store
+
+    prefixed = _prefixed_symbol(symbol)
+    latest_cached = EtfKlineCache.get_latest_date(prefixed)
+    if not kline_is_fresh(latest_cached):
+        if serve_stale is None:
+            serve_stale = current_app.config.get('KLINE_SERVE_STALE', False)
+        if serve_stale and latest_cached is not None:
+            kline_refresher.submit(prefixed, days)
+        else:
+            refresh_etf_daily_kline(prefixed, days)
 
     # 返回 DB 中最近 days 条
-    rows = EtfKlineCache.get_recent(prefixed, days)
-    return [
-        ETFDailyBar(
-            date=r.date.strftime('%Y-%m-%d'),
-            open=r.open, high=r.high, low=r.low, close=r.close,
-            volume=r.volume or 0, amount=r.amount or 0.0,
-        )
-        for r in rows
-    ]
+    return get_kline_store().read(prefixed, days)
+
+
+def refresh_stale_klines(symbols: list[str], days: int = 250, latest: Optional[dict] = None,
+                         serve_stale: Optional[bool] = None, max_workers: int = 8) -> None:
+    """批量版 fetch_etf_daily_kline 的刷新部分：只刷新缓存落后的代码，不读 K 线。
+
+    latest 为 {prefixed: 库中最新日期}，缺省时一次 IN 查询取得。serve_stale 同
+    fetch_etf_daily_kline：有缓存的交给 kline_refresher 后台刷新；其余在线程池里
+    并发同步拉取，全部完成后返回（需在 app context 内调用）。
+    """
+    from flask import current_app
+    from app.models.etf_kline_cache import EtfKlineCache
+
+    if latest is None:
+        latest = EtfKlineCache.get_latest_dates(symbols)
+    if serve_stale is None:
+        serve_stale = current_app.config.get('KLINE_SERVE_STALE', False)
+    blocking = []
+    for prefixed in symbols:
+        cached = latest.get(prefixed)
+        if kline_is_fresh(cached):
+            continue
+        if serve_stale and cached is not None:
+            kline_refresher.submit(prefixed, days)
+        else:
+            blocking.append(prefixed)
+    if not blocking:
+        return
+
+    app = current_app._get_current_object()
+
+    def _refresh(prefixed):
+        with app.app_context():
+            return refresh_etf_daily_kline(prefixed, days)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(blocking))) as pool:
+        for prefixed, future in zip(blocking, [pool.submit(_refresh, s) for s in blocking]):
+            try:
+                future.result()
+            except Exception as e:
+                logger.warning("kline refresh failed for %s: %s", prefixed, e)
 
 
-def fetch_etf_daily_kline_akshare(symbol: str, days: int = 250) -> list[ETFDailyBar]:
+def fetch_etf_daily_kline_akshare(symbol: str, days: int = 250, since: Optional[date] = None,
+                                  until: Optional[date] = None) -> BarSeries:
     """用 akshare 新浪源拉取场内 ETF 历史 K 线（前复权）。
 
-    作为东方财富源的备用数据源。失败抛异常（由调用方处理）。
+    作为东方财富源的备用数据源。新浪接口只能整段下载全部历史，
+    先按日期截取最近 days 根（且晚于 since、不晚于 until），再整列转换。
+    失败抛异常（由调用方处理）。
 
-    Returns: ETFDailyBar 列表，按日期升序。
+    Returns: 列式 BarSeries，按日期升序。
     """
-    import akshare as ak
-
     prefixed = _prefixed_symbol(symbol)
     # 新浪格式：sh562500 / sz159915
     sina_symbol = prefixed.lower()
     df = ak.fund_etf_hist_sina(symbol=sina_symbol)
     if df is None or df.empty:
         raise RuntimeError(f"akshare 新浪源无数据: {sina_symbol}")
+    return _sina_frame_to_series(df, days, since, until)
 
-    bars = []
-    for _, row in df.iterrows():
-        bars.append(ETFDailyBar(
-            date=str(row['date']),
-            open=float(row['open']),
-            high=float(row['high']),
-            low=float(row['low']),
-            close=float(row['close']),
-            volume=int(row['volume']) if row['volume'] else 0,
-            amount=float(row['amount']) if row['amount'] else 0.0,
-        ))
-    bars.sort(key=lambda b: b.date)
-    return bars[-days:]
 
+def _sina_frame_to_series(df, days: int, since: Optional[date] = None,
+                          until: Optional[date] = None) -> BarSeries:
+    """新浪日 K DataFrame（date/open/high/low/close/volume/amount 列）→ BarSeries。"""
+    import numpy as np
 
-def fetch_fund_estimate(symbol: str) -> Optional[OTCFundQuote]:
-    """Fetch OTC fund NAV and estimated NAV from Tiantian Fund."""
-    symbol = symbol.strip()
-    url = f"{TIANTIAN_FUND_URL}/{symbol}.js"
-    try:
-        import time
-        resp = requests.get(url, params={"rt": int(time.time() * 1000)}, timeout=10)
-        resp.raise_for_status()
-        text = resp.text.strip()
-        if not text.startswith("jsonpgz(") or not text.endswith(");"):
-            return None
-        payload = json.loads(text[len("jsonpgz("):-2])
-        return OTCFundQuote(
-            symbol=payload.get("fundcode", symbol),
-            name=payload.get("name", "Unknown"),
-            latest_nav=float(payload.get("dwjz") or 0),
-            latest_nav_date=payload.get("jzrq", ""),
-            estimated_nav=float(payload["gsz"]) if payload.get("gsz") else None,
-            estimated_change_pct=float(payload["gszzl"]) if payload.get("gszzl") else None,
-            estimate_time=payload.get("gztime") or None,
-        )
-    except Exception:
-        return None
+    day_values = np.asarray(df['date'].to_numpy(), dtype='datetime64[D]')
+    keep = np.argsort(day_values, kind='stable')
+    if until is not None:
+        keep = keep[day_values[keep] <= np.datetime64(until, 'D')]
+    keep = keep[-days:] if days > 0 else keep[:0]
+    if since is not None:
+        keep = keep[day_values[keep] > np.datetime64(since, 'D')]
+    if not len(keep):
+        return BarSeries.empty()
+
+    frame = df.iloc[keep]
+
+    def column(name):
+        return np.asarray(frame[name].to_numpy(), dtype=np.float64)
+
+    return BarSeries(
+        days=day_values[keep].astype(np.int64),
+        open=column('open'), high=column('high'), low=column('low'), close=column('close'),
+        volume=np.nan_to_num(column('volume')).astype(np.int64),
+        amount=np.nan_to_num(column('amount')),
+    )
 
 
 def build_pair_context(name: str, etf_symbol: str, fund_symbol: str) -> Optional[str]:
@@ -360,6 +890,29 @@ def build_pair_context(name: str, etf_symbol: str, fund_symbol: str) -> Optional
     fund = fetch_fund_estimate(fund_symbol)
     if not etf or not fund:
         return None
+    return _format_pair_context(name, etf, fund)
+
+
+def build_pair_contexts(pairs: list[tuple[str, str, str]]) -> list[str]:
+    """批量版 build_pair_context：ETF 一次 ulist 拉完，场外估值有界并发（均走行情缓存）。
+
+    pairs: [(name, etf_symbol, fund_symbol), ...]；任一报价缺失的 pair 跳过。
+    """
+    if not pairs:
+        return []
+    etfs = fetch_etf_quotes([etf for _, etf, _ in pairs])
+    funds = fetch_fund_estimates([fund for _, _, fund in pairs])
+    contexts = []
+    for name, etf_symbol, fund_symbol in pairs:
+        etf = etfs.get(_prefixed_symbol(etf_symbol))
+        fund = funds.get(fund_symbol.strip())
+        if etf and fund:
+            contexts.append(_format_pair_context(name, etf, fund))
+    return contexts
+
+
+def _format_pair_context(name: str, etf: ETFQuote, fund: OTCFundQuote) -> str:
+    """pair 报价 → AI 上下文文本。"""
     lines = [
         f"== 实时行情参考: {name} ==",
         f"场内 ETF 参考: {etf.name} ({etf.symbol})",
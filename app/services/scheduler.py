@@ -1,7 +1,15 @@
-"""定时任务：批量更新所有基金净值"""
+"""定时任务：批量更新所有基金净值、收盘后预取场内 ETF 日 K"""
 import threading
 import time
 import schedule
+from datetime import date, timedelta
+
+from app.services.trading_calendar import is_trading_day
+
+
+def should_crawl_today(today):
+    """交易日 T 的净值在 T 日晚间公布，T 或 T+1 自然日抓取有意义；其余休市日跳过。"""
+    return is_trading_day(today) or is_trading_day(today - timedelta(days=1))
 
 
 def batch_update_all_funds(app):
@@ -9,25 +17,27 @@ def batch_update_all_funds(app):
     with app.app_context():
         try:
             from app.models import Fund
-            from app.services.crawler import update_fund_nav
+            from app.services.nav_pipeline import crawl_fund_navs
+
+            if not should_crawl_today(date.today()):
+                print("[定时任务] 今日及前一日均非交易日，无新净值，跳过")
+                return
 
             print("[定时任务] 开始批量更新所有基金净值")
             funds = Fund.query.all()
             print(f"[定时任务] 共有 {len(funds)} 个基金需要更新")
+            names = {fund.code: fund.name for fund in funds}
 
-            success_count = 0
-            fail_count = 0
-            fail_funds = []
+            def _progress(stage, done, total):
+                if done == total or done % 50 == 0:
+                    print(f"[定时任务] {stage}: {done}/{total}")
 
-            for fund in funds:
-                print(f"[定时任务] 开始更新基金：{fund.code} - {fund.name}")
-                if update_fund_nav(fund.code):
-                    success_count += 1
-                    print(f"[定时任务] 基金 {fund.code} - {fund.name} 更新成功")
-                else:
-                    fail_count += 1
-                    fail_funds.append(f"{fund.code} - {fund.name}")
-                    print(f"[定时任务] 基金 {fund.code} - {fund.name} 更新失败")
+            report = crawl_fund_navs(list(names), progress=_progress)
+            success_count = report.success_count
+            fail_count = report.fail_count
+            fail_funds = [f"{code} - {names.get(code)}" for code in report.failures]
+            for code, reason in report.failures.items():
+                print(f"[定时任务] 基金 {code} - {names.get(code)} 更新失败：{reason}")
 
             msg = f'[定时任务] 批量更新完成：成功 {success_count} 个，失败 {fail_count} 个'
             if fail_funds:
@@ -35,6 +45,7 @@ def batch_update_all_funds(app):
                 ellipsis = '...' if len(fail_funds) > 5 else ''
                 msg += f"\n失败的基金：{preview}{ellipsis}"
             print(msg)
+            print(f"[定时任务] {report.summary()}")
 
         except Exception as e:
             print(f"[定时任务] 批量更新时发生错误：{str(e)}")
@@ -42,10 +53,32 @@ def batch_update_all_funds(app):
             traceback.print_exc()
 
 
+def prefetch_etf_klines(app):
+    """收盘后预取持仓 / 配置 / 近期查看过的场内 ETF 日 K，并预计算筹码分布"""
+    with app.app_context():
+        try:
+            from app.services.kline_prefetch import prefetch_etf_klines as _prefetch
+
+            if not is_trading_day(date.today()):
+                print("[定时任务] 今日非交易日，无新 K 线，跳过 ETF 日 K 预取")
+                return
+
+            report = _prefetch()
+            for symbol, reason in report.failures.items():
+                print(f"[定时任务] ETF {symbol} 日 K 预取失败：{reason}")
+            print(f"[定时任务] {report.summary()}")
+
+        except Exception as e:
+            print(f"[定时任务] 预取 ETF 日 K 时发生错误：{str(e)}")
+            import traceback
+            traceback.print_exc()
+
+
 def start_scheduler(app):
-    """启动定时任务线程（每天 15:30 执行）"""
+    """启动定时任务线程（每天 15:30 更新净值，KLINE_PREFETCH_TIME 预取 ETF 日 K）"""
     print("[定时任务] 启动基金净值自动更新调度器")
     schedule.every().day.at("15:30").do(batch_update_all_funds, app)
+    schedule.every().day.at(app.config.get('KLINE_PREFETCH_TIME', '15:10')).do(prefetch_etf_klines, app)
 
     def _run():
         while True:
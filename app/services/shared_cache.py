@@ -0,0 +1,162 @@
+"""同机多 worker 共享的键值缓存（SQLite）.
+
+gunicorn 多 worker 各自的进程内缓存互不可见，同一行情要向上游拉 N 次。
+SharedCache 把 ETF 名称、实时行情、场外估值放进一个本地 SQLite 文件（WAL 模式，
+多进程并发读、串行写），带 TTL 和条目上限；进程内 QuoteCache 仍是第一层。
+
+值须可 JSON 序列化。缓存只是加速层：SQLite 出错（锁等待超时、磁盘满等）
+只记日志并按未命中处理，不影响请求。path 为空时整个缓存禁用。
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+
+from app.services.db import SQLITE_MAX_VARIABLES
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS shared_cache ("
+    " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+)
+# 每写入这么多次检查一次条目数
+_EVICT_CHECK_EVERY = 64
+
+
+class SharedCache:
+    """SQLite 键值缓存：TTL + 条目上限（超限时先淘汰最早过期的条目）."""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 50000,
+                 busy_timeout: float = 0.2, clock=time.time):
+        self._clock = clock
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.configure(path, max_entries, busy_timeout)
+
+    def configure(self, path: Optional[str], max_entries: int = 50000, busy_timeout: float = 0.2) -> None:
+        """切换缓存文件（create_app 时调用）；path 为空表示禁用。"""
+        self.path = path or None
+        self.max_entries = max_entries
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _conn(self) -> sqlite3.Connection:
+        """每个线程一个连接；fork 出的子进程不复用父进程的连接。"""
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        if conn is None or local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            local.conn, local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str):
+        """命中返回值，未命中 / 已过期 / 出错返回 None。"""
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str) -> Optional[tuple]:
+        """命中返回 (value, 剩余秒数)，否则 None。"""
+        return self.get_entries([key]).get(key)
+
+    def get_entries(self, keys: Iterable[str]) -> dict:
+        """批量读取：{key: (value, 剩余秒数)}，只含命中的 key。"""
+        keys = list(dict.fromkeys(keys))
+        if not self.enabled or not keys:
+            return {}
+        now = self._clock()
+        result = {}
+        try:
+            conn = self._conn()
+            for i in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                chunk = keys[i:i + SQLITE_MAX_VARIABLES]
+                rows = conn.execute(
+                    f"SELECT key, value, expires_at FROM shared_cache"
+                    f" WHERE key IN ({','.join('?' * len(chunk))}) AND expires_at > ?",
+                    (*chunk, now),
+                )
+                for key, value, expires_at in rows:
+                    result[key] = (json.loads(value), expires_at - now)
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning("shared cache read failed: %s", e)
+            return {}
+        return result
+
+    def set(self, key: str, value, ttl: float) -> None:
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, items: dict, ttl: float) -> None:
+        """写入 {key: value}，统一 TTL；None 值跳过（上游失败不缓存）。"""
+        items = {k: v for k, v in items.items() if v is not None}
+        if not self.enabled or not items or ttl <= 0:
+            return
+        expires_at = self._clock() + ttl
+        try:
+            conn = self._conn()
+            conn.executemany(
+                "INSERT OR REPLACE INTO shared_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                [(k, json.dumps(v, ensure_ascii=False), expires_at) for k, v in items.items()],
+            )
+            with self._lock:
+                self._writes += len(items)
+                check = self._writes >= _EVICT_CHECK_EVERY
+                if check:
+                    self._writes = 0
+            if check:
+                self._evict(conn)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning("shared cache write failed: %s", e)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """删除已过期条目；仍超上限时按过期时间从早到晚淘汰。"""
+        conn.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (self._clock(),))
+        (count,) = conn.execute("SELECT COUNT(*) FROM shared_cache").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM shared_cache WHERE key IN"
+                " (SELECT key FROM shared_cache ORDER BY expires_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def delete(self, key: str) -> None:
+        if not self.enabled:
+            return
+        try:
+            self._conn().execute("DELETE FROM shared_cache WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning("shared cache delete failed: %s", e)
+
+    def clear(self) -> None:
+        if not self.enabled:
+            return
+        try:
+            self._conn().execute("DELETE FROM shared_cache")
+        except sqlite3.Error as e:
+            logger.warning("shared cache clear failed: %s", e)
+
+    def stats(self) -> dict:
+        stats = {'enabled': self.enabled, 'path': self.path, 'max_entries': self.max_entries}
+        if self.enabled:
+            try:
+                (stats['size'],) = self._conn().execute(
+                    "SELECT COUNT(*) FROM shared_cache WHERE expires_at > ?", (self._clock(),)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning("shared cache stats failed: %s", e)
+        return stats
+
+
+shared_cache = SharedCache()
@@ -0,0 +1,214 @@
+"""多数据源路由与熔断.
+
+行情、日 K、净值都有多个上游（东财 / 新浪 / 天天基金 ...），原先按固定顺序尝试，
+挂掉的源每次调用都要等满超时。SourceRouter 为每个源记录滑动窗口内的耗时和错误率：
+
+- 连续失败 failure_threshold 次后熔断（open），cooldown 秒内直接跳过该源；
+- 冷却期过后进入半开（half_open），只放行一个探测请求，成功则恢复（closed），失败重新熔断；
+- route() 把可用源按健康度排序：熔断关闭的在前，其中错误率低、平均耗时短的优先，
+  尚无样本的源保持声明顺序排在有样本的源之后。
+
+进程内共享一个 source_router；各调用方用 'etf_kline:eastmoney' 这类名字区分源。
+"""
+from collections import deque
+from dataclasses import dataclass, field
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 错误率达到该值的源排在错误率低的源之后（不单独熔断，熔断只看连续失败）
+_DEGRADED_ERROR_RATE = 0.5
+
+
+class SourceUnavailable(Exception):
+    """源已熔断，本次调用被跳过。"""
+
+
+@dataclass
+class SourceHealth:
+    """单个源的滑动窗口统计与熔断状态."""
+    name: str
+    samples: deque = field(default_factory=deque)    # (t, ok, latency)
+    consecutive_failures: int = 0
+    state: str = CLOSED
+    opened_at: float = 0.0
+    probing: bool = False
+    last_error: Optional[str] = None
+
+    def prune(self, now: float, window: float) -> None:
+        while self.samples and self.samples[0][0] < now - window:
+            self.samples.popleft()
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok, _ in self.samples if not ok) / len(self.samples)
+
+    @property
+    def mean_latency(self) -> Optional[float]:
+        """窗口内成功请求的平均耗时；无成功样本返回 None。"""
+        latencies = [latency for _, ok, latency in self.samples if ok]
+        return sum(latencies) / len(latencies) if latencies else None
+
+
+class SourceRouter:
+    """按健康度给数据源排序，并对连续失败的源熔断."""
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 60.0,
+                 window: float = 300.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.window = window
+        self._clock = clock
+        self._sources: dict[str, SourceHealth] = {}
+        self._lock = threading.Lock()
+
+    def _health(self, name: str) -> SourceHealth:
+        health = self._sources.get(name)
+        if health is None:
+            health = self._sources[name] = SourceHealth(name)
+        return health
+
+    def _refresh_state(self, health: SourceHealth, now: float) -> None:
+        if health.state == OPEN and now - health.opened_at >= self.cooldown:
+            health.state = HALF_OPEN
+            health.probing = False
+        health.prune(now, self.window)
+
+    def state(self, name: str) -> str:
+        with self._lock:
+            health = self._health(name)
+            self._refresh_state(health, self._clock())
+            return health.state
+
+    def route(self, names: Iterable[str], reorder: bool = True) -> list[str]:
+        """可尝试的源，按优先级排序；熔断中的源不出现在结果里。
+
+        reorder=False 时保持传入顺序，只剔除熔断中的源（顺序本身代表数据质量偏好时使用）。
+        """
+        now = self._clock()
+        ranked = []
+        with self._lock:
+            for index, name in enumerate(names):
+                health = self._health(name)
+                self._refresh_state(health, now)
+                if health.state == OPEN:
+                    continue
+                latency = health.mean_latency
+                if not reorder:
+                    ranked.append((index, name))
+                    continue
+                ranked.append((
+                    health.state != CLOSED,
+                    health.error_rate >= _DEGRADED_ERROR_RATE,
+                    latency is None,
+                    latency or 0.0,
+                    index,
+                    name,
+                ))
+        return [key[-1] for key in sorted(ranked)]
+
+    def allow(self, name: str) -> bool:
+        """是否放行一次请求：关闭状态总是放行，半开状态只放行一个探测请求。"""
+        with self._lock:
+            health = self._health(name)
+            self._refresh_state(health, self._clock())
+            if health.state == CLOSED:
+                return True
+            if health.state == HALF_OPEN and not health.probing:
+                health.probing = True
+                return True
+            return False
+
+    def record(self, name: str, ok: bool, latency: float, error: Optional[str] = None) -> None:
+        now = self._clock()
+        with self._lock:
+            health = self._health(name)
+            health.samples.append((now, ok, latency))
+            health.prune(now, self.window)
+            if ok:
+                if health.state != CLOSED:
+                    logger.info("source %s recovered", name)
+                health.state = CLOSED
+                health.consecutive_failures = 0
+                health.probing = False
+                return
+            health.consecutive_failures += 1
+            health.last_error = error
+            if health.state == HALF_OPEN or health.consecutive_failures >= self.failure_threshold:
+                if health.state != OPEN:
+                    logger.warning("source %s circuit opened after %d failures: %s",
+                                   name, health.consecutive_failures, error)
+                health.state = OPEN
+                health.opened_at = now
+                health.probing = False
+
+    def call(self, name: str, func: Callable, *args, accept: Callable = None, **kwargs):
+        """经熔断器调用 func 并记录耗时。
+
+        func 抛异常或 accept(结果) 为假都记为失败（异常原样抛出）。
+        熔断中抛 SourceUnavailable，不发请求。
+        """
+        if not self.allow(name):
+            raise SourceUnavailable(name)
+        started = self._clock()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.record(name, False, self._clock() - started, str(e))
+            raise
+        ok = accept(result) if accept is not None else result is not None
+        self.record(name, ok, self._clock() - started, None if ok else '无数据')
+        return result
+
+    def first(self, sources: Sequence[tuple[str, Callable]], accept: Callable = None):
+        """按 route() 顺序依次调用 (name, func)，返回首个成功的 (name, 结果)；都失败返回 (None, None)。"""
+        funcs = dict(sources)
+        for name in self.route(funcs):
+            try:
+                result = self.call(name, funcs[name], accept=accept)
+            except SourceUnavailable:
+                continue
+            except Exception as e:
+                logger.warning("source %s failed: %s", name, e)
+                continue
+            if (accept(result) if accept is not None else result is not None):
+                return name, result
+        return None, None
+
+    def snapshot(self) -> dict:
+        """各源的路由状态（metrics 接口用）。"""
+        now = self._clock()
+        with self._lock:
+            result = {}
+            for name, health in sorted(self._sources.items()):
+                self._refresh_state(health, now)
+                latency = health.mean_latency
+                result[name] = {
+                    'state': health.state,
+                    'requests': len(health.samples),
+                    'error_rate': round(health.error_rate, 3),
+                    'mean_latency_ms': round(latency * 1000, 1) if latency is not None else None,
+                    'consecutive_failures': health.consecutive_failures,
+                    'retry_in': (
+                        round(max(self.cooldown - (now - health.opened_at), 0.0), 1)
+                        if health.state == OPEN else None
+                    ),
+                    'last_error': health.last_error,
+                }
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._sources.clear()
+
+
+source_router = SourceRouter()
@@ -0,0 +1,159 @@
+"""交易日历.
+
+交易日来自随包数据文件 app/data/trading_days.txt。内存中保存两份结构：
+升序的 ordinal 数组（二分查找前后交易日、区间交易日）和按 ordinal
+偏移的位图（O(1) 判断是否交易日）。数据文件覆盖范围之外按周一至周五推算。
+"""
+from datetime import date, datetime, timedelta
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'trading_days.txt')
+
+
+def _as_date(day) -> date:
+    return day.date() if isinstance(day, datetime) else day
+
+
+def _weekdays(lo: int, hi: int) -> list[date]:
+    """ordinal 闭区间 [lo, hi] 内的周一至周五。"""
+    return [d for d in map(date.fromordinal, range(lo, hi + 1)) if d.weekday() < 5]
+
+
+class TradingCalendar:
+    """沪深交易所交易日历。"""
+
+    def __init__(self, trading_days):
+        ordinals = np.unique(np.fromiter((_as_date(d).toordinal() for d in trading_days), dtype=np.int64))
+        if ordinals.size == 0:
+            raise ValueError("交易日历为空")
+        self._ordinals = ordinals
+        self._first = int(ordinals[0])
+        self._last = int(ordinals[-1])
+        self._bits = np.zeros(self._last - self._first + 1, dtype=bool)
+        self._bits[ordinals - self._first] = True
+
+    @classmethod
+    def load(cls, path: str = DATA_FILE) -> 'TradingCalendar':
+        """从数据文件加载：每行一个 YYYYMMDD，# 开头为注释。"""
+        days = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    days.append(datetime.strptime(line, '%Y%m%d').date())
+        return cls(days)
+
+    @property
+    def first_day(self) -> date:
+        return date.fromordinal(self._first)
+
+    @property
+    def last_day(self) -> date:
+        return date.fromordinal(self._last)
+
+    def covers(self, day) -> bool:
+        return self._first <= _as_date(day).toordinal() <= self._last
+
+    def is_trading_day(self, day) -> bool:
+        day = _as_date(day)
+        n = day.toordinal()
+        if self._first <= n <= self._last:
+            return bool(self._bits[n - self._first])
+        return day.weekday() < 5
+
+    def next_trading_day(self, day, inclusive: bool = False) -> date:
+        """day 之后（inclusive 时含 day）的第一个交易日。"""
+        n = _as_date(day).toordinal() + (0 if inclusive else 1)
+        if n < self._first:
+            return self._weekday_forward(n)
+        i = int(np.searchsorted(self._ordinals, n, side='left'))
+        if i < self._ordinals.size:
+            return date.fromordinal(int(self._ordinals[i]))
+        return self._weekday_forward(n)
+
+    def prev_trading_day(self, day, inclusive: bool = False) -> date:
+        """day 之前（inclusive 时含 day）的最后一个交易日。"""
+        n = _as_date(day).toordinal() - (0 if inclusive else 1)
+        if n > self._last:
+            return self._weekday_backward(n)
+        i = int(np.searchsorted(self._ordinals, n, side='right'))
+        if i > 0:
+            return date.fromordinal(int(self._ordinals[i - 1]))
+        return self._weekday_backward(n)
+
+    def trading_days_between(self, start, end) -> list[date]:
+        """[start, end] 闭区间内的交易日（升序）。"""
+        lo, hi = _as_date(start).toordinal(), _as_date(end).toordinal()
+        if lo > hi:
+            return []
+        # 覆盖范围之前 / 之内 / 之后三段拼接
+        days = _weekdays(lo, min(hi, self._first - 1))
+        i = np.searchsorted(self._ordinals, max(lo, self._first), side='left')
+        j = np.searchsorted(self._ordinals, min(hi, self._last), side='right')
+        days.extend(date.fromordinal(n) for n in self._ordinals[i:j].tolist())
+        days.extend(_weekdays(max(lo, self._last + 1), hi))
+        return days
+
+    def recent_trading_days(self, end, count: int) -> list[date]:
+        """截至 end（含）的最近 count 个交易日（升序）。"""
+        if count <= 0:
+            return []
+        n = _as_date(end).toordinal()
+        if self._first <= n <= self._last:
+            j = int(np.searchsorted(self._ordinals, n, side='right'))
+            if j >= count:
+                return [date.fromordinal(d) for d in self._ordinals[j - count:j].tolist()]
+        days = []
+        day = self.prev_trading_day(end, inclusive=True)
+        while len(days) < count:
+            days.append(day)
+            day = self.prev_trading_day(day)
+        return days[::-1]
+
+    @staticmethod
+    def _weekday_forward(n: int) -> date:
+        day = date.fromordinal(n)
+        while day.weekday() >= 5:
+            day += timedelta(days=1)
+        return day
+
+    @staticmethod
+    def _weekday_backward(n: int) -> date:
+        day = date.fromordinal(n)
+        while day.weekday() >= 5:
+            day -= timedelta(days=1)
+        return day
+
+
+_calendar: Optional[TradingCalendar] = None
+_calendar_lock = threading.Lock()
+
+
+def get_calendar() -> TradingCalendar:
+    """进程级共享日历（首次调用时加载数据文件）。"""
+    global _calendar
+    if _calendar is None:
+        with _calendar_lock:
+            if _calendar is None:
+                _calendar = TradingCalendar.load()
+    return _calendar
+
+
+def is_trading_day(day=None) -> bool:
+    return get_calendar().is_trading_day(day or date.today())
+
+
+def next_trading_day(day=None, inclusive: bool = False) -> date:
+    return get_calendar().next_trading_day(day or date.today(), inclusive=inclusive)
+
+
+def prev_trading_day(day=None, inclusive: bool = False) -> date:
+    return get_calendar().prev_trading_day(day or date.today(), inclusive=inclusive)
+
+
+def trading_days_between(start, end) -> list[date]:
+    return get_calendar().trading_days_between(start, end)
@@ -6,6 +6,8 @@ document.addEventListener('DOMContentLoaded', function () {
 
 let chartInstance = null;
 let currentData = null;
+let sweepData = null;   // 首次切换衰减时一次拉回的全部衰减系数，之后切换不再请求
+let loadSeq = 0;        // bins / kernel 变化（loadData）时递增，丢弃旧参数下发出的请求的响应
 
 function initChipChart() {
     const el = document.getElementById('mainChart');
@@ -14,8 +16,9 @@ function initChipChart() {
     window.addEventListener('resize', () => chartInstance && chartInstance.resize());
 
     document.getElementById('btn-refresh').addEventListener('click', loadData);
-    document.getElementById('param-decay').addEventListener('change', loadData);
+    document.getElementById('param-decay').addEventListener('change', onDecayChange);
     document.getElementById('param-bins').addEventListener('change', loadData);
+    document.getElementById('param-kernel').addEventListener('change', loadData);
     // 颜色模式切换时用已缓存数据重绘（不重新请求）
     window.addEventListener('colorModeChange', () => {
         if (currentData) { renderChart(currentData); renderMetrics(currentData); }
@@ -32,38 +35,70 @@ function upDownColors() {
         : { up: '#dc3545', down: '#198754' };
 }
 
+// 首屏只请求当前衰减系数（默认参数直接读收盘快照）；切换衰减时再一次拉回全部衰减
 function loadData() {
-    const ctx = window.CHART_CTX;
+    sweepData = null;
+    const seq = ++loadSeq;
     const decay = document.getElementById('param-decay').value;
-    const bins = document.getElementById('param-bins').value;
-    const url = ctx.dataUrl + '?decay=' + decay + '&bins=' + bins;
+    fetchChip('decay=' + decay)
+        .then(data => { if (seq === loadSeq) showData(data); })
+        .catch(err => { if (seq === loadSeq) showError(err); });
+}
 
-    fetch(url)
-        .then(r => {
-            if (!r.ok) {
-                // 尝试读取服务端友好错误信息
-                return r.json().then(body => {
-                    throw new Error(body && body.error ? body.error : 'HTTP ' + r.status);
-                }).catch(err => {
-                    throw (err instanceof SyntaxError) ? new Error('HTTP ' + r.status) : err;
-                });
-            }
-            return r.json();
-        })
+function onDecayChange() {
+    if (sweepData) { showSelectedDecay(); return; }
+    const seq = loadSeq;
+    const decays = Array.from(document.getElementById('param-decay').options).map(o => o.value).join(',');
+    fetchChip('decays=' + decays)
         .then(data => {
-            currentData = data;
-            renderChart(data);
-            renderMetrics(data);
-            renderBinsTable(data);
+            if (seq !== loadSeq) return;   // 请求期间 bins / kernel 已变
+            sweepData = data;
+            showSelectedDecay();
         })
-        .catch(err => {
-            if (chartInstance) {
-                chartInstance.clear();
-                chartInstance.setOption({
-                    title: { text: t('数据加载失败') + ': ' + err.message, left: 'center', top: 'center', textStyle: { color: '#dc3545' } }
-                });
-            }
+        .catch(err => { if (seq === loadSeq) showError(err); });
+}
+
+function fetchChip(query) {
+    const ctx = window.CHART_CTX;
+    const bins = document.getElementById('param-bins').value;
+    const kernel = document.getElementById('param-kernel').value;
+    const url = ctx.dataUrl + '?' + query + '&bins=' + bins + '&kernel=' + kernel;
+
+    return fetch(url).then(r => {
+        if (!r.ok) {
+            // 尝试读取服务端友好错误信息
+            return r.json().then(body => {
+                throw new Error(body && body.error ? body.error : 'HTTP ' + r.status);
+            }).catch(err => {
+                throw (err instanceof SyntaxError) ? new Error('HTTP ' + r.status) : err;
+            });
+        }
+        return r.json();
+    });
+}
+
+function showError(err) {
+    if (chartInstance) {
+        chartInstance.clear();
+        chartInstance.setOption({
+            title: { text: t('数据加载失败') + ': ' + err.message, left: 'center', top: 'center', textStyle: { color: '#dc3545' } }
         });
+    }
+}
+
+// 从 sweeps 中取当前衰减系数的分布，与公共字段（klines 等）拼成单个 decay 的数据
+function showSelectedDecay() {
+    if (!sweepData) return;
+    const decay = parseFloat(document.getElementById('param-decay').value);
+    const sweep = sweepData.sweeps.find(s => s.decay === decay) || sweepData.sweeps[0];
+    showData(Object.assign({}, sweepData, sweep));
+}
+
+function showData(data) {
+    currentData = data;
+    renderChart(currentData);
+    renderMetrics(currentData);
+    renderBinsTable(currentData);
 }
 
 function renderChart(data) {
@@ -1,9 +1,12 @@
 import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
-import akshare as ak
-import requests
-import pandas as pd
+
+from app.utils.lazy import lazy_import
+
+# 首次使用时才导入（akshare 导入需数秒）
+ak = lazy_import('akshare')
+pd = lazy_import('pandas')
 
 class FundCrawler:
     @staticmethod
@@ -0,0 +1,104 @@
+"""重量级可选依赖的延迟导入.
+
+akshare、pandas、pytesseract / PIL 导入耗时长、占内存，且大多数请求用不到。
+lazy_import 返回一个模块代理，首次访问属性时才真正 import；
+缺少依赖时在使用处抛出带安装提示的 ImportError，而不是让应用启动失败。
+"""
+import importlib
+import importlib.util
+import logging
+import sys
+import threading
+import types
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 模块名 → pip 包名（用于错误提示）
+INSTALL_HINTS = {
+    'akshare': 'akshare',
+    'pandas': 'pandas',
+    'pytesseract': 'pytesseract',
+    'PIL': 'Pillow',
+}
+
+_registry: dict = {}
+_registry_lock = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+    """首次访问属性时才导入的模块代理。"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_module = None
+        self._lazy_lock = threading.Lock()
+
+    def load(self) -> types.ModuleType:
+        """导入并返回真实模块（线程安全，只导入一次）。"""
+        module = self._lazy_module
+        if module is None:
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    try:
+                        self._lazy_module = importlib.import_module(self.__name__)
+                    except ImportError as e:
+                        package = INSTALL_HINTS.get(self.__name__.split('.')[0], self.__name__)
+                        raise ImportError(f"缺少可选依赖 {self.__name__}，请先 pip install {package}") from e
+                module = self._lazy_module
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self._lazy_module is not None
+
+    @property
+    def available(self) -> bool:
+        """是否已安装（只查找不导入）。"""
+        if self.loaded or self.__name__ in sys.modules:
+            return True
+        try:
+            return importlib.util.find_spec(self.__name__) is not None
+        except (ImportError, ValueError):
+            return False
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __dir__(self):
+        return dir(self.load())
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f'<LazyModule {self.__name__!r} ({state})>'
+
+
+def lazy_import(name: str) -> LazyModule:
+    """返回 name 的延迟模块代理（同名共享一个实例）。"""
+    with _registry_lock:
+        module = _registry.get(name)
+        if module is None:
+            module = _registry[name] = LazyModule(name)
+        return module
+
+
+def warm_up(names: Iterable[str], background: bool = False) -> Optional[threading.Thread]:
+    """预先导入指定模块（如 worker 启动后），缺失的依赖只记日志。
+
+    background=True 时在守护线程中导入并返回该线程，不阻塞调用方。
+    """
+    names = list(names)
+
+    def _run():
+        for name in names:
+            try:
+                lazy_import(name).load()
+            except ImportError as e:
+                logger.warning("warm up %s skipped: %s", name, e)
+
+    if not background:
+        _run()
+        return None
+    thread = threading.Thread(target=_run, name='lazy-warm-up', daemon=True)
+    thread.start()
+    return thread
@@ -1,8 +1,9 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-"""初始化数据库（创建所有表）"""
+"""初始化数据库（创建所有表，并升级已有表结构）"""
 from app import create_app
 from app.extensions import db
+from app.migrations import run_migrations
 from app.models import User, Fund, Position, Transaction, Agreement, Profit, FundNavHistory
 from werkzeug.security import generate_password_hash
 
@@ -10,6 +11,7 @@ if __name__ == '__main__':
     app = create_app()
     with app.app_context():
         db.create_all()
+        run_migrations()
         print('数据库表创建完成！')
 
         if not User.query.filter_by(is_main_account=True).first():
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""历史净值回补工具 - 从天天基金 F10 接口批量回补基金历史净值
+
+示例：
+    python nav_backfill.py --all --years 5
+    python nav_backfill.py --codes 161725 000001 --start 2024-01-01
+    python nav_backfill.py --codes 161725 --full   # 重新拉取整个区间，补齐中间缺口
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from app import create_app
+from app.services.nav_backfill import DEFAULT_YEARS, backfill_funds
+
+
+def _parse_date(text):
+    return datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='基金历史净值回补工具')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--codes', nargs='+', help='要回补的基金代码')
+    target.add_argument('--all', action='store_true', help='回补数据库中的全部基金')
+    parser.add_argument('--years', type=int, default=DEFAULT_YEARS, help=f'回补年数（默认 {DEFAULT_YEARS}）')
+    parser.add_argument('--start', type=_parse_date, help='起始日期 YYYY-MM-DD（优先于 --years）')
+    parser.add_argument('--end', type=_parse_date, help='结束日期 YYYY-MM-DD（默认今天）')
+    parser.add_argument('--workers', type=int, default=8, help='并发抓取线程数（默认 8）')
+    parser.add_argument('--full', action='store_true', help='忽略已存储区间，重新拉取整个日期范围')
+
+    args = parser.parse_args()
+    app = create_app()
+
+    def _progress(result):
+        status = f"失败：{result.error}" if result.error else "完成"
+        print(f"基金 {result.code} {status}，{result.pages} 页，拉取 {result.fetched} 条，新增 {result.inserted} 条")
+
+    started = time.monotonic()
+    with app.app_context():
+        results = backfill_funds(
+            fund_codes=None if args.all else args.codes,
+            start_date=args.start,
+            end_date=args.end,
+            years=args.years,
+            full=args.full,
+            workers=args.workers,
+            rate_limits=app.config.get('NAV_CRAWL_RATE_LIMITS'),
+            progress=_progress,
+        )
+
+    failed = [r for r in results if r.error]
+    inserted = sum(r.inserted for r in results)
+    print(f"回补完成：{len(results)} 只基金，新增 {inserted} 条，失败 {len(failed)} 只，"
+          f"耗时 {time.monotonic() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,33 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
+@pytest.fixture(autouse=True)
+def _clear_quote_cache():
+    """进程内行情缓存跨测试隔离。"""
+    from app.services import quote_provider
+    quote_provider.quote_cache.clear()
+    yield
+    quote_provider.quote_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _reset_source_router():
+    """数据源健康统计 / 熔断状态跨测试隔离。"""
+    from app.services.source_router import source_router
+    source_router.reset()
+    yield
+    source_router.reset()
+
+
+@pytest.fixture(autouse=True)
+def _clear_parse_memo():
+    """净值页面解析结果缓存跨测试隔离。"""
+    from app.services import crawler
+    crawler.parse_memo.clear()
+    yield
+    crawler.parse_memo.clear()
+
+
 @pytest.fixture
 def app():
     """创建测试用 app 实例"""
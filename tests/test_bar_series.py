@@ -0,0 +1,109 @@
+"""BarSeries 列式 K 线：构造、下标、序列化、SQL 直读."""
+from datetime import date
+
+import numpy as np
+import pytest
+
+
+def _rows():
+    return [
+        (date(2026, 1, 2), 1.05, 1.08, 1.04, 1.07, 100000, 105000.0),
+        (date(2026, 1, 5), 1.07, 1.10, 1.06, None, None, None),
+    ]
+
+
+class TestConstruction:
+
+    def test_from_rows_fills_typed_columns(self):
+        from app.services.bar_series import BarSeries
+        s = BarSeries.from_rows(_rows(), name='X')
+        assert len(s) == 2 and s.name == 'X'
+        assert s.days.dtype == np.int64 and s.volume.dtype == np.int64
+        assert s.close.dtype == np.float64 and np.isnan(s.close[1])
+        assert s.volume.tolist() == [100000, 0] and s.amount.tolist() == [105000.0, 0.0]
+        assert s.last_date == date(2026, 1, 5)
+        assert s.dates[0] == np.datetime64('2026-01-02')
+
+    def test_from_bars_sorts_by_date(self):
+        from app.services.bar_series import BarSeries
+        from app.services.quote_provider import ETFDailyBar
+        bars = [
+            ETFDailyBar(date='2026-01-05', open=2, high=2, low=2, close=2, volume=2, amount=2),
+            ETFDailyBar(date='2026-01-02', open=1, high=1, low=1, close=1, volume=1, amount=1),
+        ]
+        s = BarSeries.from_bars(bars)
+        assert s.close.tolist() == [1.0, 2.0]
+        assert BarSeries.coerce(s) is s
+
+    def test_empty(self):
+        from app.services.bar_series import BarSeries
+        s = BarSeries.empty()
+        assert not s and s.last_date is None and s.to_records() == []
+
+
+class TestAccess:
+
+    def test_integer_index_returns_bar_and_slice_returns_series(self):
+        from app.services.bar_series import BarSeries
+        s = BarSeries.from_rows(_rows())
+        assert s[0].date == '2026-01-02' and s[0].close == 1.07
+        assert s[-1].date == '2026-01-05'
+        tail = s.tail(1)
+        assert isinstance(tail, BarSeries) and tail.last_date == date(2026, 1, 5)
+
+    def test_to_records_is_json_ready(self):
+        from app.services.bar_series import BarSeries
+        records = BarSeries.from_rows(_rows()).to_records()
+        assert records[0] == {'date': '2026-01-02', 'open': 1.05, 'high': 1.08, 'low': 1.04,
+                              'close': 1.07, 'volume': 100000, 'amount': 105000.0}
+        assert records[1]['close'] is None
+        assert type(records[0]['volume']) is int
+
+
+class TestQueries:
+
+    def _seed(self, db, symbol, count, name=None):
+        from datetime import timedelta
+        from app.models.etf_kline_cache import EtfKlineCache
+        for i in range(count):
+            db.session.add(EtfKlineCache(
+                symbol=symbol, date=date(2026, 1, 1) + timedelta(days=i),
+                open=1.0, high=1.1 + i, low=0.9, close=1.0 + i, volume=100 * (i + 1), amount=1.0,
+                name=name if i == 0 else None,
+            ))
+        db.session.commit()
+
+    def test_get_series_reads_recent_window(self, db):
+        from app.models.etf_kline_cache import EtfKlineCache
+        self._seed(db, 'SH562500', 6, name='机器人ETF')
+        s = EtfKlineCache.get_series('SH562500', 4)
+        assert s.close.tolist() == [3.0, 4.0, 5.0, 6.0]
+        assert s.last_date == date(2026, 1, 6)
+        assert EtfKlineCache.get_series('SH562500', 10).name == '机器人ETF'
+        assert len(EtfKlineCache.get_series('SZ159915', 10)) == 0
+
+    def test_get_series_many_matches_get_series(self, db):
+        from app.models.etf_kline_cache import EtfKlineCache
+        self._seed(db, 'SH562500', 5, name='A')
+        self._seed(db, 'SZ159915', 3)
+        many = EtfKlineCache.get_series_many(['SH562500', 'SZ159915', 'SH510300'], 4)
+        assert set(many) == {'SH562500', 'SZ159915'}
+        one = EtfKlineCache.get_series('SH562500', 4)
+        assert many['SH562500'].days.tolist() == one.days.tolist()
+        assert many['SH562500'].volume.tolist() == one.volume.tolist()
+        assert many['SH562500'].name is None   # 名称所在的第一行不在窗口内
+        assert len(many['SZ159915']) == 3
+
+
+def test_chip_distribution_same_for_series_and_bars():
+    from app.services.bar_series import BarSeries
+    from app.services.chip_distribution import compute_chip_distribution
+    from app.services.quote_provider import ETFDailyBar
+    bars = [
+        ETFDailyBar(date=f'2026-01-{d:02d}', open=1.0, high=1.0 + d / 100, low=0.95,
+                    close=1.0, volume=1000 * d, amount=1.0)
+        for d in range(1, 20)
+    ]
+    want = compute_chip_distribution(bars, decay=0.9, bin_count=30)
+    got = compute_chip_distribution(BarSeries.from_bars(bars[::-1]), decay=0.9, bin_count=30)
+    assert [w for _, _, w in got] == pytest.approx([w for _, _, w in want])
@@ -81,12 +81,13 @@ class TestChipDataAPI:
     def test_valid_symbol_returns_json(self, logged_in_client, monkeypatch):
         from app.services import quote_provider
         from app.services.quote_provider import ETFDailyBar, ETFQuote
+        from app.services.bar_series import BarSeries
 
         bars = [
             ETFDailyBar(date='2026-01-02', open=1.05, high=1.08, low=1.04, close=1.07, volume=100000, amount=105000),
             ETFDailyBar(date='2026-01-03', open=1.07, high=1.10, low=1.06, close=1.09, volume=120000, amount=130000),
         ]
-        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline', lambda s, days=250: bars)
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline', lambda s, days=250: BarSeries.from_bars(bars))
 
         fake_quote = ETFQuote(
             symbol='SH562500', name='机器人ETF华夏', market='SH',
@@ -110,6 +111,9 @@ class TestChipDataAPI:
         assert 'metrics' in data
         assert 'concentration' in data['metrics']
         assert 'profit_ratio' in data['metrics']
+        # 缓存 K 线早于最近收盘日 → 标记为过期
+        assert data['as_of'] == '2026-01-03'
+        assert data['stale'] is True
 
     def test_no_kline_data_returns_404_with_friendly_error(self, logged_in_client, monkeypatch):
         """远端拉不到任何 K 线 → 404 + 友好提示（供前端展示）。"""
@@ -154,6 +158,7 @@ class TestChipDataAPI:
         """URL 参数 decay/bins 透传给算法。"""
         from app.services import quote_provider
         from app.services.quote_provider import ETFDailyBar, ETFQuote
+        from app.services.bar_series import BarSeries
         from app.services import chip_distribution
 
         bars = [
@@ -161,7 +166,7 @@ class TestChipDataAPI:
                         low=0.95 + i * 0.01, close=1.02 + i * 0.01, volume=100000, amount=105000)
             for i in range(1, 6)
         ]
-        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline', lambda s, days=250: bars)
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline', lambda s, days=250: BarSeries.from_bars(bars))
         fake_quote = ETFQuote(
             symbol='SH562500', name='X', market='SH',
             latest=1.05, open=1.04, high=1.06, low=1.03, prev_close=1.04,
@@ -172,17 +177,77 @@ class TestChipDataAPI:
         captured = {}
         orig = chip_distribution.compute_chip_distribution
 
-        def spy(bars_arg, decay=None, bin_count=None, price_padding=0.02):
+        def spy(bars_arg, decay=None, bin_count=None, price_padding=0.02, kernel='uniform'):
             captured['decay'] = decay
             captured['bin_count'] = bin_count
-            return orig(bars_arg, decay=decay, bin_count=bin_count, price_padding=price_padding)
+            captured['kernel'] = kernel
+            return orig(bars_arg, decay=decay, bin_count=bin_count, price_padding=price_padding, kernel=kernel)
 
         monkeypatch.setattr(chip_distribution, 'compute_chip_distribution', spy)
 
-        resp = logged_in_client.get('/charts/api/etf/562500/chip-data?decay=0.99&bins=40')
+        resp = logged_in_client.get('/charts/api/etf/562500/chip-data?decay=0.99&bins=40&kernel=triangular')
         assert resp.status_code == 200
         assert captured['decay'] == 0.99
         assert captured['bin_count'] == 40
+        assert captured['kernel'] == 'triangular'
+        assert resp.get_json()['kernel'] == 'triangular'
+
+    def test_unknown_kernel_rejected(self, logged_in_client, monkeypatch):
+        from app.services import quote_provider
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline',
+                            lambda s, days=250: pytest.fail('invalid kernel must not fetch'))
+        resp = logged_in_client.get('/charts/api/etf/562500/chip-data?kernel=gaussian')
+        assert resp.status_code == 400
+        assert 'gaussian' in resp.get_json()['error']
+
+    def test_out_of_range_params_rejected(self, logged_in_client, monkeypatch):
+        from app.services import quote_provider
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline',
+                            lambda s, days=250: pytest.fail('invalid params must not fetch'))
+        for query in ('bins=1000000', 'bins=1', 'days=100000', 'decay=1.5', 'decay=0', 'band=5'):
+            assert logged_in_client.get(f'/charts/api/etf/562500/chip-data?{query}').status_code == 400
+        assert logged_in_client.get('/charts/api/etf/562500/chip-query?bins=1000000').status_code == 400
+        resp = logged_in_client.post('/charts/api/etf/chip-data:batch', json={'symbols': ['562500'], 'bins': 10 ** 6})
+        assert resp.status_code == 400
+
+    def test_batch_and_history_keep_tighter_limits(self, logged_in_client, monkeypatch):
+        """chip-data 放宽的上限不影响批量与 chip-history。"""
+        from app.services import quote_provider
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline',
+                            lambda s, days=250: pytest.fail('invalid params must not fetch'))
+        monkeypatch.setattr(quote_provider, 'refresh_stale_klines',
+                            lambda *a, **kw: pytest.fail('invalid params must not fetch'))
+        for params in ({'days': 2400}, {'bins': 800}):
+            resp = logged_in_client.post('/charts/api/etf/chip-data:batch', json={'symbols': ['562500'], **params})
+            assert resp.status_code == 400
+        for query in ('window=2400', 'bins=800'):
+            assert logged_in_client.get(f'/charts/api/etf/562500/chip-history?{query}').status_code == 400
+
+    def test_long_history_accepted(self, logged_in_client, monkeypatch):
+        """2000+ 根 K 线、数百个桶的长窗口请求不被参数校验拒绝（价格极差 ≥ 0.5，桶数不被收窄）。"""
+        from datetime import date, timedelta
+        from app.services import quote_provider
+        from app.services.quote_provider import ETFDailyBar, ETFQuote
+        from app.services.bar_series import BarSeries
+
+        requested = {}
+        bars = [
+            ETFDailyBar(date=(date(2018, 1, 1) + timedelta(days=i)).isoformat(), open=1.0 + i / 2e3,
+                        high=1.05 + i / 2e3, low=0.95 + i / 2e3, close=1.0 + i / 2e3, volume=100000, amount=105000)
+            for i in range(2500)
+        ]
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline',
+                            lambda s, days=250: requested.update(days=days) or BarSeries.from_bars(bars[-days:]))
+        monkeypatch.setattr(quote_provider, 'fetch_etf_quote', lambda s: ETFQuote(
+            symbol='SH562500', name='X', market='SH',
+            latest=1.2, open=1.2, high=1.21, low=1.19, prev_close=1.2,
+            change_amount=0, change_pct=0, volume=100000, amount=105000,
+        ))
+
+        resp = logged_in_client.get('/charts/api/etf/562500/chip-data?days=2400&bins=800')
+        assert resp.status_code == 200
+        assert requested['days'] == 2400
+        assert len(resp.get_json()['distribution']) == 800
 
 
 class TestAkshareTestEndpoint:
@@ -195,13 +260,14 @@ class TestAkshareTestEndpoint:
     def test_returns_kline_json(self, logged_in_client, monkeypatch):
         """akshare 拉取成功时返回 K 线 JSON。"""
         from app.services import quote_provider
+        from app.services.bar_series import BarSeries
         from app.services.quote_provider import ETFDailyBar
 
         bars = [
             ETFDailyBar(date='2026-01-02', open=1.05, high=1.08, low=1.04, close=1.07, volume=100000, amount=105000),
             ETFDailyBar(date='2026-01-03', open=1.07, high=1.10, low=1.06, close=1.09, volume=120000, amount=130000),
         ]
-        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline_akshare', lambda s, days=250: bars)
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline_akshare', lambda s, days=250: BarSeries.from_bars(bars))
 
         resp = logged_in_client.get('/charts/api/etf/562500/akshare-test?days=30')
         assert resp.status_code == 200
@@ -224,3 +290,377 @@ class TestAkshareTestEndpoint:
         data = resp.get_json()
         assert data['ok'] is False
         assert 'akshare failed' in data['error']
+
+
+class TestChipStateServing:
+    """chip-data 命中增量状态时不再全量计算."""
+
+    def test_second_request_served_from_state(self, logged_in_client, monkeypatch):
+        from app.services import quote_provider, chip_distribution
+        from app.services.quote_provider import ETFDailyBar
+        from app.services.bar_series import BarSeries
+
+        bars = [
+            ETFDailyBar(date='2026-01-02', open=1.05, high=1.08, low=1.04, close=1.07, volume=100000, amount=105000),
+            ETFDailyBar(date='2026-01-03', open=1.07, high=1.10, low=1.06, close=1.09, volume=120000, amount=130000),
+        ]
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline', lambda s, days=250: BarSeries.from_bars(bars))
+        monkeypatch.setattr(quote_provider, 'fetch_etf_quote', lambda s: None)
+
+        calls = {'n': 0}
+        orig = chip_distribution.compute_chip_distribution
+
+        def spy(*a, **kw):
+            calls['n'] += 1
+            return orig(*a, **kw)
+
+        monkeypatch.setattr(chip_distribution, 'compute_chip_distribution', spy)
+
+        first = logged_in_client.get('/charts/api/etf/562500/chip-data').get_json()
+        second = logged_in_client.get('/charts/api/etf/562500/chip-data').get_json()
+        assert calls['n'] == 1
+        assert [d['weight'] for d in second['distribution']] == pytest.approx(
+            [d['weight'] for d in first['distribution']])
+
+        # 不同 kernel 各有一份状态
+        logged_in_client.get('/charts/api/etf/562500/chip-data?kernel=typical')
+        logged_in_client.get('/charts/api/etf/562500/chip-data?kernel=typical')
+        assert calls['n'] == 2
+
+
+class TestChipSnapshotServing:
+    """默认参数的 chip-data 优先读收盘后生成的快照."""
+
+    def _seed(self, charts_app, charts_db, monkeypatch):
+        from app.services import quote_provider
+        from app.services.kline_store import get_kline_store
+        TestChipDataBatchAPI()._seed(charts_app, charts_db, 'SH562500', count=10)
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline',
+                            lambda s, days=250: get_kline_store().read('SH562500', days))
+        monkeypatch.setattr(quote_provider, 'fetch_etf_quote', lambda s: None)
+
+    def test_default_params_served_from_snapshot(self, logged_in_client, charts_app, charts_db, monkeypatch):
+        from app.services import chip_distribution, chip_snapshot
+        self._seed(charts_app, charts_db, monkeypatch)
+        live = logged_in_client.get('/charts/api/etf/562500/chip-data').get_json()
+        assert live['source'] == 'computed'
+        with charts_app.app_context():
+            assert chip_snapshot.build_snapshot('SH562500') is True
+
+        monkeypatch.setattr(chip_distribution, 'compute_chip_distribution',
+                            lambda *a, **kw: pytest.fail('snapshot hit must not compute'))
+        served = logged_in_client.get('/charts/api/etf/562500/chip-data').get_json()
+        assert served['source'] == 'snapshot'
+        assert served['metrics'] == pytest.approx(live['metrics'])
+        assert served['peaks'] == live['peaks']
+        assert [d['weight'] for d in served['distribution']] == pytest.approx(
+            [d['weight'] for d in live['distribution']])
+        assert len(served['klines']) == 10
+
+    def test_page_first_load_served_from_snapshot(self, logged_in_client, charts_app, charts_db, monkeypatch):
+        from app.services import chip_distribution, chip_snapshot
+        self._seed(charts_app, charts_db, monkeypatch)
+        with charts_app.app_context():
+            chip_snapshot.build_snapshot('SH562500')
+        monkeypatch.setattr(chip_distribution, 'compute_chip_distribution',
+                            lambda *a, **kw: pytest.fail('snapshot hit must not compute'))
+        # 页面首屏请求（etf_chip.js loadData）
+        data = logged_in_client.get('/charts/api/etf/562500/chip-data?decay=0.97&bins=80&kernel=uniform').get_json()
+        assert data['source'] == 'snapshot'
+
+    def test_other_params_fall_back_to_live(self, logged_in_client, charts_app, charts_db, monkeypatch):
+        from app.services import chip_snapshot
+        self._seed(charts_app, charts_db, monkeypatch)
+        with charts_app.app_context():
+            chip_snapshot.build_snapshot('SH562500')
+        assert logged_in_client.get('/charts/api/etf/562500/chip-data?bins=40').get_json()['source'] == 'computed'
+        assert logged_in_client.get('/charts/api/etf/562500/chip-data?bins=40').get_json()['source'] == 'state'
+
+
+class TestChipDataBatchAPI:
+    """POST /charts/api/etf/chip-data:batch 批量筹码峰."""
+
+    def _seed(self, charts_app, charts_db, symbol, count=5):
+        from datetime import date, timedelta
+        from app.models.etf_kline_cache import EtfKlineCache
+        with charts_app.app_context():
+            today = date.today()
+            for i in range(count):
+                p = 1.0 + i * 0.01
+                charts_db.session.add(EtfKlineCache(
+                    symbol=symbol, date=today - timedelta(days=count - 1 - i),
+                    open=p, high=p + 0.03, low=p - 0.02, close=p + 0.01,
+                    volume=10000 + i, amount=1.0, name=f'{symbol}名称',
+                ))
+            charts_db.session.commit()
+
+    def test_returns_metrics_for_each_symbol(self, logged_in_client, charts_app, charts_db, monkeypatch):
+        from app.services import quote_provider
+        self._seed(charts_app, charts_db, 'SH562500')
+        self._seed(charts_app, charts_db, 'SZ159915')
+        monkeypatch.setattr(quote_provider, 'fetch_etf_quotes', lambda symbols: {})
+        monkeypatch.setattr(
+            quote_provider, 'fetch_etf_daily_kline',
+            lambda s, days=250: pytest.fail('fresh cache must not refetch'),
+        )
+
+        resp = logged_in_client.post('/charts/api/etf/chip-data:batch',
+                                     json={'symbols': ['562500', 'SZ159915', 'bad']})
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert set(data['results']) == {'SH562500', 'SZ159915'}
+        item = data['results']['SH562500']
+        assert item['name'] == 'SH562500名称'
+        assert 'metrics' in item and 'peaks' in item
+        assert 'klines' not in item and 'distribution' not in item
+        assert 'bad' in data['errors']
+
+    def test_include_flags_return_full_arrays(self, logged_in_client, charts_app, charts_db, monkeypatch):
+        from app.services import quote_provider
+        self._seed(charts_app, charts_db, 'SH562500')
+        monkeypatch.setattr(quote_provider, 'fetch_etf_quotes', lambda symbols: {})
+        resp = logged_in_client.post('/charts/api/etf/chip-data:batch', json={
+            'symbols': ['562500'], 'include_klines': True, 'include_distribution': True, 'bins': 20,
+        })
+        item = resp.get_json()['results']['SH562500']
+        assert len(item['klines']) == 5
+        assert len(item['distribution']) == 20
+
+    def test_stale_symbol_refreshed_and_missing_reported(self, logged_in_client, charts_app, charts_db, monkeypatch):
+        from app.services import quote_provider
+        refreshed = []
+        monkeypatch.setattr(quote_provider, 'fetch_etf_quotes', lambda symbols: {})
+        monkeypatch.setattr(quote_provider, 'refresh_etf_daily_kline',
+                            lambda s, days=250: refreshed.append(s) or False)
+        resp = logged_in_client.post('/charts/api/etf/chip-data:batch', json={'symbols': ['562500']})
+        data = resp.get_json()
+        assert refreshed == ['SH562500']
+        assert 'SH562500' in data['errors']
+
+    def test_stale_symbols_refreshed_concurrently(self, logged_in_client, charts_app, charts_db, monkeypatch):
+        import threading
+        from app.services import quote_provider
+        barrier = threading.Barrier(3, timeout=5)
+        monkeypatch.setattr(quote_provider, 'fetch_etf_quotes', lambda symbols: {})
+
+        def refresh(symbol, days=250):
+            barrier.wait()    # 三个代码的刷新须同时在途，串行时会超时
+            return False
+
+        monkeypatch.setattr(quote_provider, 'refresh_etf_daily_kline', refresh)
+        resp = logged_in_client.post('/charts/api/etf/chip-data:batch',
+                                     json={'symbols': ['562500', '159915', '510300']})
+        assert resp.status_code == 200
+        assert not barrier.broken
+
+    def test_rejects_missing_symbols(self, logged_in_client):
+        resp = logged_in_client.post('/charts/api/etf/chip-data:batch', json={})
+        assert resp.status_code == 400
+
+    def test_kernel_passed_through(self, logged_in_client, charts_app, charts_db, monkeypatch):
+        from app.services import quote_provider
+        self._seed(charts_app, charts_db, 'SH562500')
+        monkeypatch.setattr(quote_provider, 'fetch_etf_quotes', lambda symbols: {})
+        resp = logged_in_client.post('/charts/api/etf/chip-data:batch',
+                                     json={'symbols': ['562500'], 'kernel': 'typical'})
+        assert resp.get_json()['results']['SH562500']['kernel'] == 'typical'
+        resp = logged_in_client.post('/charts/api/etf/chip-data:batch',
+                                     json={'symbols': ['562500'], 'kernel': 'gaussian'})
+        assert resp.status_code == 400
+
+
+class TestDecaySweepAPI:
+    """chip-data?decays=...: 一次请求返回多个衰减系数的分布."""
+
+    def test_sweep_shares_klines_and_quote(self, logged_in_client, monkeypatch):
+        from app.services import quote_provider, chip_distribution
+        from app.services.quote_provider import ETFDailyBar
+        from app.services.bar_series import BarSeries
+
+        bars = BarSeries.from_bars([
+            ETFDailyBar(date=f'2026-01-{i:02d}', open=1.0, high=1.05 + i * 0.01, low=0.98 + i * 0.01,
+                        close=1.02 + i * 0.01, volume=10000, amount=1.0)
+            for i in range(1, 21)
+        ])
+        quotes = []
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline', lambda s, days=250: bars)
+        monkeypatch.setattr(quote_provider, 'fetch_etf_quote', lambda s: quotes.append(s))
+        sweeps = []
+        orig = chip_distribution.compute_chip_distributions
+
+        def spy(bars_arg, decays, **kw):
+            sweeps.append(list(decays))
+            return orig(bars_arg, decays, **kw)
+
+        monkeypatch.setattr(chip_distribution, 'compute_chip_distributions', spy)
+
+        # 0.97 已有状态，另外两个缺失：三个一起重算，共用同一网格
+        logged_in_client.get('/charts/api/etf/562500/chip-data?decay=0.97')
+        resp = logged_in_client.get('/charts/api/etf/562500/chip-data?decays=0.9,0.97,0.99')
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert sweeps == [[0.9, 0.97, 0.99]]
+        assert len(quotes) == 2
+        assert len(data['klines']) == 20 and 'metrics' not in data
+        assert [s['decay'] for s in data['sweeps']] == [0.9, 0.97, 0.99]
+        single = logged_in_client.get('/charts/api/etf/562500/chip-data?decay=0.99').get_json()
+        assert data['sweeps'][2]['metrics'] == single['metrics']
+        assert data['sweeps'][2]['distribution'] == single['distribution']
+
+    def test_state_and_new_decay_share_grid(self, logged_in_client, charts_app, monkeypatch):
+        from app.services import quote_provider, chip_distribution, chip_state
+        from app.services.quote_provider import ETFDailyBar
+        from app.services.bar_series import BarSeries
+
+        bars = BarSeries.from_bars([
+            ETFDailyBar(date=f'2026-01-{i:02d}', open=1.0, high=1.05 + i * 0.02, low=0.98 + i * 0.01,
+                        close=1.02 + i * 0.01, volume=10000, amount=1.0)
+            for i in range(1, 21)
+        ])
+        monkeypatch.setattr(quote_provider, 'fetch_etf_quote', lambda s: None)
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline', lambda s, days=250: bars)
+        # 增量前推的 0.97 状态仍沿用更早窗口划的（更宽的）网格
+        with charts_app.app_context():
+            old_grid = chip_distribution.compute_chip_distribution(bars, decay=0.97, price_padding=0.3)
+            chip_state.save_distribution('SH562500', 0.97, 80, 250, bars.last_date, old_grid)
+
+        data = logged_in_client.get('/charts/api/etf/562500/chip-data?decays=0.97,0.9').get_json()
+        edges = [[(d['price_low'], d['price_high']) for d in s['distribution']] for s in data['sweeps']]
+        assert edges[0] == edges[1]
+
+    def test_presets_and_bad_decays(self, logged_in_client, monkeypatch):
+        from app.services import quote_provider
+        from app.routes.charts import DECAY_PRESETS
+        from app.services.quote_provider import ETFDailyBar
+        from app.services.bar_series import BarSeries
+        bars = BarSeries.from_bars([ETFDailyBar(date='2026-01-02', open=1.0, high=1.1, low=1.0,
+                                                close=1.05, volume=1000, amount=1.0)])
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline', lambda s, days=250: bars)
+        monkeypatch.setattr(quote_provider, 'fetch_etf_quote', lambda s: None)
+        data = logged_in_client.get('/charts/api/etf/562500/chip-data?decays=presets').get_json()
+        assert [s['decay'] for s in data['sweeps']] == list(DECAY_PRESETS)
+        for bad in ('abc', '0.9,2', ','.join(['0.9'] * 3 + [str(0.5 + i / 100) for i in range(9)])):
+            assert logged_in_client.get(f'/charts/api/etf/562500/chip-data?decays={bad}').status_code == 400
+
+
+class TestChipQueryAPI:
+    """GET /charts/api/etf/<symbol>/chip-query 价位查询."""
+
+    def test_queries_served_from_state(self, logged_in_client, monkeypatch):
+        from app.services import quote_provider, chip_distribution
+        from app.services.quote_provider import ETFDailyBar
+        from app.services.bar_series import BarSeries
+
+        bars = BarSeries.from_bars([
+            ETFDailyBar(date='2026-01-02', open=1.0, high=1.10, low=1.00, close=1.05, volume=100000, amount=1.0),
+            ETFDailyBar(date='2026-01-03', open=1.1, high=1.20, low=1.10, close=1.15, volume=100000, amount=1.0),
+        ])
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline', lambda s, days=250: bars)
+        monkeypatch.setattr(quote_provider, 'fetch_etf_quote', lambda s: None)
+        calls = {'n': 0}
+        orig = chip_distribution.compute_chip_distribution
+
+        def spy(*a, **kw):
+            calls['n'] += 1
+            return orig(*a, **kw)
+
+        monkeypatch.setattr(chip_distribution, 'compute_chip_distribution', spy)
+
+        chip = logged_in_client.get('/charts/api/etf/562500/chip-data?decay=1').get_json()
+        metrics = chip['metrics']
+        # 带上 chip-data 的 as_of 后拖动游标既不重算也不读 K 线
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline',
+                            lambda s, days=250: pytest.fail('query must not load klines'))
+        resp = logged_in_client.get(
+            f"/charts/api/etf/562500/chip-query?decay=1&as_of={chip['as_of']}"
+            '&price=1.10&price=2&low=1.0&high=1.1&q=0.5')
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert calls['n'] == 1
+        assert data['as_of'] == chip['as_of']
+        assert data['avg_cost'] == pytest.approx(metrics['avg_cost'])
+        assert [p['profit_ratio'] for p in data['prices']] == pytest.approx([0.5, 1.0], abs=0.01)
+        assert data['percentiles'] == [{'q': 0.5, 'price': pytest.approx(1.10, abs=0.005)}]
+        assert data['range']['ratio'] == pytest.approx(0.5, abs=0.01)
+        assert metrics['cost_p05'] < data['percentiles'][0]['price'] < metrics['cost_p95']
+
+    def test_default_as_of_reads_latest_kline_date(self, logged_in_client, charts_app, charts_db, monkeypatch):
+        from app.services import quote_provider
+        TestChipDataBatchAPI()._seed(charts_app, charts_db, 'SH562500')
+        monkeypatch.setattr(quote_provider, 'fetch_etf_quote', lambda s: None)
+        chip = logged_in_client.get('/charts/api/etf/562500/chip-data').get_json()
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline',
+                            lambda s, days=250: pytest.fail('query must not load klines'))
+        data = logged_in_client.get('/charts/api/etf/562500/chip-query?price=1.02').get_json()
+        assert data['as_of'] == chip['as_of']
+        assert data['avg_cost'] == pytest.approx(chip['metrics']['avg_cost'])
+
+    def test_unknown_kernel_rejected(self, logged_in_client):
+        assert logged_in_client.get('/charts/api/etf/562500/chip-query?kernel=x').status_code == 400
+        assert logged_in_client.get('/charts/api/etf/562500/chip-query?as_of=bad').status_code == 400
+
+
+class TestChipHistoryAPI:
+    """GET /charts/api/etf/<symbol>/chip-history 逐日指标."""
+
+    def _bars(self, count):
+        from app.services.quote_provider import ETFDailyBar
+        from app.services.bar_series import BarSeries
+        from datetime import date, timedelta
+        start = date(2026, 1, 1)
+        return BarSeries.from_bars([
+            ETFDailyBar(date=(start + timedelta(days=i)).isoformat(), open=1.0, high=1.05 + i * 0.002,
+                        low=0.98 + i * 0.001, close=1.02 + i * 0.001, volume=10000 + i, amount=1.0)
+            for i in range(count)
+        ])
+
+    def test_returns_columnar_metrics_and_snapshots(self, logged_in_client, monkeypatch):
+        from app.services import quote_provider
+        requested = []
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline',
+                            lambda s, days=250: requested.append(days) or self._bars(80))
+        resp = logged_in_client.get(
+            '/charts/api/etf/562500/chip-history?days=30&window=40&snapshot_every=5&snapshot_bins=10')
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert requested == [69]
+        assert data['symbol'] == 'SH562500' and data['kernel'] == 'uniform'
+        assert len(data['dates']) == 30 and data['dates'][-1] == '2026-03-21'
+        for key in ('close', 'profit_ratio', 'avg_cost', 'concentration', 'main_peak'):
+            assert len(data[key]) == 30
+        assert len(data['snapshots']['dates']) == 6
+        assert data['snapshots']['dates'][-1] == data['dates'][-1]
+
+    def test_rejects_bad_params(self, logged_in_client):
+        assert logged_in_client.get('/charts/api/etf/562500/chip-history?kernel=x').status_code == 400
+        assert logged_in_client.get('/charts/api/etf/562500/chip-history?days=0').status_code == 400
+        assert logged_in_client.get('/charts/api/etf/562500/chip-history?window=100000').status_code == 400
+        assert logged_in_client.get('/charts/api/etf/562500/chip-history?snapshot_bins=100000').status_code == 400
+
+    def test_no_data_returns_404(self, logged_in_client, monkeypatch):
+        from app.services import quote_provider
+        from app.services.bar_series import BarSeries
+        monkeypatch.setattr(quote_provider, 'fetch_etf_daily_kline', lambda s, days=250: BarSeries.empty())
+        assert logged_in_client.get('/charts/api/etf/562500/chip-history').status_code == 404
+
+
+class TestSourceStatusAPI:
+    """数据源路由状态接口."""
+
+    def test_requires_login(self, charts_client):
+        resp = charts_client.get('/charts/api/sources')
+        assert resp.status_code in (301, 302, 401)
+
+    def test_reports_circuit_state_and_latency(self, logged_in_client):
+        from app.services.source_router import source_router
+        source_router.record('etf_kline:eastmoney', True, 0.25)
+        for _ in range(3):
+            source_router.record('etf_kline:sina', False, 5.0, 'timeout')
+
+        resp = logged_in_client.get('/charts/api/sources')
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert data['sources']['etf_kline:eastmoney']['mean_latency_ms'] == 250.0
+        assert data['sources']['etf_kline:sina']['state'] == 'open'
+        assert data['sources']['etf_kline:sina']['last_error'] == 'timeout'
+        assert 'hit_ratio' in data['quote_cache']
@@ -143,6 +143,16 @@ class TestFindPeaks:
         high_peak = any(1.00 <= p <= 1.10 for p in prices)
         assert low_peak and high_peak
 
+    def test_flat_plateau_counts_as_single_peak(self):
+        """等值平台只产生一个峰，峰位取平台中心。"""
+        from app.services.chip_distribution import find_peaks
+        weights = [0, 0, 5, 5, 5, 5, 5, 0, 0, 0, 3, 0]
+        dist = [(i * 0.1, (i + 1) * 0.1, float(w)) for i, w in enumerate(weights)]
+        peaks = find_peaks(dist, top_k=3, smoothing_window=1)
+        assert len(peaks) == 2
+        assert peaks[0].price == pytest.approx(0.45)
+        assert peaks[1].price == pytest.approx(1.05)
+
     def test_top_k_limits_result_count(self):
         from app.services.chip_distribution import find_peaks, compute_chip_distribution
         bars = [_make_bar(0, high=1.10, low=1.00, volume=1000)]
@@ -266,3 +276,362 @@ class TestAvgCost:
         pct = (current - avg) / avg * 100
         # 现价在区间顶部，平均获利应为正
         assert pct > 0
+
+
+def _reference_distribution(bars, decay=0.97, bin_count=80, price_padding=0.02):
+    """逐桶双循环的原始实现，作为向量化引擎的对照基准。"""
+    lows = [b.low for b in bars if b.volume and b.volume > 0]
+    highs = [b.high for b in bars if b.volume and b.volume > 0]
+    if not lows:
+        return []
+    price_min, price_max = min(lows), max(highs)
+    spread = price_max - price_min
+    if spread < 0.5 and bin_count > 40:
+        bin_count = 40
+    pad = spread * price_padding if spread > 0 else max(price_max * price_padding, 0.01)
+    lo_bound = price_min - pad
+    bin_width = (price_max + pad - lo_bound) / bin_count
+    weights = [0.0] * bin_count
+    for n, bar in enumerate(sorted(bars, key=lambda b: b.date, reverse=True)):
+        if not bar.volume or bar.volume <= 0:
+            continue
+        w = bar.volume * (decay ** n)
+        if bar.high <= bar.low:
+            idx = int(((bar.close or bar.low) - lo_bound) / bin_width)
+            weights[max(0, min(bin_count - 1, idx))] += w
+            continue
+        first = max(0, int((bar.low - lo_bound) / bin_width))
+        last = min(bin_count - 1, int((bar.high - lo_bound) / bin_width))
+        for i in range(first, last + 1):
+            bin_lo = lo_bound + i * bin_width
+            inter = min(bar.high, bin_lo + bin_width) - max(bar.low, bin_lo)
+            if inter > 0:
+                weights[i] += w * inter / (bar.high - bar.low)
+    return [(lo_bound + i * bin_width, lo_bound + (i + 1) * bin_width, weights[i])
+            for i in range(bin_count)]
+
+
+def _random_bars(count: int, seed: int = 7) -> list[ETFDailyBar]:
+    """随机游走 K 线，含停牌日与一字板。"""
+    import random
+    rng = random.Random(seed)
+    price = 1.5
+    bars = []
+    for i in range(count):
+        price = max(0.2, price * (1 + rng.gauss(0, 0.02)))
+        span = abs(rng.gauss(0, 0.02)) * price
+        if i % 37 == 0:
+            span = 0.0   # 一字板
+        low = round(price - span / 2, 3)
+        high = round(price + span / 2, 3)
+        volume = 0 if i % 53 == 0 else rng.randint(1000, 500000)
+        bars.append(_make_bar(count - i, high=high, low=low, close=round(price, 3), volume=volume))
+    return bars
+
+
+class TestVectorizedEngine:
+    """NumPy 引擎与原双循环实现结果一致（浮点容差内）."""
+
+    @pytest.mark.parametrize('count,bins,decay', [
+        (3, 10, 0.97), (30, 80, 0.97), (250, 80, 0.9), (600, 400, 0.99), (2000, 120, 1.0),
+    ])
+    def test_matches_reference_loop(self, count, bins, decay):
+        from app.services.chip_distribution import compute_chip_distribution
+        bars = _random_bars(count)
+        got = compute_chip_distribution(bars, decay=decay, bin_count=bins)
+        want = _reference_distribution(bars, decay=decay, bin_count=bins)
+        assert len(got) == len(want)
+        scale = max(w for _, _, w in want)
+        for (g_lo, g_hi, g_w), (w_lo, w_hi, w_w) in zip(got, want):
+            assert g_lo == pytest.approx(w_lo, abs=1e-12)
+            assert g_hi == pytest.approx(w_hi, abs=1e-12)
+            assert g_w == pytest.approx(w_w, abs=scale * 1e-9)
+
+    def test_returns_plain_python_floats(self):
+        """结果可直接 jsonify（不泄漏 numpy 标量类型）。"""
+        from app.services.chip_distribution import compute_chip_distribution
+        dist = compute_chip_distribution(_random_bars(20), bin_count=10)
+        assert all(type(v) is float for entry in dist for v in entry)
+
+    def test_all_zero_volume_returns_empty(self):
+        from app.services.chip_distribution import compute_chip_distribution
+        bars = [_make_bar(i, high=1.1, low=1.0, volume=0) for i in range(3)]
+        assert compute_chip_distribution(bars) == []
+
+    def test_long_history_many_bins_conserves_volume(self):
+        """2500 根 K 线 × 400 桶：不衰减时总权重等于总成交量。"""
+        from app.services.chip_distribution import compute_chip_distribution
+        bars = _random_bars(2500, seed=11)
+        dist = compute_chip_distribution(bars, decay=1.0, bin_count=400)
+        assert len(dist) == 400
+        total = sum(w for _, _, w in dist)
+        assert total == pytest.approx(sum(b.volume for b in bars), rel=1e-9)
+
+
+class TestDecaySweep:
+    """compute_chip_distributions: 多个 decay 一次算完."""
+
+    @pytest.mark.parametrize('kernel', ['uniform', 'triangular'])
+    def test_matches_single_decay(self, kernel):
+        from app.services.chip_distribution import compute_chip_distribution, compute_chip_distributions
+        bars = _random_bars(400, seed=9)
+        decays = [0.9, 0.97, 0.99, 1.0]
+        sweep = compute_chip_distributions(bars, decays, bin_count=120, kernel=kernel)
+        assert len(sweep) == len(decays)
+        for decay, got in zip(decays, sweep):
+            want = compute_chip_distribution(bars, decay=decay, bin_count=120, kernel=kernel)
+            assert [(lo, hi) for lo, hi, _ in got] == [(lo, hi) for lo, hi, _ in want]
+            scale = max(w for _, _, w in want)
+            assert [w for _, _, w in got] == pytest.approx([w for _, _, w in want], abs=scale * 1e-8)
+
+    def test_no_volume_returns_empty_per_decay(self):
+        from app.services.chip_distribution import compute_chip_distributions
+        bars = [_make_bar(i, high=1.1, low=1.0, volume=0) for i in range(3)]
+        assert compute_chip_distributions(bars, [0.9, 0.97]) == [[], []]
+
+
+class TestAdvanceDistribution:
+    """advance_distribution: 衰减分布 O(bins) 前推一天."""
+
+    @staticmethod
+    def _bounded_bars(count):
+        """每个窗口内都同时含最低价 1.00 和最高价 1.20，网格保持不变。"""
+        bars = []
+        for i in range(count):
+            if i % 2 == 0:
+                bars.append(_make_bar(count - i, high=1.10 + i * 0.001, low=1.00, volume=1000 + i * 10))
+            else:
+                bars.append(_make_bar(count - i, high=1.20, low=1.05 + i * 0.001, volume=2000 - i * 10))
+        return bars
+
+    def test_matches_full_recompute_over_sliding_window(self):
+        import numpy as np
+        from app.services.chip_distribution import compute_chip_distribution, advance_distribution
+        window = 6
+        bars = self._bounded_bars(20)
+        dist = compute_chip_distribution(bars[:window], decay=0.9, bin_count=30)
+        lo_bound, bin_width = dist[0][0], dist[0][1] - dist[0][0]
+        weights = np.array([w for _, _, w in dist])
+
+        for t in range(window, len(bars)):
+            weights = advance_distribution(
+                weights, lo_bound, bin_width, bars[t], bars[t - window], decay=0.9, window=window,
+            )
+            assert weights is not None
+            want = compute_chip_distribution(bars[t - window + 1:t + 1], decay=0.9, bin_count=30)
+            assert [w for _, _, w in want] == pytest.approx(weights.tolist(), abs=1e-6)
+
+    def test_breakout_returns_none(self):
+        import numpy as np
+        from app.services.chip_distribution import compute_chip_distribution, advance_distribution
+        bars = self._bounded_bars(4)
+        dist = compute_chip_distribution(bars, bin_count=20)
+        weights = np.array([w for _, _, w in dist])
+        breakout = _make_bar(0, high=1.50, low=1.30, volume=1000)
+        assert advance_distribution(weights, dist[0][0], dist[0][1] - dist[0][0], breakout) is None
+
+    def test_zero_volume_day_only_decays(self):
+        import numpy as np
+        from app.services.chip_distribution import compute_chip_distribution, advance_distribution
+        bars = self._bounded_bars(4)
+        dist = compute_chip_distribution(bars, decay=0.9, bin_count=20)
+        weights = np.array([w for _, _, w in dist])
+        halted = _make_bar(0, high=9.0, low=8.0, volume=0)
+        out = advance_distribution(weights, dist[0][0], dist[0][1] - dist[0][0], halted, decay=0.9, window=10)
+        assert out.tolist() == pytest.approx((weights * 0.9).tolist())
+
+
+def _reference_kernel(bars, kernel, decay=0.97, bin_count=80, samples=400):
+    """对三角密度逐桶数值积分（中点法细分），作为 kernel 实现的对照。"""
+    import numpy as np
+    from app.services.chip_distribution import compute_chip_distribution
+    grid = compute_chip_distribution(bars, decay=decay, bin_count=bin_count)
+    lo_bound, bin_width = grid[0][0], grid[0][1] - grid[0][0]
+    weights = np.zeros(len(grid))
+    for n, bar in enumerate(sorted(bars, key=lambda b: b.date, reverse=True)):
+        if not bar.volume:
+            continue
+        w = bar.volume * decay ** n
+        if bar.high <= bar.low:
+            idx = int(((bar.close or bar.low) - lo_bound) / bin_width)
+            weights[max(0, min(len(grid) - 1, idx))] += w
+            continue
+        apex = bar.close if kernel == 'triangular' else (bar.high + bar.low + bar.close) / 3
+        apex = min(max(apex, bar.low), bar.high)
+        xs = bar.low + (np.arange(samples) + 0.5) * (bar.high - bar.low) / samples
+        density = np.where(
+            xs <= apex,
+            (xs - bar.low) / max(apex - bar.low, 1e-300),
+            (bar.high - xs) / max(bar.high - apex, 1e-300),
+        )
+        density = np.clip(density, 0, 1)
+        idx = np.clip(((xs - lo_bound) / bin_width).astype(int), 0, len(grid) - 1)
+        np.add.at(weights, idx, w * density / density.sum())
+    return weights
+
+
+class TestKernels:
+    """triangular / typical 分布形状."""
+
+    @pytest.mark.parametrize('kernel', ['uniform', 'triangular', 'typical'])
+    def test_conserves_volume(self, kernel):
+        from app.services.chip_distribution import compute_chip_distribution
+        bars = _random_bars(800, seed=3)
+        dist = compute_chip_distribution(bars, decay=1.0, bin_count=200, kernel=kernel)
+        assert sum(w for _, _, w in dist) == pytest.approx(sum(b.volume for b in bars), rel=1e-9)
+
+    @pytest.mark.parametrize('kernel', ['uniform', 'triangular', 'typical'])
+    def test_no_negative_weights(self, kernel):
+        """前缀和的浮点误差不会在空桶留下负权重。"""
+        from app.services.chip_distribution import compute_chip_distribution
+        dist = compute_chip_distribution(_random_bars(2500, seed=11), bin_count=400, kernel=kernel)
+        assert min(w for _, _, w in dist) >= 0.0
+
+    @pytest.mark.parametrize('kernel', ['triangular', 'typical'])
+    def test_matches_numeric_integration(self, kernel):
+        from app.services.chip_distribution import compute_chip_distribution
+        bars = _random_bars(60, seed=5)
+        got = [w for _, _, w in compute_chip_distribution(bars, bin_count=40, kernel=kernel)]
+        want = _reference_kernel(bars, kernel, bin_count=40, samples=4000)
+        assert got == pytest.approx(want.tolist(), abs=max(want) * 2e-3)
+
+    def test_triangular_peaks_at_close(self):
+        from app.services.chip_distribution import compute_chip_distribution
+        bars = [_make_bar(0, high=2.0, low=1.0, close=1.8, volume=1000)]
+        dist = compute_chip_distribution(bars, bin_count=20, kernel='triangular')
+        lo, hi, _ = max(dist, key=lambda d: d[2])
+        assert lo <= 1.8 <= hi
+
+    def test_advance_matches_full_recompute(self):
+        import numpy as np
+        from app.services.chip_distribution import compute_chip_distribution, advance_distribution
+        window = 6
+        bars = TestAdvanceDistribution._bounded_bars(16)
+        dist = compute_chip_distribution(bars[:window], decay=0.9, bin_count=30, kernel='typical')
+        lo_bound, bin_width = dist[0][0], dist[0][1] - dist[0][0]
+        weights = np.array([w for _, _, w in dist])
+        for t in range(window, len(bars)):
+            weights = advance_distribution(
+                weights, lo_bound, bin_width, bars[t], bars[t - window],
+                decay=0.9, window=window, kernel='typical',
+            )
+            want = compute_chip_distribution(bars[t - window + 1:t + 1], decay=0.9, bin_count=30, kernel='typical')
+            assert [w for _, _, w in want] == pytest.approx(weights.tolist(), abs=1e-6)
+
+    def test_unknown_kernel_raises(self):
+        from app.services.chip_distribution import compute_chip_distribution
+        with pytest.raises(ValueError):
+            compute_chip_distribution(_random_bars(5), kernel='gaussian')
+
+
+class TestChipHistory:
+    """compute_chip_history: 一次前推得到逐日指标."""
+
+    @pytest.mark.parametrize('kernel', ['uniform', 'typical'])
+    def test_matches_per_day_recompute(self, kernel):
+        from app.services.chip_distribution import (
+            compute_chip_history, compute_chip_distribution, compute_profit_ratio,
+            compute_avg_cost, compute_concentration, find_peaks,
+        )
+        # 每个窗口都含 1.00 / 1.20，逐日全量计算与共用网格一致
+        bars = TestAdvanceDistribution._bounded_bars(20)
+        window, days = 6, 10
+        history = compute_chip_history(bars, days, window=window, decay=0.9, bin_count=30, kernel=kernel)
+        assert len(history.dates) == days
+        for i, day in enumerate(history.dates):
+            end = len(bars) - days + i + 1
+            assert day == bars[end - 1].date
+            dist = compute_chip_distribution(bars[end - window:end], decay=0.9, bin_count=30, kernel=kernel)
+            close = bars[end - 1].close
+            assert history.profit_ratio[i] == pytest.approx(compute_profit_ratio(dist, close), abs=1e-9)
+            assert history.avg_cost[i] == pytest.approx(compute_avg_cost(dist), abs=1e-9)
+            assert history.concentration[i] == pytest.approx(compute_concentration(dist, close), abs=1e-9)
+            assert history.main_peak[i] == pytest.approx(find_peaks(dist, top_k=1)[0].price)
+
+    def test_short_history_starts_from_first_bar(self):
+        from app.services.chip_distribution import compute_chip_history, compute_avg_cost, compute_chip_distribution
+        bars = TestAdvanceDistribution._bounded_bars(5)
+        history = compute_chip_history(bars, 30, window=250)
+        assert len(history.dates) == 5
+        assert history.avg_cost[-1] == pytest.approx(compute_avg_cost(compute_chip_distribution(bars)))
+
+    def test_chunked_spreads_match_single_block(self, monkeypatch):
+        """摊分矩阵按块计算（块边界落在窗口中间）与一次算完结果一致。"""
+        from app.services import chip_distribution
+        bars = _random_bars(300, seed=9)
+        whole = chip_distribution.compute_chip_history(bars, 120, window=90, bin_count=50, snapshot_every=7)
+        monkeypatch.setattr(chip_distribution, '_HISTORY_CHUNK_CELLS', 50 * 13)
+        chunked = chip_distribution.compute_chip_history(bars, 120, window=90, bin_count=50, snapshot_every=7)
+        assert chunked.dates == whole.dates
+        assert chunked.profit_ratio == pytest.approx(whole.profit_ratio, abs=1e-9)
+        assert chunked.concentration == pytest.approx(whole.concentration, abs=1e-9)
+        assert chunked.avg_cost == pytest.approx(whole.avg_cost, rel=1e-9)
+        for got, want in zip(chunked.snapshot_weights, whole.snapshot_weights):
+            assert got == pytest.approx(want, rel=1e-9, abs=max(want) * 1e-9)
+
+    def test_snapshots_every_k_days_end_on_last_day(self):
+        from app.services.chip_distribution import compute_chip_history
+        bars = _random_bars(120)
+        history = compute_chip_history(bars, 50, window=60, bin_count=80, snapshot_every=10, snapshot_bins=20)
+        assert history.snapshot_dates == history.dates[9::10]
+        assert len(history.snapshot_edges) == 21
+        assert all(len(w) == 20 for w in history.snapshot_weights)
+
+    def test_zero_volume_returns_none(self):
+        from app.services.chip_distribution import compute_chip_history
+        bars = [_make_bar(i, high=1.1, low=1.0, volume=0) for i in range(3)]
+        assert compute_chip_history(bars, 3) is None
+
+
+class TestChipIndex:
+    """ChipIndex: 前缀和上的价位查询."""
+
+    @staticmethod
+    def _index():
+        from app.services.chip_distribution import ChipIndex
+        # 桶 [1.0, 1.1) 权重 1、[1.1, 1.2) 权重 3、[1.2, 1.3) 权重 0、[1.3, 1.4) 权重 4
+        return ChipIndex.from_distribution([
+            (1.0, 1.1, 1.0), (1.1, 1.2, 3.0), (1.2, 1.3, 0.0), (1.3, 1.4, 4.0),
+        ])
+
+    def test_weight_below_interpolates_within_bin(self):
+        index = self._index()
+        assert index.total == 8.0
+        assert index.weight_below(0.5) == 0.0
+        assert index.weight_below(1.15) == pytest.approx(2.5)
+        assert index.weight_below(1.25) == pytest.approx(4.0)
+        assert index.weight_below(9.0) == 8.0
+        assert index.weight_between(1.05, 1.35) == pytest.approx(5.5)
+
+    def test_percentile_inverts_weight_below(self):
+        index = self._index()
+        assert index.percentile(0.0) == pytest.approx(1.0)
+        assert index.percentile(0.5) == pytest.approx(1.2)     # 恰好用完前两桶，取空桶之前的边界
+        assert index.percentile(1.0) == pytest.approx(1.4)
+        for q in (0.05, 0.3, 0.62, 0.95):
+            assert index.weight_below(index.percentile(q)) == pytest.approx(q * 8.0)
+
+    def test_avg_cost_in_range(self):
+        index = self._index()
+        assert index.avg_cost() == pytest.approx((1.05 * 1 + 1.15 * 3 + 1.35 * 4) / 8)
+        # [1.1, 1.15]：半个桶，成本取所覆盖那段的中点
+        assert index.avg_cost(1.1, 1.15) == pytest.approx(1.125)
+        assert index.avg_cost(1.2, 1.3) is None
+
+    def test_matches_list_functions(self):
+        from app.services.chip_distribution import (
+            ChipIndex, compute_chip_distribution, compute_profit_ratio, compute_concentration, compute_avg_cost,
+        )
+        dist = compute_chip_distribution(_random_bars(300), bin_count=120)
+        index = ChipIndex.from_distribution(dist)
+        for price in (0.5, 1.2, 1.5, 1.8, 5.0):
+            assert index.profit_ratio(price) == compute_profit_ratio(dist, price)
+            assert index.concentration(price, 0.03) == compute_concentration(dist, price, band_pct=0.03)
+        assert index.avg_cost() == compute_avg_cost(dist)
+
+    def test_empty_distribution(self):
+        from app.services.chip_distribution import ChipIndex
+        index = ChipIndex.from_distribution([])
+        assert index.total == 0.0
+        assert index.profit_ratio(1.0) == 0.0 and index.concentration(1.0) == 0.0
+        assert index.percentile(0.5) is None and index.avg_cost() is None
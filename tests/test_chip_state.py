@@ -0,0 +1,142 @@
+"""筹码分布增量状态测试：入库前推 + 请求读取."""
+import pytest
+from datetime import date, timedelta
+
+
+def _patch_http_get(monkeypatch, fake_get):
+    """替换默认 QuoteClient 共享 Session 的 get（所有远端请求都经由它）。"""
+    from app.services import quote_provider
+    monkeypatch.setattr(quote_provider.get_quote_client().session, "get", fake_get)
+
+
+def _add_rows(db, symbol, start, count, low=1.00, high=1.20):
+    """按天写入 count 根 K 线，偶数日贴下沿、奇数日贴上沿。"""
+    from app.models.etf_kline_cache import EtfKlineCache
+    rows = []
+    for i in range(count):
+        d = start + timedelta(days=i)
+        lo, hi = (low, low + 0.1) if i % 2 == 0 else (high - 0.1, high)
+        rows.append(EtfKlineCache(
+            symbol=symbol, date=d, open=lo, high=hi, low=lo, close=(lo + hi) / 2,
+            volume=1000 + i, amount=1000.0,
+        ))
+    db.session.add_all(rows)
+    db.session.commit()
+    return [r.date for r in rows]
+
+
+class TestChipState:
+
+    def test_save_and_get_round_trip(self, db):
+        from app.services import chip_state, chip_distribution
+        from app.models.etf_kline_cache import EtfKlineCache
+        _add_rows(db, 'SH562500', date(2026, 1, 1), 10)
+        rows = EtfKlineCache.get_recent('SH562500', 10)
+        dist = chip_distribution.compute_chip_distribution(rows, decay=0.97, bin_count=30)
+
+        chip_state.save_distribution('SH562500', 0.97, 30, 10, rows[-1].date, dist)
+        got = chip_state.get_distribution('SH562500', 0.97, 30, 10, rows[-1].date)
+        assert [w for _, _, w in got] == pytest.approx([w for _, _, w in dist])
+        assert got[0][0] == pytest.approx(dist[0][0])
+
+    def test_get_returns_none_when_stale_or_missing(self, db):
+        from app.services import chip_state
+        assert chip_state.get_distribution('SH562500', 0.97, 30, 10, date(2026, 1, 1)) is None
+        chip_state.save_distribution('SH562500', 0.97, 30, 10, date(2026, 1, 1), [(1.0, 1.1, 5.0)])
+        assert chip_state.get_distribution('SH562500', 0.97, 30, 10, date(2026, 1, 2)) is None
+
+    def test_advance_matches_full_recompute(self, db):
+        """新 K 线入库后状态推进到最新日期，结果与窗口全量计算一致。"""
+        from app.services import chip_state, chip_distribution
+        from app.models.etf_kline_cache import EtfKlineCache
+        _add_rows(db, 'SH562500', date(2026, 1, 1), 8)
+        rows = EtfKlineCache.get_recent('SH562500', 6)
+        dist = chip_distribution.compute_chip_distribution(rows, decay=0.9, bin_count=20)
+        chip_state.save_distribution('SH562500', 0.9, 20, 6, rows[-1].date, dist)
+
+        new_dates = []
+        for i, d in enumerate([date(2026, 1, 9), date(2026, 1, 10), date(2026, 1, 11)]):
+            lo, hi = (1.02, 1.15) if i % 2 else (1.00, 1.20)
+            db.session.add(EtfKlineCache(symbol='SH562500', date=d, open=lo, high=hi, low=lo, close=hi,
+                                         volume=5000, amount=1.0))
+            new_dates.append(d)
+        db.session.commit()
+
+        assert chip_state.advance_states('SH562500', new_dates) == 1
+        got = chip_state.get_distribution('SH562500', 0.9, 20, 6, date(2026, 1, 11))
+        assert got is not None
+        want = chip_distribution.compute_chip_distribution(
+            EtfKlineCache.get_recent('SH562500', 6), decay=0.9, bin_count=20)
+        assert [w for _, _, w in got] == pytest.approx([w for _, _, w in want], rel=1e-9)
+
+    def test_breakout_regrids(self, db):
+        from app.services import chip_state
+        from app.models.etf_kline_cache import EtfKlineCache
+        _add_rows(db, 'SH562500', date(2026, 1, 1), 5)
+        rows = EtfKlineCache.get_recent('SH562500', 5)
+        from app.services.chip_distribution import compute_chip_distribution
+        chip_state.save_distribution('SH562500', 0.97, 20, 5, rows[-1].date,
+                                     compute_chip_distribution(rows, bin_count=20))
+
+        db.session.add(EtfKlineCache(symbol='SH562500', date=date(2026, 1, 6), open=2.0, high=2.1,
+                                     low=1.9, close=2.0, volume=1000, amount=1.0))
+        db.session.commit()
+        chip_state.advance_states('SH562500', [date(2026, 1, 6)])
+
+        got = chip_state.get_distribution('SH562500', 0.97, 20, 5, date(2026, 1, 6))
+        assert got[-1][1] > 2.1
+
+    def test_extra_params_capped_per_symbol(self, db):
+        """页面可选参数总是持久化；其余参数每个 symbol 最多 MAX_EXTRA_STATES 组。"""
+        from app.services import chip_state
+        from app.models.etf_chip_state import EtfChipState
+        dist = [(1.0, 1.1, 5.0)]
+        for i in range(chip_state.MAX_EXTRA_STATES):
+            assert chip_state.save_distribution('SH562500', 0.9, 30 + i, 10, date(2026, 1, 1), dist)
+        assert not chip_state.save_distribution('SH562500', 0.9, 99, 10, date(2026, 1, 1), dist)
+        assert chip_state.save_distribution('SH562500', 0.9, 99, 10, date(2026, 1, 1), dist, force=True)
+        assert chip_state.save_distribution('SH562500', 0.97, 80, 250, date(2026, 1, 1), dist)
+        # 已有状态照常覆盖；其他 symbol 不受影响
+        assert chip_state.save_distribution('SH562500', 0.9, 30, 10, date(2026, 1, 2), dist)
+        assert chip_state.save_distribution('SH510300', 0.9, 99, 10, date(2026, 1, 1), dist)
+        assert len(EtfChipState.for_symbol('SH562500')) == chip_state.MAX_EXTRA_STATES + 2
+
+    def test_prune_stale_removes_unviewed_states(self, db):
+        from datetime import datetime
+        from app.services import chip_state
+        from app.models.etf_chip_state import EtfChipState
+        dist = [(1.0, 1.1, 5.0)]
+        for bins in (40, 80, 120):
+            chip_state.save_distribution('SH562500', 0.97, bins, 250, date(2026, 1, 1), dist)
+        now = datetime(2026, 3, 1)
+        EtfChipState.get('SH562500', 0.97, 40, 250).viewed_at = now - timedelta(days=40)
+        EtfChipState.get('SH562500', 0.97, 80, 250).viewed_at = now - timedelta(days=3)
+        EtfChipState.get('SH562500', 0.97, 120, 250).created_at = now - timedelta(days=40)
+        db.session.commit()
+
+        assert chip_state.prune_stale(30, now=now) == 2
+        assert [s.bin_count for s in EtfChipState.for_symbol('SH562500')] == [80]
+
+    def test_kline_fetch_advances_existing_state(self, db, monkeypatch):
+        """fetch_etf_daily_kline 写入新 K 线后自动推进状态。"""
+        from app.services import quote_provider, chip_state
+        from app.models.etf_kline_cache import EtfKlineCache
+        _add_rows(db, 'SH562500', date(2026, 1, 1), 4)
+        rows = EtfKlineCache.get_recent('SH562500', 250)
+        from app.services.chip_distribution import compute_chip_distribution
+        chip_state.save_distribution('SH562500', 0.97, 80, 250, rows[-1].date,
+                                     compute_chip_distribution(rows))
+
+        class FakeResponse:
+            def raise_for_status(self):
+                return
+
+            def json(self):
+                return {"data": {"name": "X", "klines": [
+                    "2026-01-05,1.05,1.10,1.15,1.02,3000,3000,0,0,0,0",
+                ]}}
+
+        _patch_http_get(monkeypatch, lambda *a, **kw: FakeResponse())
+        quote_provider.fetch_etf_daily_kline('562500', days=250)
+
+        assert chip_state.get_distribution('SH562500', 0.97, 80, 250, date(2026, 1, 5)) is not None
@@ -0,0 +1,87 @@
+"""fund_nav_history 表结构测试：唯一索引、日期列、upsert、旧库迁移."""
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import inspect, text
+
+
+def _add_fund(db, code='000001', nav=None):
+    from app.models import Fund
+    fund = Fund(code=code, name=f"基金{code}", fund_type='混合型', latest_nav=nav)
+    db.session.add(fund)
+    db.session.commit()
+    return fund
+
+
+class TestSchema:
+
+    def test_unique_index_on_fund_and_date(self, db):
+        indexes = inspect(db.engine).get_indexes('fund_nav_history')
+        uq = [ix for ix in indexes if ix['name'] == 'uq_fund_nav_history_fund_date']
+        assert uq and uq[0]['unique'] and uq[0]['column_names'] == ['fund_id', 'date']
+
+    def test_date_round_trips_as_pure_date(self, db):
+        from app.models import FundNavHistory
+        fund = _add_fund(db)
+        db.session.add(FundNavHistory(fund_id=fund.id, nav=1.0, date=date(2026, 5, 8)))
+        db.session.commit()
+        assert FundNavHistory.query.first().date == date(2026, 5, 8)
+        assert FundNavHistory.get_nav_by_date(fund.id, datetime(2026, 5, 8, 15, 30)).nav == 1.0
+
+
+class TestUpsert:
+
+    def test_upsert_inserts_then_overwrites(self, db):
+        from app.models import FundNavHistory
+        fund = _add_fund(db)
+        FundNavHistory.upsert(fund.id, datetime(2026, 5, 8, 20, 0), 1.10)
+        FundNavHistory.upsert(fund.id, date(2026, 5, 8), 1.12)
+        db.session.commit()
+        rows = FundNavHistory.query.all()
+        assert [(r.date, r.nav) for r in rows] == [(date(2026, 5, 8), 1.12)]
+
+    def test_apply_nav_result_twice_keeps_one_row(self, db):
+        from app.models import FundNavHistory
+        from app.services.crawler import apply_nav_result
+        fund = _add_fund(db, nav=1.0)
+        result = {'nav': 1.05, 'date': '2026-05-08', 'name': None, 'fund_type': None, 'source': 'lsjz'}
+        assert apply_nav_result(fund.code, result)
+        assert apply_nav_result(fund.code, dict(result, nav=1.06))
+        rows = FundNavHistory.query.filter_by(fund_id=fund.id).all()
+        assert [(r.date, r.nav) for r in rows] == [(date(2026, 5, 8), 1.06)]
+
+
+class TestMigration:
+
+    @pytest.fixture
+    def legacy_db(self, db):
+        """把 fund_nav_history 还原成旧结构：DateTime 文本、无唯一索引、含重复行。"""
+        fund = _add_fund(db)
+        with db.engine.begin() as conn:
+            conn.execute(text("DROP INDEX uq_fund_nav_history_fund_date"))
+            for i, (d, nav) in enumerate([
+                ('2026-05-07 00:00:00.000000', 1.00),
+                ('2026-05-08 00:00:00.000000', 1.01),
+                ('2026-05-08 15:30:12.000000', 1.02),
+            ], 1):
+                conn.execute(
+                    text("INSERT INTO fund_nav_history (id, fund_id, nav, date) VALUES (:i, :f, :n, :d)"),
+                    {'i': i, 'f': fund.id, 'n': nav, 'd': d},
+                )
+        return fund
+
+    def test_normalizes_dedupes_and_indexes(self, db, legacy_db):
+        from app.migrations import upgrade_fund_nav_history
+        from app.models import FundNavHistory
+
+        assert upgrade_fund_nav_history() == 1
+
+        rows = FundNavHistory.query.order_by(FundNavHistory.date).all()
+        assert [(r.date, r.nav) for r in rows] == [(date(2026, 5, 7), 1.00), (date(2026, 5, 8), 1.02)]
+        names = {ix['name'] for ix in inspect(db.engine).get_indexes('fund_nav_history')}
+        assert 'uq_fund_nav_history_fund_date' in names
+
+    def test_is_idempotent(self, db, legacy_db):
+        from app.migrations import upgrade_fund_nav_history
+        upgrade_fund_nav_history()
+        assert upgrade_fund_nav_history() == 0
@@ -0,0 +1,157 @@
+"""上游 HTTP 响应缓存测试：缓存键、TTL、条件请求、内容去重、解析去重."""
+import os
+
+import pytest
+import requests
+
+
+class _Upstream:
+    """替换 HTTPAdapter.send：按队列返回响应，并记录收到的请求头。"""
+
+    def __init__(self, monkeypatch):
+        self.responses = []
+        self.requests = []
+        monkeypatch.setattr(requests.adapters.HTTPAdapter, 'send',
+                            lambda adapter, request, **kwargs: self._send(request))
+
+    def reply(self, body=b'', status=200, headers=None):
+        self.responses.append((body, status, headers or {}))
+
+    def _send(self, request):
+        self.requests.append(request)
+        body, status, headers = self.responses.pop(0)
+        response = requests.Response()
+        response.status_code = status
+        response._content = body
+        response._content_consumed = True
+        response.headers = requests.structures.CaseInsensitiveDict(headers)
+        response.url = request.url
+        response.request = request
+        return response
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    return _Upstream(monkeypatch)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    from app.services.http_cache import HttpCache
+    return HttpCache(str(tmp_path / 'http'), ttls={'fund.eastmoney.com': 300})
+
+
+@pytest.fixture
+def session(cache):
+    from app.services.http_cache import CachingAdapter
+    s = requests.Session()
+    s.mount('http://', CachingAdapter(cache=cache))
+    return s
+
+
+def test_cache_key_normalizes_url():
+    from app.services.http_cache import cache_key
+    a = cache_key('get', 'HTTP://Fund.Eastmoney.com/js?b=2&a=1&rt=1700000000')
+    b = cache_key('GET', 'http://fund.eastmoney.com/js?a=1&b=2&rt=1800000000')
+    assert a == b == 'GET http://fund.eastmoney.com/js?a=1&b=2'
+
+
+class TestCachingAdapter:
+
+    def test_configured_ttl_serves_from_disk(self, upstream, session):
+        upstream.reply(b'<html>nav 1.23</html>')
+        first = session.get('http://fund.eastmoney.com/000001.html')
+        second = session.get('http://fund.eastmoney.com/000001.html')
+        assert second.text == first.text == '<html>nav 1.23</html>'
+        assert second.headers['X-Cache'] == 'HIT'
+        assert len(upstream.requests) == 1
+
+    def test_unconfigured_host_without_headers_not_cached(self, upstream, session):
+        upstream.reply(b'a')
+        upstream.reply(b'b')
+        assert session.get('http://example.com/x').text == 'a'
+        assert session.get('http://example.com/x').text == 'b'
+
+    def test_etag_revalidation(self, upstream, session):
+        upstream.reply(b'payload', headers={'ETag': '"v1"'})
+        upstream.reply(status=304, headers={'ETag': '"v1"'})
+        session.get('http://example.com/kline')
+        resp = session.get('http://example.com/kline')
+        assert resp.status_code == 200 and resp.text == 'payload'
+        assert resp.headers['X-Cache'] == 'REVALIDATED'
+        assert upstream.requests[1].headers['If-None-Match'] == '"v1"'
+
+    def test_cache_control_overrides_configured_ttl(self, upstream, session):
+        upstream.reply(b'a', headers={'Cache-Control': 'no-store'})
+        upstream.reply(b'b', headers={'Cache-Control': 'max-age=0'})
+        upstream.reply(b'c')
+        assert session.get('http://fund.eastmoney.com/1.html').text == 'a'
+        assert session.get('http://fund.eastmoney.com/1.html').text == 'b'
+        assert session.get('http://fund.eastmoney.com/1.html').text == 'c'
+
+    def test_expired_entry_refetched(self, upstream, session, cache):
+        upstream.reply(b'old')
+        upstream.reply(b'new')
+        session.get('http://fund.eastmoney.com/1.html')
+        cache._clock = lambda: 4_000_000_000.0
+        assert session.get('http://fund.eastmoney.com/1.html').text == 'new'
+
+    def test_identical_bodies_stored_once(self, upstream, session, cache):
+        upstream.reply(b'same page')
+        upstream.reply(b'same page')
+        session.get('http://fund.eastmoney.com/1.html')
+        session.get('http://fund.eastmoney.com/2.html')
+        assert len(os.listdir(os.path.join(cache.root, 'entries'))) == 2
+        assert len(os.listdir(os.path.join(cache.root, 'bodies'))) == 1
+
+    def test_prune_keeps_disk_under_budget(self, upstream, session, cache):
+        cache.max_bytes = 1
+        upstream.reply(os.urandom(2000))
+        session.get('http://fund.eastmoney.com/1.html')
+        cache.prune()
+        assert os.listdir(os.path.join(cache.root, 'bodies')) == []
+        upstream.reply(b'again')
+        assert session.get('http://fund.eastmoney.com/1.html').text == 'again'
+
+    def test_disabled_cache_passes_through(self, upstream):
+        from app.services.http_cache import CachingAdapter, HttpCache
+        s = requests.Session()
+        s.mount('http://', CachingAdapter(cache=HttpCache(None)))
+        upstream.reply(b'a')
+        upstream.reply(b'b')
+        s.get('http://fund.eastmoney.com/1.html')
+        assert s.get('http://fund.eastmoney.com/1.html').text == 'b'
+
+    def test_crawler_without_session_goes_through_cache(self, upstream, cache, monkeypatch):
+        """单只基金更新（不传 session）同样经 CachingAdapter。"""
+        from app.services import crawler
+        from app.services.http_cache import CachingAdapter
+        monkeypatch.setattr(crawler, '_default_session', None)
+        session = crawler.default_session()
+        assert crawler.default_session() is session
+        adapter = session.get_adapter(crawler.EASTMONEY_FUND_URL.format(code='000001'))
+        assert isinstance(adapter, CachingAdapter)
+
+        monkeypatch.setattr(adapter, 'cache', cache)
+        upstream.reply(b'<html>nav 1.23</html>')
+        assert crawler.fetch_fund_page('000001') == crawler.fetch_fund_page('000001') == '<html>nav 1.23</html>'
+        assert len(upstream.requests) == 1
+
+
+class TestParseMemo:
+
+    def test_unchanged_page_skips_parsing(self):
+        from app.services.crawler import NavSource, parse_memo, parse_page
+        calls = []
+
+        def parse(text):
+            calls.append(text)
+            return {'nav': 1.0, 'source': 'fake'}
+
+        source = NavSource('fake', 'http://x/{code}', None, parse, False)
+        first = parse_page(source, '<html>1.0</html>')
+        first['code'] = '000001'
+        assert parse_page(source, '<html>1.0</html>') == {'nav': 1.0, 'source': 'fake'}
+        parse_page(source, '<html>1.1</html>')
+        assert len(calls) == 2
+        assert parse_memo.hits == 1
@@ -0,0 +1,130 @@
+"""收盘后 ETF 日 K 预取：目标收集、有界并发刷新、筹码分布预计算."""
+from datetime import date, datetime, timedelta
+
+
+def _add_position(db, code):
+    from app.models import Fund, Position, User
+    user = User.query.first()
+    if user is None:
+        user = User(username='u', password='x', is_main_account=True)
+        db.session.add(user)
+        db.session.commit()
+    fund = Fund(code=code, name=f'基金{code}')
+    db.session.add(fund)
+    db.session.commit()
+    db.session.add(Position(user_id=user.id, fund_id=fund.id, shares=100, cost_price=1.0))
+    db.session.commit()
+
+
+def _add_klines(db, symbol, end, count):
+    from app.models.etf_kline_cache import EtfKlineCache
+    for i in range(count):
+        p = 1.0 + (i % 5) * 0.02
+        db.session.add(EtfKlineCache(
+            symbol=symbol, date=end - timedelta(days=count - 1 - i),
+            open=p, high=p + 0.05, low=p - 0.03, close=p, volume=1000 + i, amount=1.0,
+        ))
+    db.session.commit()
+
+
+def _add_state(db, symbol, decay, bins, window, viewed_at):
+    from app.models import EtfChipState
+    db.session.add(EtfChipState(
+        symbol=symbol, decay=decay, bin_count=bins, window_days=window, last_date=date(2026, 1, 1),
+        lo_bound=1.0, bin_width=0.01, weights=b'\x00' * 8, viewed_at=viewed_at,
+    ))
+    db.session.commit()
+
+
+class TestCollectTargets:
+
+    def test_positions_pairs_and_recent_views(self, app, db):
+        from app.services.kline_prefetch import collect_prefetch_targets, DEFAULT_CHIP_PARAMS
+        _add_position(db, '510300')
+        _add_position(db, '000001')          # 场外基金不预取
+        now = datetime(2026, 3, 10, 8, 0)
+        _add_state(db, 'SZ159915', 0.9, 40, 120, now - timedelta(days=2))
+        _add_state(db, 'SH588000', 0.97, 80, 250, now - timedelta(days=30))
+
+        targets = collect_prefetch_targets(recent_days=7, now=now)
+        assert set(targets) == {'SH510300', 'SH562500', 'SZ159915'}   # 562500 来自 FUND_ETF_PAIRS
+        assert targets['SH510300'] == {DEFAULT_CHIP_PARAMS}
+        assert targets['SZ159915'] == {(0.9, 40, 120, 'uniform')}
+
+    def test_is_exchange_fund_code(self):
+        from app.services.kline_prefetch import is_exchange_fund_code
+        assert is_exchange_fund_code('562500') and is_exchange_fund_code('159915')
+        assert not is_exchange_fund_code('018344') and not is_exchange_fund_code(None)
+
+
+class TestPrefetch:
+
+    def test_refreshes_stale_symbols_and_precomputes_states(self, app, db, monkeypatch):
+        from app.models import EtfChipState
+        from app.services import quote_provider
+        from app.services.kline_prefetch import prefetch_etf_klines
+
+        fresh_end = quote_provider.latest_kline_date()
+        _add_klines(db, 'SH510300', fresh_end, 30)
+        _add_klines(db, 'SZ159915', date(2026, 1, 9), 30)
+        refreshed = []
+        monkeypatch.setattr(quote_provider, 'refresh_etf_daily_kline',
+                            lambda symbol, days=250: refreshed.append((symbol, days)) or False)
+
+        report = prefetch_etf_klines({
+            'SH510300': {(0.97, 80, 250, 'uniform')},
+            'SZ159915': {(0.97, 80, 250, 'uniform'), (0.9, 20, 60, 'triangular')},
+        }, workers=2)
+
+        assert refreshed == [('SZ159915', 250)]
+        assert report.refreshed == 1 and set(report.failures) == {'SZ159915'}
+        assert report.computed == 3
+        state = EtfChipState.get('SZ159915', 0.9, 20, 60, 'triangular')
+        assert state.last_date == date(2026, 1, 9) and state.viewed_at is None
+
+        # 再跑一次：状态已是最新，不重复计算
+        assert prefetch_etf_klines({'SH510300': {(0.97, 80, 250, 'uniform')}}).computed == 0
+
+    def test_writes_default_snapshot_and_prunes_old(self, app, db, monkeypatch):
+        from app.models import EtfChipSnapshot
+        from app.services import quote_provider, chip_snapshot
+        from app.services.kline_prefetch import prefetch_etf_klines
+
+        end = quote_provider.latest_kline_date()
+        _add_klines(db, 'SH510300', end, 30)
+        db.session.add(EtfChipSnapshot(symbol='SH510300', date=end - timedelta(days=90), close=1.0,
+                                       lo_bound=1.0, bin_width=0.01, weights=b'\x00' * 8))
+        db.session.commit()
+
+        report = prefetch_etf_klines({'SH510300': {(0.9, 20, 60, 'uniform')}})
+        assert report.snapshots == 1
+        assert EtfChipSnapshot.query.count() == 1
+        snapshot = EtfChipSnapshot.get('SH510300', end)
+        assert snapshot.close == 1.08 and snapshot.get_metrics()['avg_cost'] is not None
+        assert prefetch_etf_klines({'SH510300': {(0.9, 20, 60, 'uniform')}}).snapshots == 0
+
+        dist, summary = chip_snapshot.load('SH510300', end, 1.08, 0.05)
+        assert summary['metrics'] == snapshot.get_metrics()
+        moved = chip_snapshot.load('SH510300', end, 0.5, 0.05)[1]['metrics']
+        assert moved['profit_ratio'] == 0.0 and moved['main_peak'] == summary['metrics']['main_peak']
+
+    def test_scheduler_job_skips_non_trading_day(self, app, db, monkeypatch, capsys):
+        from app.services import scheduler
+        monkeypatch.setattr(scheduler, 'is_trading_day', lambda d: False)
+        scheduler.prefetch_etf_klines(app)
+        assert '跳过' in capsys.readouterr().out
+
+
+class TestTouch:
+
+    def test_marks_view_once_per_day(self, db):
+        from app.models import EtfChipState
+        from app.services import chip_state
+        _add_state(db, 'SH562500', 0.97, 80, 250, None)
+        chip_state.touch(['SH562500'], 0.97, 80, 250)
+        first = EtfChipState.get('SH562500', 0.97, 80, 250).viewed_at
+        assert first is not None
+        chip_state.touch(['SH562500'], 0.97, 80, 250)
+        db.session.expire_all()
+        assert EtfChipState.get('SH562500', 0.97, 80, 250).viewed_at == first
+
@@ -0,0 +1,142 @@
+"""K 线列存储：mmap 后端的追加、改写合并、从库重建，与 SQL 后端结果一致."""
+from datetime import date, timedelta
+import os
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def mmap_store(app, db, tmp_path):
+    app.config['KLINE_STORE'] = 'mmap'
+    app.config['KLINE_STORE_PATH'] = str(tmp_path / 'klines')
+    app.extensions.pop('kline_store', None)
+    from app.services.kline_store import get_kline_store
+    return get_kline_store()
+
+
+def _rows(start, count, close=1.0):
+    return [
+        {'date': start + timedelta(days=i), 'open': 1.0, 'high': 1.1 + i / 100, 'low': 0.9,
+         'close': close + i / 100, 'volume': 1000 + i, 'amount': 10.0 * i}
+        for i in range(count)
+    ]
+
+
+class TestMmapKlineStore:
+
+    def test_ingest_appends_and_reads_memmap(self, mmap_store):
+        from app.services.quote_provider import _ingest_bars
+        _ingest_bars('SH562500', _rows(date(2026, 1, 1), 5), name='机器人ETF')
+        _ingest_bars('SH562500', _rows(date(2026, 1, 6), 3, close=2.0))
+
+        series = mmap_store.read('SH562500', 6)
+        assert isinstance(series.close, np.memmap)
+        assert series.last_date == date(2026, 1, 8)
+        assert series.close.tolist() == pytest.approx([1.02, 1.03, 1.04, 2.0, 2.01, 2.02])
+        assert series.name == '机器人ETF'
+        assert len(mmap_store.read('SH562500', 100)) == 8
+
+    def test_revised_history_is_merged(self, mmap_store):
+        from app.services.quote_provider import _ingest_bars
+        _ingest_bars('SH562500', _rows(date(2026, 1, 1), 5))
+        revised = _rows(date(2026, 1, 2), 1, close=9.0)
+        _ingest_bars('SH562500', revised)
+
+        series = mmap_store.read('SH562500', 10)
+        assert len(series) == 5
+        assert series.close[1] == 9.0
+        assert np.all(np.diff(series.days) > 0)
+
+    def test_matches_sql_backend(self, mmap_store):
+        from app.services.kline_store import SqlKlineStore
+        from app.services.quote_provider import _ingest_bars
+        _ingest_bars('SH562500', _rows(date(2026, 1, 1), 6), name='A')
+        _ingest_bars('SZ159915', _rows(date(2026, 1, 1), 3))
+
+        want = SqlKlineStore().read_many(['SH562500', 'SZ159915', 'SH510300'], 4)
+        got = mmap_store.read_many(['SH562500', 'SZ159915', 'SH510300'], 4)
+        assert set(got) == set(want) == {'SH562500', 'SZ159915'}
+        for symbol in want:
+            assert got[symbol].to_records() == want[symbol].to_records()
+            assert got[symbol].name == want[symbol].name
+
+    def test_rebuilds_from_db_when_files_missing(self, mmap_store, tmp_path):
+        import shutil
+        from app.services.quote_provider import _ingest_bars
+        _ingest_bars('SH562500', _rows(date(2026, 1, 1), 4))
+        shutil.rmtree(tmp_path / 'klines' / 'SH562500')
+
+        assert len(mmap_store.read('SH562500', 10)) == 4
+        assert (tmp_path / 'klines' / 'SH562500' / 'close.bin').stat().st_size == 4 * 8
+
+    def test_torn_append_tail_is_ignored(self, mmap_store, tmp_path):
+        from app.services.quote_provider import _ingest_bars
+        _ingest_bars('SH562500', _rows(date(2026, 1, 1), 3))
+        with open(tmp_path / 'klines' / 'SH562500' / 'close.bin', 'ab') as f:
+            f.write(b'\x00' * 12)
+        assert len(mmap_store.read('SH562500', 10)) == 3
+
+        _ingest_bars('SH562500', _rows(date(2026, 1, 4), 1, close=5.0))
+        series = mmap_store.read('SH562500', 10)
+        assert len(series) == 4 and series.close[-1] == 5.0
+
+    def test_concurrent_sync_from_another_process_does_not_duplicate(self, mmap_store, tmp_path):
+        """另一进程（另一个 store 实例）持锁追加同一批 K 线时，本进程等锁后不再重复追加。"""
+        import threading
+        from app.services.bar_series import BarSeries
+        from app.services.kline_store import MmapKlineStore
+        from app.services.quote_provider import _ingest_bars
+        _ingest_bars('SH562500', _rows(date(2026, 1, 1), 3))
+        new_bars = BarSeries.from_rows(tuple(r.values()) for r in _rows(date(2026, 1, 4), 2))
+        other = MmapKlineStore(str(tmp_path / 'klines'))
+
+        with other._locked('SH562500'):
+            worker = threading.Thread(target=mmap_store.sync, args=('SH562500', new_bars))
+            worker.start()
+            worker.join(0.2)
+            assert worker.is_alive()
+            other._append('SH562500', new_bars, 3)
+        worker.join(5)
+
+        series = mmap_store.read('SH562500', 10)
+        assert len(series) == 5
+        assert np.all(np.diff(series.days) > 0)
+
+    def test_read_during_replace_sees_one_version(self, mmap_store, monkeypatch):
+        """回补历史触发逐列替换时，并发读取等替换完成，不会拿到新 days 配旧 close。"""
+        import threading
+        from app.services import kline_store
+        from app.services.quote_provider import _ingest_bars
+        _ingest_bars('SH562500', _rows(date(2026, 1, 3), 5))
+
+        real_replace = os.replace
+        seen = {}
+
+        def replace_then_read(src, dst):
+            real_replace(src, dst)
+            if 'reader' in seen:
+                return
+            # 第一列已换成新版本，其余列仍是旧的：此时读取必须等待
+            seen['reader'] = threading.Thread(
+                target=lambda: seen.update(series=mmap_store._read_mapped('SH562500')))
+            seen['reader'].start()
+            seen['reader'].join(0.2)
+            seen['blocked'] = seen['reader'].is_alive()
+
+        with monkeypatch.context() as m:
+            m.setattr(kline_store.os, 'replace', replace_then_read)
+            _ingest_bars('SH562500', _rows(date(2026, 1, 1), 2, close=5.0))
+        seen['reader'].join(5)
+
+        assert seen['blocked']
+        series = seen['series']
+        assert len(series) == 7
+        assert series.close.tolist() == pytest.approx([5.0, 5.01, 1.0, 1.01, 1.02, 1.03, 1.04])
+
+
+def test_unknown_backend_rejected(app):
+    app.config['KLINE_STORE'] = 'parquet'
+    from app.services.kline_store import get_kline_store
+    with app.app_context(), pytest.raises(ValueError):
+        get_kline_store()
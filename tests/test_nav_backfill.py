@@ -0,0 +1,179 @@
+"""历史净值回补测试：分页、窗口规划、续跑、批量写入."""
+from datetime import date, timedelta
+import json
+import threading
+
+
+class _Resp:
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+        self.encoding = None
+
+
+class _FakeLsjz:
+    """模拟 lsjz 接口：按 startDate/endDate 过滤、日期倒序分页。"""
+
+    def __init__(self, history, fail_codes=()):
+        self.history = history          # {code: {date: nav}}
+        self.fail_codes = set(fail_codes)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        code = params['fundCode']
+        with self._lock:
+            self.calls.append((code, params['startDate'], params['endDate'], params['pageIndex']))
+        if code in self.fail_codes:
+            return _Resp('', 502)
+        start, end = params['startDate'], params['endDate']
+        rows = sorted(
+            ((d.strftime('%Y-%m-%d'), nav) for d, nav in self.history.get(code, {}).items()),
+            reverse=True,
+        )
+        rows = [r for r in rows if (not start or r[0] >= start) and (not end or r[0] <= end)]
+        size, index = params['pageSize'], params['pageIndex']
+        page = rows[(index - 1) * size:index * size]
+        return _Resp(json.dumps({
+            "Data": {"LSJZList": [{"FSRQ": d, "DWJZ": f"{n:.4f}", "LJJZ": ""} for d, n in page]},
+            "ErrCode": 0, "TotalCount": len(rows),
+        }))
+
+
+def _weekdays(start, end):
+    d, out = start, []
+    while d <= end:
+        if d.weekday() < 5:
+            out.append(d)
+        d += timedelta(days=1)
+    return out
+
+
+def _history(start, end, base=1.0):
+    return {d: base + i * 0.001 for i, d in enumerate(_weekdays(start, end))}
+
+
+def _add_fund(db, code):
+    from app.models import Fund
+    fund = Fund(code=code, name=f"基金{code}", fund_type='混合型')
+    db.session.add(fund)
+    db.session.commit()
+    return fund
+
+
+def _stored_dates(fund_id):
+    from app.models import FundNavHistory
+    rows = FundNavHistory.query.filter_by(fund_id=fund_id).order_by(FundNavHistory.date).all()
+    return [r.date for r in rows]
+
+
+def _run(fake, codes, start, end, **kwargs):
+    from app.services.nav_backfill import backfill_funds
+    return backfill_funds(codes, start_date=start, end_date=end, session=fake, rate_limits={}, workers=4, **kwargs)
+
+
+class TestPlanWindows:
+
+    def test_no_history_covers_whole_range_ascending(self):
+        from app.services.nav_backfill import plan_windows
+        spans = plan_windows(None, date(2026, 1, 1), date(2026, 1, 10), window_days=4)
+        assert spans == [
+            (date(2026, 1, 1), date(2026, 1, 4)),
+            (date(2026, 1, 5), date(2026, 1, 8)),
+            (date(2026, 1, 9), date(2026, 1, 10)),
+        ]
+
+    def test_resume_newer_ascending_then_older_descending(self):
+        from app.services.nav_backfill import plan_windows
+        spans = plan_windows((date(2026, 1, 5), date(2026, 1, 6)), date(2026, 1, 1), date(2026, 1, 10), window_days=2)
+        assert spans == [
+            (date(2026, 1, 7), date(2026, 1, 8)),
+            (date(2026, 1, 9), date(2026, 1, 10)),
+            (date(2026, 1, 3), date(2026, 1, 4)),
+            (date(2026, 1, 1), date(2026, 1, 2)),
+        ]
+
+    def test_fully_covered_needs_nothing_unless_full(self):
+        from app.services.nav_backfill import plan_windows
+        stored = (date(2026, 1, 1), date(2026, 1, 10))
+        assert plan_windows(stored, date(2026, 1, 1), date(2026, 1, 10)) == []
+        assert plan_windows(stored, date(2026, 1, 1), date(2026, 1, 10), full=True)
+
+
+class TestBackfill:
+
+    def test_pages_through_history_and_inserts_all(self, db):
+        start, end = date(2025, 1, 1), date(2025, 12, 31)
+        fund = _add_fund(db, '000001')
+        fake = _FakeLsjz({'000001': _history(start, end)})
+
+        results = _run(fake, ['000001'], start, end)
+
+        assert results[0].error is None
+        assert results[0].inserted == len(_weekdays(start, end))
+        assert results[0].pages > 10
+        assert _stored_dates(fund.id) == _weekdays(start, end)
+
+    def test_resume_only_fetches_missing_ranges(self, db):
+        from app.models import FundNavHistory
+        start, end = date(2025, 1, 1), date(2025, 6, 30)
+        fund = _add_fund(db, '000001')
+        history = _history(start, end)
+        mid = date(2025, 3, 3)
+        db.session.add(FundNavHistory(fund_id=fund.id, nav=history[mid], date=mid))
+        db.session.commit()
+        fake = _FakeLsjz({'000001': history})
+
+        results = _run(fake, ['000001'], start, end)
+
+        assert results[0].inserted == len(history) - 1
+        assert _stored_dates(fund.id) == sorted(history)
+        assert all(s > '2025-03-03' or e < '2025-03-03' for _, s, e, _ in fake.calls)
+
+        fake.calls.clear()
+        again = _run(fake, ['000001'], start, end)
+        assert again[0].inserted == 0 and fake.calls == []
+
+    def test_full_refetch_fills_inner_gaps_without_duplicates(self, db):
+        from app.models import FundNavHistory
+        start, end = date(2025, 1, 1), date(2025, 3, 31)
+        fund = _add_fund(db, '000001')
+        history = _history(start, end)
+        for d in (sorted(history)[1], sorted(history)[-2]):
+            db.session.add(FundNavHistory(fund_id=fund.id, nav=history[d], date=d))
+        db.session.commit()
+
+        results = _run(_FakeLsjz({'000001': history}), ['000001'], start, end, full=True)
+
+        assert results[0].inserted == len(history) - 2
+        assert _stored_dates(fund.id) == sorted(history)
+
+    def test_failures_are_reported_per_fund(self, db):
+        start, end = date(2025, 1, 1), date(2025, 2, 28)
+        good = _add_fund(db, '000001')
+        _add_fund(db, '000002')
+        fake = _FakeLsjz({'000001': _history(start, end)}, fail_codes={'000002'})
+        seen = []
+
+        results = {r.code: r for r in _run(fake, ['000001', '000002', '999999'], start, end, progress=seen.append)}
+
+        assert results['000001'].error is None
+        assert 'lsjz' in results['000002'].error
+        assert results['999999'].error == '基金不存在'
+        assert sorted(r.code for r in seen) == ['000001', '000002']
+        assert len(_stored_dates(good.id)) == len(_weekdays(start, end))
+
+    def test_fund_service_backfills_recent_days(self, db, monkeypatch):
+        from app.services import nav_backfill
+        from app.services.fund_service import FundService
+        fund = _add_fund(db, '000001')
+        captured = {}
+
+        def fake_backfill(codes, start_date=None, **kwargs):
+            captured.update(codes=codes, start_date=start_date)
+            return [nav_backfill.BackfillResult(codes[0], inserted=7)]
+
+        monkeypatch.setattr(nav_backfill, 'backfill_funds', fake_backfill)
+        assert FundService.fetch_and_save_historical_navs(fund.id, days=10) == 7
+        assert captured['codes'] == ['000001']
+        assert captured['start_date'] == date.today() - timedelta(days=10)
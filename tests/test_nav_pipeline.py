@@ -0,0 +1,284 @@
+"""批量净值抓取流水线测试：限速、解析、数据源兜底、单事务写库."""
+from datetime import date
+import json
+import threading
+
+import pytest
+
+EASTMONEY_HTML = (
+    '<html><div class="fundDetail-tit">测试基金A(000001)</div>'
+    '<dl class="dataItem01"><dd>单位净值：{nav} 更新时间：{date}</dd></dl></html>'
+)
+SINA_HTML = '<html><div class="fundDetail-tit">{nav}</div></html>'
+LSJZ_URL = "http://api.fund.eastmoney.com/f10/lsjz"
+
+
+def _lsjz_json(*rows, total=None):
+    """rows 为 (日期, 单位净值) 倒序。"""
+    return json.dumps({
+        "Data": {"LSJZList": [{"FSRQ": d, "DWJZ": n, "LJJZ": n} for d, n in rows]},
+        "ErrCode": 0, "TotalCount": len(rows) if total is None else total,
+    })
+
+
+def _fundgz_jsonp(code, nav, nav_date, name='测试基金G'):
+    payload = {"fundcode": code, "name": name, "jzrq": nav_date, "dwjz": nav, "gsz": "9.99"}
+    return f"jsonpgz({json.dumps(payload, ensure_ascii=False)});"
+
+
+class _Resp:
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+        self.encoding = None
+
+
+class _FakeSession:
+    """按 URL 返回预置页面（lsjz 按 (URL, 基金代码)）；未配置的返回 404。"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        key = (url, params['fundCode']) if params and 'fundCode' in params else url
+        with self._lock:
+            self.calls.append(key)
+        page = self.pages.get(key)
+        if isinstance(page, Exception):
+            raise page
+        if page is None:
+            return _Resp('', 404)
+        return _Resp(page)
+
+
+def _em_url(code):
+    return f"http://fund.eastmoney.com/{code}.html"
+
+
+def _sina_url(code):
+    return f"http://finance.sina.com.cn/fund/quotes/{code}/nav.shtml"
+
+
+def _add_fund(db, code, nav=None):
+    from app.models import Fund
+    fund = Fund(code=code, name=f"基金{code}", fund_type='混合型', latest_nav=nav)
+    db.session.add(fund)
+    db.session.commit()
+    return fund
+
+
+def _pipeline(pages, **kwargs):
+    from app.services.nav_pipeline import NavCrawlPipeline
+    kwargs.setdefault('rate_limits', {})
+    return NavCrawlPipeline(fetch_workers=4, parse_workers=0, session=_FakeSession(pages), **kwargs)
+
+
+class TestHostRateLimiter:
+
+    def test_same_host_calls_are_spaced(self):
+        from app.services.nav_pipeline import HostRateLimiter
+        now = [100.0]
+        slept = []
+        limiter = HostRateLimiter({'fund.eastmoney.com': 0.5}, clock=lambda: now[0], sleep=slept.append)
+        for _ in range(3):
+            limiter.wait(_em_url('000001'))
+        assert slept == pytest.approx([0.5, 1.0])
+
+    def test_hosts_are_independent_and_unlisted_hosts_free(self):
+        from app.services.nav_pipeline import HostRateLimiter
+        slept = []
+        limiter = HostRateLimiter(
+            {'fund.eastmoney.com': 0.5, 'finance.sina.com.cn': 0.5},
+            clock=lambda: 0.0, sleep=slept.append,
+        )
+        limiter.wait(_em_url('000001'))
+        limiter.wait(_sina_url('000001'))
+        limiter.wait('http://example.com/x')
+        assert slept == []
+
+
+class TestParse:
+
+    def test_parse_lsjz_takes_latest_record(self):
+        from app.services.crawler import parse_lsjz, parse_lsjz_records
+        text = _lsjz_json(('2026-05-08', '1.2345'), ('2026-05-07', '1.2000'), total=900)
+        assert parse_lsjz(text) == {
+            'nav': 1.2345, 'date': '2026-05-08', 'name': None, 'fund_type': None, 'source': 'lsjz',
+        }
+        records, total = parse_lsjz_records(text)
+        assert [r['date'] for r in records] == ['2026-05-08', '2026-05-07']
+        assert total == 900
+
+    def test_parse_lsjz_skips_records_without_nav(self):
+        from app.services.crawler import parse_lsjz
+        assert parse_lsjz(_lsjz_json(('2026-05-08', ''))) is None
+        assert parse_lsjz('{"Data": null, "ErrCode": 1}') is None
+        assert parse_lsjz('<html>blocked</html>') is None
+
+    def test_parse_fundgz(self):
+        from app.services.crawler import parse_fundgz
+        result = parse_fundgz(_fundgz_jsonp('000001', '1.5000', '2026-05-07'))
+        assert result['nav'] == pytest.approx(1.5)
+        assert result['date'] == '2026-05-07'
+        assert result['name'] == '测试基金G'
+        assert parse_fundgz('jsonpgz();') is None
+
+    def test_parse_fund_page(self):
+        from app.services.crawler import parse_fund_page
+        result = parse_fund_page(EASTMONEY_HTML.format(nav='1.2345', date='2026-05-08'))
+        assert result['nav'] == pytest.approx(1.2345)
+        assert result['date'] == '2026-05-08'
+        assert result['name'] == '测试基金A'
+        assert result['source'] == 'eastmoney'
+
+    def test_parse_fund_page_fallback_selectors(self):
+        """dataItem01 缺失时依次尝试其它容器；无日期时取全页最新日期。"""
+        from app.services.crawler import parse_fund_page
+        html = (
+            '<html><head><meta name="description" content="某债券基金"></head>'
+            '<h1>稳健债券A(000123)</h1><p>2026-04-30</p><p>2026-05-06</p>'
+            '<span class="ui-font-large bold">1.0456</span></html>'
+        )
+        result = parse_fund_page(html)
+        assert result['nav'] == pytest.approx(1.0456)
+        assert result['date'] == '2026-05-06'
+        assert result['name'] == '稳健债券A'
+        assert result['fund_type'] == '债券型'
+
+    def test_parse_fund_page_without_nav_returns_none(self):
+        from app.services.crawler import parse_fund_page
+        assert parse_fund_page('<html><body>nothing</body></html>') is None
+
+    def test_parse_sina_page(self):
+        from app.services.crawler import parse_sina_page
+        result = parse_sina_page(SINA_HTML.format(nav='2.5'))
+        assert result['nav'] == pytest.approx(2.5)
+        assert result['source'] == 'sina'
+
+
+class TestNavCrawlPipeline:
+
+    def test_updates_all_funds_in_one_commit(self, db, monkeypatch):
+        from app.models import Fund, FundNavHistory
+        for code in ('000001', '000002', '000003'):
+            _add_fund(db, code, nav=1.0)
+        pages = {(LSJZ_URL, c): _lsjz_json(('2026-05-08', n))
+                 for c, n in (('000001', '1.10'), ('000002', '1.20'), ('000003', '1.30'))}
+        commits = []
+        real_commit = db.session.commit
+        monkeypatch.setattr(db.session, 'commit', lambda: (commits.append(1), real_commit()))
+
+        report = _pipeline(pages).run(['000001', '000002', '000003', '000001'])
+
+        assert report.total == 3
+        assert report.success_count == 3 and report.fail_count == 0
+        assert len(commits) == 1
+        assert Fund.query.filter_by(code='000002').first().latest_nav == pytest.approx(1.2)
+        assert FundNavHistory.query.count() == 3
+        assert FundNavHistory.query.first().date == date(2026, 5, 8)
+        assert set(report.sources.values()) == {'lsjz'}
+
+    def test_falls_through_sources_and_reports_failures(self, db):
+        from app.models import Fund
+        for code in ('000001', '000002', '000003', '000004'):
+            _add_fund(db, code, nav=1.0)
+        session_pages = {
+            (LSJZ_URL, '000001'): _lsjz_json(('2026-05-08', '1.11')),
+            (LSJZ_URL, '000002'): ConnectionError('blocked'),
+            'http://fundgz.1234567.com.cn/js/000002.js': _fundgz_jsonp('000002', '1.22', '2026-05-08'),
+            _em_url('000003'): EASTMONEY_HTML.format(nav='1.33', date='2026-05-08'),
+            _sina_url('000004'): SINA_HTML.format(nav='1.44'),
+        }
+        pipeline = _pipeline(session_pages)
+        report = pipeline.run(['000001', '000002', '000003', '000004', '000005'])
+
+        assert report.sources == {
+            '000001': 'lsjz', '000002': 'fundgz', '000003': 'eastmoney', '000004': 'sina',
+        }
+        assert list(report.failures) == ['000005']
+        assert Fund.query.filter_by(code='000002').first().latest_nav == pytest.approx(1.22)
+        assert Fund.query.filter_by(code='000004').first().latest_nav == pytest.approx(1.44)
+        assert _em_url('000001') not in pipeline.session.calls
+        assert report.parsed == 4
+
+    def test_dead_source_is_skipped_after_circuit_opens(self, db):
+        """lsjz 连续连接失败后熔断，剩余基金不再请求 lsjz，直接由下一轮 fundgz 兜底。"""
+        from app.services.nav_pipeline import NavCrawlPipeline
+        codes = [f'00000{i}' for i in range(1, 7)]
+        pages = {}
+        for code in codes:
+            _add_fund(db, code, nav=1.0)
+            pages[(LSJZ_URL, code)] = ConnectionError('timeout')
+            pages[f'http://fundgz.1234567.com.cn/js/{code}.js'] = _fundgz_jsonp(code, '1.10', '2026-05-08')
+        session = _FakeSession(pages)
+        pipeline = NavCrawlPipeline(fetch_workers=1, parse_workers=0, rate_limits={}, session=session)
+
+        report = pipeline.run(codes)
+
+        assert set(report.sources.values()) == {'fundgz'}
+        assert sum(1 for call in session.calls if call[0] == LSJZ_URL) == 3
+
+    def test_rate_limit_wait_not_counted_as_source_latency(self, db):
+        import time
+        from app.services.source_router import source_router
+        _add_fund(db, '000001', nav=1.0)
+        pipeline = _pipeline({(LSJZ_URL, '000001'): _lsjz_json(('2026-05-08', '1.1'))})
+        pipeline.limiter.wait = lambda url: time.sleep(0.2)
+
+        pipeline.run(['000001'])
+
+        assert source_router.snapshot()['nav:lsjz']['mean_latency_ms'] < 100
+
+    def test_creates_missing_fund_from_eastmoney(self, db):
+        """库里没有的基金需要名称/类型，直接从详情页开始，不走 JSON 接口。"""
+        from app.models import Fund
+        pages = {_em_url('000009'): EASTMONEY_HTML.format(nav='1.5', date='2026-05-08')}
+        pipeline = _pipeline(pages)
+        report = pipeline.run(['000009'])
+        assert report.sources == {'000009': 'eastmoney'}
+        assert Fund.query.filter_by(code='000009').first().name == '测试基金A'
+        assert (LSJZ_URL, '000009') not in pipeline.session.calls
+
+    def test_write_error_only_drops_that_fund(self, db, monkeypatch):
+        from app.models import Fund
+        from app.services import crawler
+        _add_fund(db, '000001', nav=1.0)
+        _add_fund(db, '000002', nav=1.0)
+        pages = {(LSJZ_URL, c): _lsjz_json(('2026-05-08', '1.7')) for c in ('000001', '000002')}
+        real_apply = crawler.apply_nav_result
+
+        def flaky_apply(code, result, **kwargs):
+            if code == '000002':
+                raise RuntimeError('bad row')
+            return real_apply(code, result, **kwargs)
+
+        monkeypatch.setattr(crawler, 'apply_nav_result', flaky_apply)
+        report = _pipeline(pages).run(['000001', '000002'])
+
+        assert report.success_count == 1
+        assert '000002' in report.failures
+        assert Fund.query.filter_by(code='000001').first().latest_nav == pytest.approx(1.7)
+        assert Fund.query.filter_by(code='000002').first().latest_nav == pytest.approx(1.0)
+
+    def test_progress_callback_reports_each_stage(self, db):
+        _add_fund(db, '000001')
+        pages = {(LSJZ_URL, '000001'): _lsjz_json(('2026-05-08', '1.1'))}
+        events = []
+        _pipeline(pages, progress=lambda *e: events.append(e)).run(['000001'])
+        assert events == [('fetch_lsjz', 1, 1), ('parse_lsjz', 1, 1), ('write', 1, 1)]
+
+    def test_update_all_funds_nav_uses_pipeline(self, db, monkeypatch):
+        from app.services import nav_pipeline
+        from app.services.fund_service import FundService
+        _add_fund(db, '000001')
+        seen = []
+
+        def fake_crawl(codes, progress=None):
+            seen.extend(codes)
+            return nav_pipeline.NavCrawlReport(total=len(codes), updated=len(codes))
+
+        monkeypatch.setattr(nav_pipeline, 'crawl_fund_navs', fake_crawl)
+        assert FundService.update_all_funds_nav() == 1
+        assert seen == ['000001']
@@ -3,6 +3,12 @@ import pytest
 import json
 
 
+def _patch_http_get(monkeypatch, fake_get):
+    """替换默认 QuoteClient 共享 Session 的 get（所有远端请求都经由它）。"""
+    from app.services import quote_provider
+    monkeypatch.setattr(quote_provider.get_quote_client().session, "get", fake_get)
+
+
 class TestETFQuote:
     """场内 ETF 实时行情获取测试."""
 
@@ -35,7 +41,7 @@ class TestETFQuote:
             assert "push2.eastmoney.com" in url
             return FakeResponse()
 
-        monkeypatch.setattr("app.services.quote_provider.requests.get", fake_get)
+        _patch_http_get(monkeypatch, fake_get)
 
         quote = fetch_etf_quote("562500")
         assert quote is not None
@@ -59,7 +65,7 @@ class TestETFQuote:
         def fake_get(url, params, timeout, **kwargs):
             raise requests.exceptions.RequestException("timeout")
 
-        monkeypatch.setattr("app.services.quote_provider.requests.get", fake_get)
+        _patch_http_get(monkeypatch, fake_get)
 
         quote = fetch_etf_quote("562500")
         assert quote is None
@@ -75,12 +81,118 @@ class TestETFQuote:
             def json(self):
                 return {"data": None}
 
-        monkeypatch.setattr("app.services.quote_provider.requests.get", lambda **kw: FakeResponse())
+        _patch_http_get(monkeypatch, lambda **kw: FakeResponse())
 
         quote = fetch_etf_quote("562500")
         assert quote is None
 
 
+class TestETFQuotesBatch:
+    """fetch_etf_quotes: ulist 一次请求批量行情."""
+
+    def test_parses_ulist_response_keyed_by_prefixed_symbol(self, monkeypatch):
+        from app.services.quote_provider import fetch_etf_quotes
+        captured = {}
+
+        class FakeResponse:
+            def raise_for_status(self):
+                return
+
+            def json(self):
+                return {"data": {"total": 2, "diff": [
+                    {"f2": 1.122, "f3": 1.54, "f4": 0.017, "f5": 123456, "f6": 9876543.0,
+                     "f12": "562500", "f13": 1, "f14": "机器人ETF华夏",
+                     "f15": 1.13, "f16": 1.118, "f17": 1.12, "f18": 1.105},
+                    {"f2": "-", "f3": "-", "f4": "-", "f5": "-", "f6": "-",
+                     "f12": "159915", "f13": 0, "f14": "创业板ETF",
+                     "f15": "-", "f16": "-", "f17": "-", "f18": 2.0},
+                ]}}
+
+        def fake_get(url, params=None, timeout=10, **kw):
+            assert "ulist.np" in url
+            captured.update(params)
+            return FakeResponse()
+
+        _patch_http_get(monkeypatch, fake_get)
+
+        quotes = fetch_etf_quotes(["562500", "SZ159915"])
+        assert captured["secids"] == "1.562500,0.159915"
+        assert set(quotes) == {"SH562500", "SZ159915"}
+        q = quotes["SH562500"]
+        assert q.name == "机器人ETF华夏"
+        assert q.latest == 1.122
+        assert q.prev_close == 1.105
+        assert q.volume == 123456
+        # 停牌缺失值 "-" 记为 0
+        assert quotes["SZ159915"].latest == 0.0
+        assert quotes["SZ159915"].prev_close == 2.0
+
+    def test_returns_empty_dict_on_error(self, monkeypatch):
+        from app.services.quote_provider import fetch_etf_quotes
+        import requests as req
+
+        def fake_get(*a, **kw):
+            raise req.exceptions.RequestException("down")
+
+        _patch_http_get(monkeypatch, fake_get)
+        assert fetch_etf_quotes(["562500"]) == {}
+
+
+class TestQuoteClient:
+    """QuoteClient: 共享连接池 Session + 批量接口."""
+
+    def test_default_client_is_shared_with_pooled_session(self):
+        from app.services.quote_provider import get_quote_client
+        client = get_quote_client()
+        assert client is get_quote_client()
+        adapter = client.session.get_adapter("https://push2.eastmoney.com")
+        assert adapter._pool_maxsize >= 8
+
+    def test_fetch_fund_estimates_bounded_concurrency(self, monkeypatch):
+        """批量估值：并发不超过 max_workers，失败的代码被跳过。"""
+        import threading
+        import time
+        from app.services.quote_provider import QuoteClient, OTCFundQuote
+
+        client = QuoteClient(max_workers=2)
+        active = {"now": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def fake_one(code):
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+            time.sleep(0.02)
+            with lock:
+                active["now"] -= 1
+            if code == "000002":
+                return None
+            return OTCFundQuote(symbol=code, name=code, latest_nav=1.0, latest_nav_date="",
+                                estimated_nav=None, estimated_change_pct=None, estimate_time=None)
+
+        monkeypatch.setattr(client, "fetch_fund_estimate", fake_one)
+        result = client.fetch_fund_estimates(["000001", "000002", "000003", "000004", "000001"])
+        assert set(result) == {"000001", "000003", "000004"}
+        assert active["peak"] <= 2
+
+    def test_build_pair_contexts_uses_batch_quotes(self, monkeypatch):
+        from app.services import quote_provider
+        from app.services.quote_provider import build_pair_contexts, ETFQuote, OTCFundQuote
+
+        etf = ETFQuote(symbol="562500", name="机器人ETF华夏", market="SH", latest=1.122, open=1.1,
+                       high=1.13, low=1.09, prev_close=1.097, change_amount=0.025, change_pct=2.28,
+                       volume=100, amount=1000)
+        fund = OTCFundQuote(symbol="018344", name="联接A", latest_nav=1.3222, latest_nav_date="2026-05-08",
+                            estimated_nav=1.3542, estimated_change_pct=2.42, estimate_time="2026-05-08 15:00")
+        client = quote_provider.get_quote_client()
+        monkeypatch.setattr(client, "fetch_etf_quotes", lambda symbols: {"SH562500": etf})
+        monkeypatch.setattr(client, "fetch_fund_estimates", lambda codes: {"018344": fund})
+
+        ctxs = build_pair_contexts([("robot", "562500", "018344"), ("x", "159915", "000001")])
+        assert len(ctxs) == 1
+        assert "机器人ETF华夏" in ctxs[0] and "联接A" in ctxs[0]
+
+
 class TestOTCFundQuote:
     """场外基金估算净值测试."""
 
@@ -101,7 +213,7 @@ class TestOTCFundQuote:
             assert "018344.js" in url
             return FakeResponse()
 
-        monkeypatch.setattr("app.services.quote_provider.requests.get", fake_get)
+        _patch_http_get(monkeypatch, fake_get)
 
         quote = fetch_fund_estimate("018344")
         assert quote is not None
@@ -125,7 +237,7 @@ class TestOTCFundQuote:
             def text(self):
                 return "not valid jsonp"
 
-        monkeypatch.setattr("app.services.quote_provider.requests.get", lambda **kw: FakeResponse())
+        _patch_http_get(monkeypatch, lambda **kw: FakeResponse())
 
         quote = fetch_fund_estimate("018344")
         assert quote is None
@@ -209,12 +321,12 @@ class TestQuoteContextIntegration:
         db.session.add(pos)
         db.session.commit()
 
-        # mock quote provider
-        def mock_build_pair(name, etf, fund_code):
-            return f"实时行情: {name}\nETF: {etf}\nFund: {fund_code}"
+        # mock quote provider（批量接口）
+        def mock_build_pairs(pairs):
+            return [f"实时行情: {name}\nETF: {etf}\nFund: {fund_code}" for name, etf, fund_code in pairs]
 
         monkeypatch.setattr(
-            "app.services.quote_provider.build_pair_context", mock_build_pair
+            "app.services.quote_provider.build_pair_contexts", mock_build_pairs
         )
 
         ctx = _build_quote_context_for_positions([pos])
@@ -259,7 +371,7 @@ class TestETFDailyKline:
         return FakeResponse()
 
     def test_parses_klines_response(self, db, monkeypatch):
-        """正确解析东方财富日 K 响应为 ETFDailyBar 列表。"""
+        """正确解析东方财富日 K 响应为 BarSeries。"""
         from app.services import quote_provider
         from app.services.quote_provider import fetch_etf_daily_kline
 
@@ -267,8 +379,8 @@ class TestETFDailyKline:
             "2026-01-02,1.050,1.070,1.080,1.040,100000,105000,3.85,1.90,0.020,1.5",
             "2026-01-03,1.070,1.090,1.100,1.060,150000,160000,3.74,1.87,0.020,2.0",
         ]
-        monkeypatch.setattr(
-            quote_provider.requests, "get",
+        _patch_http_get(
+            monkeypatch,
             lambda url, params=None, timeout=10, **kw: self._mock_em_kline_response(klines),
         )
 
@@ -295,12 +407,12 @@ class TestETFDailyKline:
             def json(self):
                 return {"data": None}
 
-        monkeypatch.setattr(
-            quote_provider.requests, "get",
+        _patch_http_get(
+            monkeypatch,
             lambda url, params=None, timeout=10, **kw: FakeResponse(),
         )
         bars = fetch_etf_daily_kline("562500", days=30)
-        assert bars == []
+        assert len(bars) == 0
 
     def test_returns_empty_on_http_error(self, db, monkeypatch):
         """HTTP 异常时返回空列表（同时不应阻断页面）。"""
@@ -311,9 +423,9 @@ class TestETFDailyKline:
         def fake_get(*a, **kw):
             raise req.exceptions.RequestException("network error")
 
-        monkeypatch.setattr(quote_provider.requests, "get", fake_get)
+        _patch_http_get(monkeypatch, fake_get)
         bars = fetch_etf_daily_kline("562500", days=30)
-        assert bars == []
+        assert len(bars) == 0
 
     def test_db_cache_persists_between_calls(self, db, monkeypatch):
         """首次拉取写入 DB，第二次即使远端失败也能从 DB 拿到。"""
@@ -329,15 +441,15 @@ class TestETFDailyKline:
             call_count["n"] += 1
             return self._mock_em_kline_response(klines)
 
-        monkeypatch.setattr(quote_provider.requests, "get", fake_get)
+        _patch_http_get(monkeypatch, fake_get)
 
         bars1 = fetch_etf_daily_kline("562500", days=30)
         assert len(bars1) == 1
         assert call_count["n"] == 1
 
         # 第二次：远端失败（同一 session），DB 已有数据
-        monkeypatch.setattr(
-            quote_provider.requests, "get",
+        _patch_http_get(
+            monkeypatch,
             lambda *a, **kw: (_ for _ in ()).throw(
                 __import__("requests").exceptions.RequestException("down"),
             ),
@@ -382,7 +494,7 @@ class TestETFDailyKline:
             captured_params.update(params or {})
             return FakeResponse()
 
-        monkeypatch.setattr(quote_provider.requests, "get", fake_get)
+        _patch_http_get(monkeypatch, fake_get)
 
         bars = fetch_etf_daily_kline("562500", days=30)
         # 应有 2 条（原有 + 新增）
@@ -408,7 +520,7 @@ class TestETFDailyKline:
             captured.update(params or {})
             return FakeResponse()
 
-        monkeypatch.setattr(quote_provider.requests, "get", fake_get)
+        _patch_http_get(monkeypatch, fake_get)
         fetch_etf_daily_kline("562500", days=10)
         # secid 应为 1.562500（SH 因为 56 开头）
         assert captured.get("secid") == "1.562500"
@@ -420,6 +532,7 @@ class TestKlineFallbackToAkshare:
     def test_falls_back_to_akshare_when_eastmoney_fails(self, db, monkeypatch):
         """东财连接失败 + akshare 成功 → 返回 akshare 数据并写入 DB。"""
         from app.services import quote_provider
+        from app.services.bar_series import BarSeries
         from app.services.quote_provider import fetch_etf_daily_kline, ETFDailyBar
         import requests as req
 
@@ -427,7 +540,7 @@ class TestKlineFallbackToAkshare:
         def em_fail(url, params=None, timeout=10, **kw):
             raise req.exceptions.RequestException("em down")
 
-        monkeypatch.setattr(quote_provider.requests, "get", em_fail)
+        _patch_http_get(monkeypatch, em_fail)
 
         # akshare 成功
         fake_bars = [
@@ -436,7 +549,7 @@ class TestKlineFallbackToAkshare:
         ]
         monkeypatch.setattr(
             quote_provider, 'fetch_etf_daily_kline_akshare',
-            lambda s, days=250: fake_bars,
+            lambda s, days=250, **kw: BarSeries.from_bars(fake_bars),
         )
 
         bars = fetch_etf_daily_kline("562500", days=30)
@@ -468,10 +581,10 @@ class TestKlineFallbackToAkshare:
         def em_fail(url, params=None, timeout=10, **kw):
             raise req.exceptions.RequestException("em down")
 
-        monkeypatch.setattr(quote_provider.requests, "get", em_fail)
+        _patch_http_get(monkeypatch, em_fail)
         monkeypatch.setattr(
             quote_provider, 'fetch_etf_daily_kline_akshare',
-            lambda s, days=250: (_ for _ in ()).throw(RuntimeError("sina down")),
+            lambda s, days=250, **kw: (_ for _ in ()).throw(RuntimeError("sina down")),
         )
 
         bars = fetch_etf_daily_kline("562500", days=30)
@@ -487,11 +600,328 @@ class TestKlineFallbackToAkshare:
         def em_fail(url, params=None, timeout=10, **kw):
             raise req.exceptions.RequestException("em down")
 
-        monkeypatch.setattr(quote_provider.requests, "get", em_fail)
+        _patch_http_get(monkeypatch, em_fail)
         monkeypatch.setattr(
             quote_provider, 'fetch_etf_daily_kline_akshare',
-            lambda s, days=250: (_ for _ in ()).throw(RuntimeError("sina down")),
+            lambda s, days=250, **kw: (_ for _ in ()).throw(RuntimeError("sina down")),
         )
 
         bars = fetch_etf_daily_kline("562500", days=30)
-        assert bars == []
+        assert len(bars) == 0
+
+
+    def test_fallback_requests_only_missing_dates(self, db, monkeypatch):
+        """已有缓存时 akshare 只取缓存之后、最近收盘日及以前的 K 线。"""
+        from datetime import date
+        from app.services import quote_provider
+        from app.services.bar_series import BarSeries
+        from app.models.etf_kline_cache import EtfKlineCache
+        import requests as req
+
+        db.session.add(EtfKlineCache(
+            symbol="SH562500", date=date(2026, 1, 2),
+            open=1.050, high=1.080, low=1.040, close=1.070,
+            volume=100000, amount=105000,
+        ))
+        db.session.commit()
+
+        def em_fail(url, params=None, timeout=10, **kw):
+            raise req.exceptions.RequestException("em down")
+
+        calls = []
+        _patch_http_get(monkeypatch, em_fail)
+        monkeypatch.setattr(quote_provider, 'latest_kline_date', lambda now=None: date(2026, 1, 5))
+        monkeypatch.setattr(
+            quote_provider, 'fetch_etf_daily_kline_akshare',
+            lambda s, days=250, **kw: calls.append(kw) or BarSeries.empty(),
+        )
+
+        assert quote_provider.refresh_etf_daily_kline("562500", days=30) is True
+        assert calls == [{'since': date(2026, 1, 2), 'until': date(2026, 1, 5)}]
+
+
+class TestSinaFrameToSeries:
+    """新浪日 K DataFrame 按日期截取后整列转换."""
+
+    def _frame(self):
+        pd = pytest.importorskip('pandas')
+        return pd.DataFrame({
+            'date': ['2026-01-05', '2026-01-02', '2026-01-06', '2026-01-07'],
+            'open': [1.07, 1.05, 1.09, 1.10],
+            'high': [1.10, 1.08, 1.12, 1.13],
+            'low': [1.06, 1.04, 1.08, 1.09],
+            'close': [1.09, 1.07, 1.11, 1.12],
+            'volume': [120000, 100000, 130000, None],
+            'amount': [130000.0, 105000.0, 140000.0, 150000.0],
+        })
+
+    def test_sorted_tail_within_since_and_until(self):
+        from datetime import date
+        import numpy as np
+        from app.services.bar_series import BarSeries
+        from app.services.quote_provider import _sina_frame_to_series
+
+        series = _sina_frame_to_series(self._frame(), days=3, since=date(2026, 1, 2), until=date(2026, 1, 6))
+        assert BarSeries.date_strings(series.days) == ['2026-01-05', '2026-01-06']
+        assert series.close.tolist() == [1.09, 1.11]
+        assert series.volume.dtype == np.int64
+
+    def test_missing_volume_becomes_zero(self):
+        from app.services.quote_provider import _sina_frame_to_series
+
+        series = _sina_frame_to_series(self._frame(), days=250)
+        assert len(series) == 4
+        assert series.volume[-1] == 0
+        assert series.to_rows()[0]['date'].isoformat() == '2026-01-02'
+
+
+class TestKlineServeStale:
+    """fetch_etf_daily_kline serve_stale：先返回缓存，增量刷新放后台并按 symbol 去重."""
+
+    KLINE = "2026-01-05,1.070,1.090,1.100,1.060,150000,160000,3.74,1.87,0.020,2.0"
+
+    def _seed(self, db):
+        from datetime import date
+        from app.models.etf_kline_cache import EtfKlineCache
+        db.session.add(EtfKlineCache(
+            symbol="SH562500", date=date(2026, 1, 2),
+            open=1.050, high=1.080, low=1.040, close=1.070, volume=100000, amount=105000,
+        ))
+        db.session.commit()
+
+    def _blocking_remote(self, monkeypatch, release):
+        calls = []
+        klines = [self.KLINE]
+
+        class FakeResponse:
+            def raise_for_status(self):
+                return
+
+            def json(self):
+                return {"data": {"code": "562500", "name": "机器人ETF", "klines": klines}}
+
+        def fake_get(url, params=None, timeout=10, **kw):
+            calls.append(params)
+            release.wait(5)
+            return FakeResponse()
+
+        _patch_http_get(monkeypatch, fake_get)
+        return calls
+
+    def test_latest_kline_date_follows_close_and_calendar(self):
+        from datetime import date, datetime
+        from app.services.quote_provider import latest_kline_date, kline_is_fresh
+        assert latest_kline_date(datetime(2025, 9, 30, 16, 0)) == date(2025, 9, 30)
+        assert latest_kline_date(datetime(2025, 9, 30, 10, 0)) == date(2025, 9, 29)
+        assert latest_kline_date(datetime(2025, 10, 4, 12, 0)) == date(2025, 9, 30)
+        assert kline_is_fresh(date(2025, 9, 30), datetime(2025, 10, 8, 20, 0))
+        assert not kline_is_fresh(None)
+
+    def test_returns_cached_bars_and_refreshes_in_background(self, db, monkeypatch):
+        import threading
+        from app.services.quote_provider import fetch_etf_daily_kline, kline_refresher
+        self._seed(db)
+        release = threading.Event()
+        calls = self._blocking_remote(monkeypatch, release)
+
+        bars = fetch_etf_daily_kline("562500", days=30, serve_stale=True)
+        assert [bars[i].date for i in range(len(bars))] == ["2026-01-02"]
+        assert kline_refresher.is_pending("SH562500")
+
+        # 同一 symbol 再次过期请求不重复排队
+        future = kline_refresher.submit("562500")
+        assert fetch_etf_daily_kline("SH562500", days=30, serve_stale=True).last_date.isoformat() == "2026-01-02"
+        release.set()
+        assert future.result(timeout=5) is True
+        assert len(calls) == 1
+        assert not kline_refresher.is_pending("SH562500")
+
+        db.session.expire_all()
+        assert fetch_etf_daily_kline("562500", days=30, serve_stale=True).last_date.isoformat() == "2026-01-05"
+
+    def test_empty_cache_still_fetches_synchronously(self, db, monkeypatch):
+        import threading
+        from app.services.quote_provider import fetch_etf_daily_kline
+        release = threading.Event()
+        release.set()
+        self._blocking_remote(monkeypatch, release)
+        bars = fetch_etf_daily_kline("562500", days=30, serve_stale=True)
+        assert len(bars) == 1 and bars.name == "机器人ETF"
+
+
+class TestKlineBulkUpsert:
+    """EtfKlineCache.bulk_upsert：批量 ON CONFLICT 写入，只返回新增/改写的日期."""
+
+    @staticmethod
+    def _bar(d, close, **kw):
+        return dict({'date': d, 'open': 1.0, 'high': 1.2, 'low': 0.9, 'close': close,
+                     'volume': 1000, 'amount': 1100.0}, **kw)
+
+    def test_inserts_skips_unchanged_and_overwrites_changed(self, db):
+        from datetime import date
+        from app.models.etf_kline_cache import EtfKlineCache
+
+        d1, d2, d3 = date(2026, 1, 5), date(2026, 1, 6), date(2026, 1, 7)
+        assert EtfKlineCache.bulk_upsert("SH510300", [self._bar(d1, 1.0), self._bar(d2, 1.1)], name="沪深300ETF") == [d1, d2]
+        db.session.commit()
+
+        changed = EtfKlineCache.bulk_upsert("SH510300", [
+            self._bar(d1, 1.0), self._bar(d2, 1.15), self._bar(d3, 1.2),
+        ])
+        db.session.commit()
+        assert changed == [d2, d3]
+
+        rows = EtfKlineCache.get_recent("SH510300", 10)
+        assert [(r.date, r.close) for r in rows] == [(d1, 1.0), (d2, 1.15), (d3, 1.2)]
+        # name 为 None 时不覆盖已有名称
+        assert rows[1].name == "沪深300ETF"
+
+    def test_cold_fill_is_chunked_without_per_bar_selects(self, db):
+        from datetime import date, timedelta
+        from sqlalchemy import event
+        from app.models.etf_kline_cache import EtfKlineCache
+
+        start = date(2020, 1, 1)
+        bars = [self._bar(start + timedelta(days=i), 1.0 + i / 1000) for i in range(1200)]
+        statements = []
+
+        def _count(conn, cursor, statement, parameters, *args):
+            statements.append((statement.split()[0].upper(), len(parameters)))
+
+        event.listen(db.engine, 'before_cursor_execute', _count)
+        try:
+            changed = EtfKlineCache.bulk_upsert("SZ159915", bars)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', _count)
+        db.session.commit()
+
+        from app.services.db import SQLITE_MAX_VARIABLES, rows_per_statement
+        inserts = [n for kind, n in statements if kind == 'INSERT']
+        assert len(changed) == 1200
+        assert [kind for kind, _ in statements].count('SELECT') == 1
+        # 按列数和变量上限分批
+        assert len(inserts) == -(-1200 // rows_per_statement(EtfKlineCache.__table__))
+        assert max(inserts) <= SQLITE_MAX_VARIABLES
+        assert EtfKlineCache.query.filter_by(symbol="SZ159915").count() == 1200
+
+
+class TestQuoteCache:
+    """QuoteCache: TTL + LRU + single-flight."""
+
+    def test_hit_within_ttl_and_expiry(self):
+        from app.services.quote_provider import QuoteCache
+        now = {"t": 100.0}
+        cache = QuoteCache(clock=lambda: now["t"])
+        calls = []
+
+        def load():
+            calls.append(1)
+            return "q"
+
+        assert cache.get_or_load("k", load, ttl=3) == "q"
+        now["t"] += 2
+        assert cache.get_or_load("k", load, ttl=3) == "q"
+        assert len(calls) == 1
+        now["t"] += 2
+        cache.get_or_load("k", load, ttl=3)
+        assert len(calls) == 2
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 2
+
+    def test_none_not_cached(self):
+        from app.services.quote_provider import QuoteCache
+        cache = QuoteCache()
+        calls = []
+        cache.get_or_load("k", lambda: calls.append(1), ttl=60)
+        cache.get_or_load("k", lambda: calls.append(1), ttl=60)
+        assert len(calls) == 2
+
+    def test_lru_eviction(self):
+        from app.services.quote_provider import QuoteCache
+        cache = QuoteCache(max_entries=2)
+        cache.put("a", 1, 60)
+        cache.put("b", 2, 60)
+        assert cache.get("a") == 1          # a 变为最近使用
+        cache.put("c", 3, 60)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+
+    def test_single_flight_dedupes_concurrent_loads(self):
+        import threading
+        from app.services.quote_provider import QuoteCache
+        cache = QuoteCache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_load():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return "shared"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", slow_load, 60)))
+                   for _ in range(5)]
+        threads[0].start()
+        started.wait(2)
+        for t in threads[1:]:
+            t.start()
+        release.set()
+        for t in threads:
+            t.join(2)
+        assert len(calls) == 1
+        assert results == ["shared"] * 5
+        assert cache.stats()["coalesced"] >= 1
+
+    def test_fetch_etf_quote_served_from_cache(self, monkeypatch):
+        from app.services import quote_provider
+        calls = []
+
+        def fake(symbol):
+            calls.append(symbol)
+            return quote_provider.ETFQuote(
+                symbol="562500", name="X", market="SH", latest=1.0, open=1.0, high=1.0, low=1.0,
+                prev_close=1.0, change_amount=0, change_pct=0, volume=0, amount=0)
+
+        monkeypatch.setattr(quote_provider.get_quote_client(), "fetch_etf_quote", fake)
+        quote_provider.fetch_etf_quote("562500")
+        quote_provider.fetch_etf_quote("SH562500")
+        assert len(calls) == 1
+        # 批量接口同样命中
+        monkeypatch.setattr(quote_provider.get_quote_client(), "fetch_etf_quotes",
+                            lambda symbols: pytest.fail("should be cached"))
+        assert "SH562500" in quote_provider.fetch_etf_quotes(["562500"])
+
+
+class TestMarketTTL:
+    """market_ttl: 盘中短 TTL，收盘后缓存到下一次开盘."""
+
+    def test_intraday_short_ttl(self):
+        from datetime import datetime
+        from app.services.quote_provider import market_ttl
+        assert market_ttl(datetime(2026, 5, 8, 10, 0), intraday=3.0) == 3.0
+
+    def test_after_close_until_next_open(self):
+        from datetime import datetime
+        from app.services.quote_provider import market_ttl
+        # 周五 15:30 → 下周一 9:15
+        ttl = market_ttl(datetime(2026, 5, 8, 15, 30))
+        assert ttl == (datetime(2026, 5, 11, 9, 15) - datetime(2026, 5, 8, 15, 30)).total_seconds()
+
+    def test_close_settle_window_keeps_short_ttl(self):
+        """刚收盘时收盘价可能还没发布，不能缓存到下一次开盘。"""
+        from datetime import datetime
+        from app.services.quote_provider import market_ttl
+        assert market_ttl(datetime(2026, 5, 8, 15, 0, 30), intraday=3.0) == 3.0
+        assert market_ttl(datetime(2026, 5, 8, 15, 5)) > 3600
+
+    def test_lunch_break_until_afternoon_open(self):
+        from datetime import datetime
+        from app.services.quote_provider import market_ttl
+        assert market_ttl(datetime(2026, 5, 8, 12, 0)) == 3600
+
+    def test_max_ttl_caps(self):
+        from datetime import datetime
+        from app.services.quote_provider import market_ttl
+        assert market_ttl(datetime(2026, 5, 8, 20, 0), max_ttl=600) == 600
@@ -0,0 +1,117 @@
+"""跨 worker 共享缓存测试：TTL、条目上限、多实例共享、行情与名称接入."""
+import pytest
+
+
+class _Clock:
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / 'shared_cache.db')
+
+
+@pytest.fixture
+def shared(cache_path):
+    """把进程级 shared_cache 指向临时文件，测试结束后恢复禁用。"""
+    from app.services.shared_cache import shared_cache
+    shared_cache.configure(cache_path)
+    yield shared_cache
+    shared_cache.configure(None)
+
+
+class TestSharedCache:
+
+    def test_roundtrip_and_ttl(self, cache_path):
+        from app.services.shared_cache import SharedCache
+        clock = _Clock()
+        cache = SharedCache(cache_path, clock=clock)
+        cache.set('etf_name', {'name': '机器人ETF'}, ttl=10)
+        assert cache.get('etf_name') == {'name': '机器人ETF'}
+        assert cache.get_entry('etf_name')[1] == pytest.approx(10)
+        clock.now += 10
+        assert cache.get('etf_name') is None
+
+    def test_visible_to_other_workers(self, cache_path):
+        from app.services.shared_cache import SharedCache
+        SharedCache(cache_path).set_many({'a': 1, 'b': 2, 'skip': None}, ttl=60)
+        other = SharedCache(cache_path)
+        assert other.get_entries(['a', 'b', 'skip', 'c']).keys() == {'a', 'b'}
+
+    def test_bounded_size_evicts_soonest_expiring(self, cache_path):
+        from app.services.shared_cache import SharedCache
+        clock = _Clock()
+        cache = SharedCache(cache_path, max_entries=50, clock=clock)
+        cache.set('keep', 'x', ttl=3600)
+        cache.set_many({f'k{i}': i for i in range(70)}, ttl=60)
+        assert cache.stats()['size'] == 50
+        assert cache.get('keep') == 'x'
+
+    def test_disabled_without_path(self):
+        from app.services.shared_cache import SharedCache
+        cache = SharedCache(None)
+        cache.set('a', 1, ttl=60)
+        assert cache.get('a') is None
+        assert cache.stats() == {'enabled': False, 'path': None, 'max_entries': 50000}
+
+    def test_sqlite_errors_are_misses(self, tmp_path):
+        """打不开缓存文件时按未命中处理，不抛异常。"""
+        from app.services.shared_cache import SharedCache
+        cache = SharedCache(str(tmp_path))
+        cache.set('a', 1, ttl=60)
+        assert cache.get('a') is None
+        assert 'size' not in cache.stats()
+
+
+class TestQuoteProviderTier:
+
+    def test_quote_fetched_once_across_workers(self, shared, monkeypatch):
+        """另一个 worker（进程内缓存为空）直接读共享缓存，不再请求上游。"""
+        from app.services import quote_provider
+        from app.services.quote_provider import ETFQuote
+
+        calls = []
+        quote = ETFQuote(symbol='562500', name='机器人ETF', market='SH', latest=1.0, high=1.1, low=0.9,
+                         open=1.0, prev_close=1.0, change_amount=0.0, change_pct=0.0, volume=100, amount=100)
+        monkeypatch.setattr(quote_provider.get_quote_client(), 'fetch_etf_quote',
+                            lambda s: calls.append(s) or quote)
+
+        assert quote_provider.fetch_etf_quote('562500') == quote
+        quote_provider.quote_cache.clear()
+        assert quote_provider.fetch_etf_quote('562500') == quote
+        assert calls == ['562500']
+
+    def test_batch_fetches_only_shared_misses(self, shared, monkeypatch):
+        from app.services import quote_provider
+        from app.services.quote_provider import OTCFundQuote
+
+        def estimates(codes):
+            requested.append(list(codes))
+            return {c: OTCFundQuote(symbol=c, name=f'基金{c}', latest_nav=1.0, latest_nav_date='2026-01-02',
+                                    estimated_nav=1.01, estimated_change_pct=1.0, estimate_time=None)
+                    for c in codes}
+
+        requested = []
+        monkeypatch.setattr(quote_provider.get_quote_client(), 'fetch_fund_estimates', estimates)
+        quote_provider.fetch_fund_estimates(['000001'])
+        quote_provider.quote_cache.clear()
+
+        quotes = quote_provider.fetch_fund_estimates(['000001', '000002'])
+        assert set(quotes) == {'000001', '000002'}
+        assert requested == [['000001'], ['000002']]
+        assert quotes['000001'].estimated_nav == pytest.approx(1.01)
+
+    def test_etf_name_shared_without_db_lookup(self, shared, monkeypatch):
+        from app.models.etf_kline_cache import EtfKlineCache
+        from app.services import quote_provider
+
+        quote_provider.remember_etf_name('SH562500', '机器人ETF')
+        quote_provider.quote_cache.clear()
+        monkeypatch.setattr(EtfKlineCache, 'get_latest_name',
+                            staticmethod(lambda s: pytest.fail('shared hit must not query DB')))
+        assert quote_provider.get_cached_etf_name('562500') == '机器人ETF'
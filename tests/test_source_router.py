@@ -0,0 +1,162 @@
+"""数据源路由测试：熔断、半开探测、按健康度排序、接入行情与日 K."""
+import pytest
+
+
+class _Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return _Clock()
+
+
+@pytest.fixture
+def router(clock):
+    from app.services.source_router import SourceRouter
+    return SourceRouter(failure_threshold=3, cooldown=30.0, window=300.0, clock=clock)
+
+
+def _fail(router, name, times=1):
+    for _ in range(times):
+        router.record(name, False, 1.0, 'timeout')
+
+
+class TestCircuitBreaker:
+
+    def test_opens_after_consecutive_failures(self, router):
+        _fail(router, 'a', 2)
+        assert router.state('a') == 'closed'
+        router.record('a', True, 0.1)
+        _fail(router, 'a', 2)
+        assert router.state('a') == 'closed'
+        _fail(router, 'a')
+        assert router.state('a') == 'open'
+        assert router.route(['a', 'b']) == ['b']
+
+    def test_open_circuit_skips_call(self, router):
+        from app.services.source_router import SourceUnavailable
+        _fail(router, 'a', 3)
+        calls = []
+        with pytest.raises(SourceUnavailable):
+            router.call('a', lambda: calls.append(1))
+        assert calls == []
+
+    def test_half_open_allows_single_probe(self, router, clock):
+        _fail(router, 'a', 3)
+        clock.now += 30
+        assert router.state('a') == 'half_open'
+        assert router.allow('a') is True
+        assert router.allow('a') is False
+        router.record('a', False, 1.0, 'still down')
+        assert router.state('a') == 'open'
+
+        clock.now += 30
+        assert router.call('a', lambda: 'ok') == 'ok'
+        assert router.state('a') == 'closed'
+
+    def test_call_records_exceptions_and_rejected_results(self, router):
+        with pytest.raises(ValueError):
+            router.call('a', lambda: (_ for _ in ()).throw(ValueError('boom')))
+        router.call('a', lambda: None)
+        router.call('a', lambda: '', accept=bool)
+        assert router.state('a') == 'open'
+        assert router.snapshot()['a']['last_error'] == '无数据'
+
+
+class TestRouting:
+
+    def test_faster_healthy_source_first(self, router):
+        router.record('slow', True, 2.0)
+        router.record('fast', True, 0.2)
+        assert router.route(['slow', 'fast']) == ['fast', 'slow']
+
+    def test_unmeasured_sources_keep_declared_order_after_measured(self, router):
+        router.record('b', True, 5.0)
+        assert router.route(['a', 'b', 'c']) == ['b', 'a', 'c']
+
+    def test_high_error_rate_ranks_last(self, router):
+        router.record('flaky', True, 0.1)
+        _fail(router, 'flaky')
+        router.record('steady', True, 1.0)
+        assert router.route(['flaky', 'steady']) == ['steady', 'flaky']
+
+    def test_reorder_false_only_filters(self, router):
+        router.record('b', True, 0.1)
+        _fail(router, 'c', 3)
+        assert router.route(['a', 'b', 'c'], reorder=False) == ['a', 'b']
+
+    def test_samples_expire_with_window(self, router, clock):
+        _fail(router, 'a')
+        clock.now += 301
+        assert router.snapshot()['a']['requests'] == 0
+
+    def test_first_falls_through_to_next_source(self, router):
+        name, result = router.first([
+            ('a', lambda: None),
+            ('b', lambda: 'data'),
+        ])
+        assert (name, result) == ('b', 'data')
+        assert router.snapshot()['a']['consecutive_failures'] == 1
+
+
+class TestProviders:
+
+    def test_kline_refresh_routes_around_failing_eastmoney(self, db, monkeypatch):
+        """东财日 K 失败后新浪源排到前面，后续刷新不再先等东财。"""
+        from app.services import quote_provider
+        from app.services.bar_series import BarSeries
+        from app.services.quote_provider import ETFDailyBar
+        from app.services.source_router import source_router
+
+        remote_calls = []
+        monkeypatch.setattr(quote_provider, '_fetch_klines_from_remote',
+                            lambda *a: remote_calls.append(a))
+        monkeypatch.setattr(
+            quote_provider, 'fetch_etf_daily_kline_akshare',
+            lambda s, days=250, **kw: BarSeries.from_bars([
+                ETFDailyBar(date='2026-01-02', open=1.0, high=1.1, low=0.9, close=1.05, volume=100, amount=105.0),
+            ]),
+        )
+
+        for _ in range(3):
+            assert quote_provider.refresh_etf_daily_kline('562500', days=30) is True
+        assert len(remote_calls) == 1
+        assert source_router.route([quote_provider.KLINE_SOURCE_EASTMONEY, quote_provider.KLINE_SOURCE_SINA]) == [
+            quote_provider.KLINE_SOURCE_SINA, quote_provider.KLINE_SOURCE_EASTMONEY,
+        ]
+
+    def test_kline_refresh_fails_fast_when_all_open(self, db, monkeypatch):
+        from app.services import quote_provider
+        from app.services.source_router import source_router
+
+        for name in (quote_provider.KLINE_SOURCE_EASTMONEY, quote_provider.KLINE_SOURCE_SINA):
+            _fail(source_router, name, 3)
+        monkeypatch.setattr(quote_provider, '_fetch_klines_from_remote',
+                            lambda *a: pytest.fail('open circuit must not be called'))
+        assert quote_provider.refresh_etf_daily_kline('562500', days=30) is False
+
+    def test_quote_client_fails_fast_when_open(self):
+        """行情接口连续超时后熔断，后续请求不再打到上游。"""
+        import requests
+        from app.services.quote_provider import QuoteClient
+        from app.services.source_router import SourceRouter
+
+        class _Session:
+            calls = 0
+
+            def get(self, url, params=None, timeout=None):
+                self.calls += 1
+                raise requests.exceptions.Timeout('read timeout')
+
+        session = _Session()
+        client = QuoteClient(session=session, router=SourceRouter(failure_threshold=2))
+        for _ in range(4):
+            assert client.fetch_etf_quote('562500') is None
+        assert client.fetch_etf_quotes(['562500']) == {}
+        assert session.calls == 2
@@ -0,0 +1,61 @@
+"""启动开销回归：create_app() 不应导入重量级可选依赖；延迟导入代理行为."""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HEAVY_MODULES = ('akshare', 'pandas', 'pytesseract', 'PIL')
+# 宽松上限：本地约 1s，超过说明又有重量级依赖被拉进了启动路径
+CREATE_APP_BUDGET_SECONDS = 8.0
+
+
+def test_create_app_skips_heavy_imports():
+    """在干净解释器里计时 create_app()，并检查重量级依赖未被导入。"""
+    script = textwrap.dedent(f"""
+        import json, sys, time
+        started = time.perf_counter()
+        from app import create_app
+        import app.utils.crawler, app.services.ocr
+        create_app('app.config.TestConfig')
+        print(json.dumps({{
+            'elapsed': time.perf_counter() - started,
+            'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+        }}))
+    """)
+    out = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    assert result['heavy'] == []
+    assert result['elapsed'] < CREATE_APP_BUDGET_SECONDS
+
+
+class TestLazyModule:
+
+    def test_imports_on_first_attribute_access(self, tmp_path, monkeypatch):
+        from app.utils.lazy import LazyModule
+        (tmp_path / 'lazy_probe_mod.py').write_text('VALUE = 42\n')
+        monkeypatch.syspath_prepend(str(tmp_path))
+        monkeypatch.delitem(sys.modules, 'lazy_probe_mod', raising=False)
+
+        mod = LazyModule('lazy_probe_mod')
+        assert mod.available and not mod.loaded
+        assert 'lazy_probe_mod' not in sys.modules
+        assert mod.VALUE == 42
+        assert mod.loaded and 'lazy_probe_mod' in sys.modules
+
+    def test_missing_dependency_fails_at_use_with_hint(self):
+        from app.utils.lazy import LazyModule
+        mod = LazyModule('definitely_not_installed_mod')
+        assert not mod.available
+        with pytest.raises(ImportError, match='pip install definitely_not_installed_mod'):
+            mod.anything
+
+    def test_lazy_import_shares_instances_and_warm_up_tolerates_missing(self):
+        from app.utils.lazy import lazy_import, warm_up
+        assert lazy_import('json') is lazy_import('json')
+        warm_up(['json', 'definitely_not_installed_mod'])
+        assert lazy_import('json').loaded
+        warm_up(['json'], background=True).join(5)
@@ -0,0 +1,98 @@
+"""交易日历测试：数据文件、查询、覆盖范围外推算、调用方."""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def cal():
+    from app.services.trading_calendar import get_calendar
+    return get_calendar()
+
+
+class TestBundledData:
+
+    @pytest.mark.parametrize("year,count", [(2023, 242), (2024, 242), (2025, 243)])
+    def test_yearly_trading_day_counts(self, cal, year, count):
+        assert len(cal.trading_days_between(date(year, 1, 1), date(year, 12, 31))) == count
+
+    def test_holidays_and_makeup_weekends_are_closed(self, cal):
+        assert not cal.is_trading_day(date(2025, 10, 1))     # 国庆
+        assert not cal.is_trading_day(date(2025, 1, 28))     # 春节（周二）
+        assert not cal.is_trading_day(date(2025, 9, 28))     # 调休上班的周日，交易所休市
+        assert cal.is_trading_day(date(2025, 9, 30))
+        assert cal.is_trading_day(datetime(2025, 9, 30, 14, 0))
+
+
+class TestQueries:
+
+    def test_prev_and_next_skip_holidays(self, cal):
+        assert cal.next_trading_day(date(2025, 9, 30)) == date(2025, 10, 9)
+        assert cal.prev_trading_day(date(2025, 10, 9)) == date(2025, 9, 30)
+        assert cal.prev_trading_day(date(2025, 10, 4), inclusive=True) == date(2025, 9, 30)
+        assert cal.next_trading_day(date(2025, 10, 9), inclusive=True) == date(2025, 10, 9)
+
+    def test_trading_days_between_is_inclusive(self, cal):
+        days = cal.trading_days_between(date(2025, 9, 29), date(2025, 10, 10))
+        assert days == [date(2025, 9, 29), date(2025, 9, 30), date(2025, 10, 9), date(2025, 10, 10)]
+        assert cal.trading_days_between(date(2025, 10, 10), date(2025, 10, 1)) == []
+
+    def test_recent_trading_days(self, cal):
+        assert cal.recent_trading_days(date(2025, 10, 9), 3) == [
+            date(2025, 9, 29), date(2025, 9, 30), date(2025, 10, 9),
+        ]
+        assert cal.recent_trading_days(cal.first_day + timedelta(days=2), 5)[-1] <= cal.first_day + timedelta(days=2)
+
+    def test_outside_coverage_falls_back_to_weekdays(self, cal):
+        after = cal.last_day + timedelta(days=400)
+        monday = after - timedelta(days=after.weekday())
+        assert cal.is_trading_day(monday)
+        assert not cal.is_trading_day(monday + timedelta(days=5))
+        assert cal.next_trading_day(monday + timedelta(days=4)) == monday + timedelta(days=7)
+        assert len(cal.trading_days_between(monday, monday + timedelta(days=13))) == 10
+
+    def test_custom_calendar(self):
+        from app.services.trading_calendar import TradingCalendar
+        c = TradingCalendar([date(2030, 1, 2), date(2030, 1, 4)])
+        assert c.is_trading_day(date(2030, 1, 2)) and not c.is_trading_day(date(2030, 1, 3))
+        assert c.next_trading_day(date(2030, 1, 2)) == date(2030, 1, 4)
+
+
+class TestCallers:
+
+    def test_fund_service_is_market_day(self):
+        from app.services.fund_service import FundService
+        assert FundService.is_market_day(date(2026, 10, 7)) is False
+        assert FundService.is_market_day(date(2026, 10, 8)) is True
+
+    def test_market_ttl_waits_over_holiday(self):
+        from app.services.quote_provider import market_ttl
+        now = datetime(2025, 9, 30, 16, 0)
+        assert market_ttl(now) == (datetime(2025, 10, 9, 9, 15) - now).total_seconds()
+        assert market_ttl(datetime(2025, 10, 3, 10, 0)) > 3.0
+
+    def test_scheduler_skips_second_holiday_day(self):
+        from app.services.scheduler import should_crawl_today
+        assert should_crawl_today(date(2025, 10, 1))       # 收集 9/30 的净值
+        assert not should_crawl_today(date(2025, 10, 2))
+        assert should_crawl_today(date(2025, 10, 9))
+
+    def test_latest_navs_skip_non_trading_dates(self, db, monkeypatch):
+        from app.models import Fund, FundNavHistory
+        from app.models import fund_nav_history
+
+        class _FixedNow(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime(2025, 10, 10, 12, 0)
+
+        monkeypatch.setattr(fund_nav_history, 'datetime', _FixedNow)
+        fund = Fund(code='000001', name='基金000001')
+        db.session.add(fund)
+        db.session.commit()
+        for d in (date(2025, 9, 29), date(2025, 9, 30), date(2025, 10, 1), date(2025, 10, 9), date(2025, 10, 10)):
+            db.session.add(FundNavHistory(fund_id=fund.id, nav=1.0, date=d))
+        db.session.commit()
+
+        navs = FundNavHistory.get_latest_navs(fund.id, 3)
+        assert [n.date for n in navs] == [date(2025, 9, 30), date(2025, 10, 9), date(2025, 10, 10)]